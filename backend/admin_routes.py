@@ -1,8 +1,6 @@
 import os
-import shutil
 import pandas as pd
-import unicodedata
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import List, Optional
 from pydantic import BaseModel
@@ -18,19 +16,25 @@ from .auth import (
     ADMIN_PASSWORD_HASH,
     get_password_hash
 )
+from .data_store import request_reload, apply_change
+from .pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from .pub_table import pmid_strings
+from .storage import get_storage
+from . import deltas, photos
+from .profiling import profiler
 
 router = APIRouter(tags=["Admin"])
 
-# Helper function to reload global arrays in main.py
+# Helper: rebuild the in-memory snapshot off the request thread (see data_store)
 def trigger_reload():
-    # Local import to prevent circular dependency
-    from .main import load_data
-    load_data()
+    return request_reload()
+
+# Helper: apply a single-row edit to the in-memory snapshot without rereading the database
+# (falls back to trigger_reload() if the delta cannot be applied)
+def apply_delta(change):
+    return apply_change(change)
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PROF_CSV = os.path.join(BASE_DIR, "professores.csv")
-PUB_CSV = os.path.join(BASE_DIR, "publicacoes.csv")
-VIN_CSV = os.path.join(BASE_DIR, "vinculos.csv")
 
 # ================= AUTHENTICATION ================= #
 
@@ -67,113 +71,71 @@ class ProfessorUpdate(ProfessorCreate):
 
 @router.get("/professores")
 def list_professores(admin: str = Depends(get_current_admin)):
-    if not os.path.exists(PROF_CSV):
-        return []
-    df = pd.read_csv(PROF_CSV, dtype={'lattes_id': str})
-    return df.fillna("").to_dict(orient="records")
+    return get_storage().list_professors()
 
 @router.post("/professores")
 def add_professor(prof: ProfessorCreate, admin: str = Depends(get_current_admin)):
-    df = pd.DataFrame()
-    if os.path.exists(PROF_CSV):
-        df = pd.read_csv(PROF_CSV, dtype={'lattes_id': str})
-    
-    # Auto-increment ID
-    new_id = 1
-    if not df.empty and 'id_professor' in df.columns:
-        new_id = df['id_professor'].max() + 1
-        
-    new_row = {
-        "id_professor": new_id,
-        "nome": prof.nome,
-        "lattes_id": prof.lattes_id,
-        "categoria": prof.categoria,
-        "variantes": prof.variantes,
-        "atuacao": prof.atuacao
-    }
-    
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    df.to_csv(PROF_CSV, index=False)
-    trigger_reload()
+    # Auto-increment ID (assigned inside the storage transaction)
+    new_row = get_storage().add_professor(prof.model_dump())
+    apply_delta(lambda snap, version: deltas.rederive(
+        snap, version, df_prof=pd.concat([snap.df_prof, pd.DataFrame([new_row])], ignore_index=True).fillna("")
+    ))
     return {"message": "Professor adicionado com sucesso", "professor": new_row}
 
 @router.put("/professores/{id_professor}")
 def edit_professor(id_professor: int, prof: ProfessorUpdate, admin: str = Depends(get_current_admin)):
-    if not os.path.exists(PROF_CSV):
-        raise HTTPException(status_code=404, detail="Arquivo nao encontrado")
-        
-    df = pd.read_csv(PROF_CSV, dtype={'lattes_id': str})
-    idx = df.index[df['id_professor'] == id_professor].tolist()
-    if not idx:
+    if not get_storage().update_professor(id_professor, prof.model_dump()):
         raise HTTPException(status_code=404, detail="Professor não encontrado")
-    
-    df.at[idx[0], 'nome'] = prof.nome
-    df.at[idx[0], 'lattes_id'] = prof.lattes_id
-    df.at[idx[0], 'categoria'] = prof.categoria
-    df.at[idx[0], 'variantes'] = prof.variantes
-    df.at[idx[0], 'atuacao'] = prof.atuacao
-    
-    df.to_csv(PROF_CSV, index=False)
-    trigger_reload()
+
+    def change(snap, version):
+        df_prof = snap.df_prof.copy()
+        row = snap.prof_row_index[id_professor]
+        for column, value in prof.model_dump().items():
+            df_prof.iat[row, df_prof.columns.get_loc(column)] = value
+        return deltas.rederive(snap, version, df_prof=df_prof)
+
+    apply_delta(change)
     return {"message": "Professor atualizado com sucesso"}
 
 @router.delete("/professores/{id_professor}")
 def delete_professor(id_professor: int, admin: str = Depends(get_current_admin)):
-    if not os.path.exists(PROF_CSV):
-         raise HTTPException(status_code=404, detail="Arquivo nao encontrado")
-         
-    df_prof = pd.read_csv(PROF_CSV, dtype={'lattes_id': str})
-    if id_professor not in df_prof['id_professor'].values:
+    # Removes the professor and its vinculos in one transaction
+    if not get_storage().delete_professor(id_professor):
         raise HTTPException(status_code=404, detail="Professor não encontrado")
-        
-    # Remove from professors
-    df_prof = df_prof[df_prof['id_professor'] != id_professor]
-    df_prof.to_csv(PROF_CSV, index=False)
-    
-    # Remove from vinculos
-    if os.path.exists(VIN_CSV):
-        df_vin = pd.read_csv(VIN_CSV)
-        df_vin = df_vin[df_vin['id_professor'] != id_professor]
-        df_vin.to_csv(VIN_CSV, index=False)
-        
-    trigger_reload()
+
+    apply_delta(lambda snap, version: deltas.rederive(
+        snap, version,
+        df_prof=snap.df_prof[snap.df_prof['id_professor'] != id_professor],
+        df_vin=snap.df_vin[snap.df_vin['id_professor'] != id_professor],
+    ))
     return {"message": "Professor removido com sucesso"}
 
+# Largest photo accepted (the original is kept; the API serves resized variants)
+MAX_PHOTO_BYTES = 15 * 1024 * 1024
+
 @router.post("/professores/{id_professor}/foto")
-async def upload_professor_photo(
+def upload_professor_photo(
     id_professor: int, 
     file: UploadFile = File(...), 
     admin: str = Depends(get_current_admin)
 ):
-    if not os.path.exists(PROF_CSV):
-        raise HTTPException(status_code=404, detail="Banco de dados não encontrado")
-        
-    df = pd.read_csv(PROF_CSV)
-    prof = df[df['id_professor'] == id_professor]
-    
-    if prof.empty:
+    # Sync handler: decoding and resizing run in the threadpool, off the event loop
+    prof = get_storage().get_professor(id_professor)
+    if prof is None:
         raise HTTPException(status_code=404, detail="Professor não encontrado")
-        
-    nome = prof.iloc[0]['nome']
-    
-    # Normalize name to match getProfessorPhotoUrl in frontend
-    # Lowercase, remove accents, remove strange chars, replace space with underscore
-    n = unicodedata.normalize('NFD', nome)
-    n = n.encode('ascii', 'ignore').decode('utf-8')
-    n = n.lower()
-    import re
-    n = re.sub(r'[^a-z0-9\s_]', '', n)
-    normalized_name = "_".join(n.split())
-    
-    assets_dir = os.path.join(BASE_DIR, "assets")
-    os.makedirs(assets_dir, exist_ok=True)
-    
-    file_path = os.path.join(assets_dir, f"{normalized_name}.jpg")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    return {"message": "Foto salva com sucesso", "filename": f"{normalized_name}.jpg"}
+
+    data = file.file.read(MAX_PHOTO_BYTES + 1)
+    if len(data) > MAX_PHOTO_BYTES:
+        raise HTTPException(status_code=413, detail=f"Foto maior que {MAX_PHOTO_BYTES // (1024 * 1024)} MB")
+
+    # Original saved as assets/{normalized name}.jpg, plus the thumb/card/profile variants
+    try:
+        normalized_name, urls = photos.save_photo(prof['nome'], data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    apply_delta(deltas.refresh_photos)
+    return {"message": "Foto salva com sucesso", "filename": f"{normalized_name}.jpg", "photos": urls}
 
 # ================= PUBLICACOES ================= #
 
@@ -198,125 +160,184 @@ class PublicacaoUpdate(BaseModel):
     abstract: Optional[str] = "N/A"
 
 @router.get("/publicacoes")
-def list_publicacoes(limit: int = 100, pmid: Optional[str] = None, admin: str = Depends(get_current_admin)):
-    if not os.path.exists(PUB_CSV):
-        return []
-    df = pd.read_csv(PUB_CSV)
-    df = df.fillna("")
-    
-    if pmid:
-        df = df[df['pmid'].astype(str).str.contains(pmid, na=False)]
-        
-    # Sort by year decrescent (optional)
-    if 'ano' in df.columns:
-        df = df.sort_values(by="ano", ascending=False)
-        
-    return df.head(limit).to_dict(orient="records")
+def list_publicacoes(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    pmid: Optional[str] = None,
+    cursor: Optional[str] = None,
+    admin: str = Depends(get_current_admin)
+):
+    # Sorted by (year, pmid) decrescent, filtered by a pmid fragment; keyset pages
+    # walk the storage index. Total in X-Total-Count, next page in X-Next-Cursor
+    after = decode_cursor(cursor, (int, int, str))
+    storage = get_storage()
+    pubs, next_after = storage.list_publications(limit=limit, pmid=pmid, after=after)
+    response.headers["X-Total-Count"] = str(storage.count_publications(pmid=pmid))
+    if next_after is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(next_after)
+    return pubs
 
 @router.post("/publicacoes")
 def add_publicacao(pub: PublicacaoCreate, admin: str = Depends(get_current_admin)):
-    df_pub = pd.DataFrame()
-    if os.path.exists(PUB_CSV):
-        df_pub = pd.read_csv(PUB_CSV)
-        
-    df_vin = pd.DataFrame()
-    if os.path.exists(VIN_CSV):
-        df_vin = pd.read_csv(VIN_CSV)
-
-    # Check if exists
-    if not df_pub.empty and str(pub.pmid) in df_pub['pmid'].astype(str).values:
-        # Just add vinculo
-        pass
-    else:
-        # Add pub
-        new_pub = {
-            "pmid": pub.pmid, "doi": pub.doi, "issn": pub.issn,
-            "titulo": pub.titulo, "revista": pub.revista,
-            "ano": pub.ano, "autores": pub.autores, "abstract": pub.abstract
-        }
-        df_pub = pd.concat([df_pub, pd.DataFrame([new_pub])], ignore_index=True)
-        df_pub.to_csv(PUB_CSV, index=False)
-        
-    # Add vinculo
-    new_vin = {"pmid": pub.pmid, "id_professor": pub.id_professor}
-    if not df_vin.empty:
-        # Check if relation already exists
-        exists = df_vin[(df_vin['pmid'].astype(str) == str(pub.pmid)) & (df_vin['id_professor'] == pub.id_professor)].index
-        if len(exists) == 0:
-            df_vin = pd.concat([df_vin, pd.DataFrame([new_vin])], ignore_index=True)
-    else:
-        df_vin = pd.DataFrame([new_vin])
-        
-    df_vin.to_csv(VIN_CSV, index=False)
-    trigger_reload()
+    # Adds the publication only if the pmid is new; the vinculo is added either way
+    fields = pub.model_dump(exclude={"id_professor"})
+    created = get_storage().add_publication(fields, pub.id_professor)
+
+    apply_delta(lambda snap, version: deltas.apply_publication(
+        snap, version, pub.pmid, pub=fields if created else None, id_professor=pub.id_professor
+    ))
     return {"message": "Publicação adicionada/vinculada com sucesso"}
 
 @router.put("/publicacoes/{pmid}")
 def edit_publicacao(pmid: str, pub: PublicacaoUpdate, admin: str = Depends(get_current_admin)):
-    if not os.path.exists(PUB_CSV):
-        raise HTTPException(status_code=404, detail="Arquivo nao encontrado")
-        
-    df = pd.read_csv(PUB_CSV)
-    df['pmid'] = df['pmid'].astype(str).str.strip()
-    idx = df.index[df['pmid'] == pmid].tolist()
-    
-    if not idx:
+    if not get_storage().update_publication(pmid, pub.model_dump()):
         raise HTTPException(status_code=404, detail="Publicação não encontrada")
-        
-    row = idx[0]
-    df.at[row, 'titulo'] = pub.titulo
-    df.at[row, 'doi'] = pub.doi
-    df.at[row, 'issn'] = pub.issn
-    df.at[row, 'revista'] = pub.revista
-    df.at[row, 'ano'] = pub.ano
-    df.at[row, 'autores'] = pub.autores
-    df.at[row, 'abstract'] = pub.abstract
-    
-    df.to_csv(PUB_CSV, index=False)
-    trigger_reload()
+
+    apply_delta(lambda snap, version: deltas.apply_publication(snap, version, pmid, pub=pub.model_dump()))
     return {"message": "Publicação atualizada"}
 
 @router.delete("/publicacoes/{pmid}")
 def delete_publicacao(pmid: str, admin: str = Depends(get_current_admin)):
-    if not os.path.exists(PUB_CSV):
-        raise HTTPException(status_code=404, detail="Banco não encontrado")
-        
-    # Remove from pub
-    df_pub = pd.read_csv(PUB_CSV)
-    df_pub['pmid'] = df_pub['pmid'].astype(str).str.strip()
-    df_pub = df_pub[df_pub['pmid'] != pmid]
-    df_pub.to_csv(PUB_CSV, index=False)
-    
-    # Remove from vinculos
-    if os.path.exists(VIN_CSV):
-        df_vin = pd.read_csv(VIN_CSV)
-        df_vin['pmid'] = df_vin['pmid'].astype(str).str.strip()
-        df_vin = df_vin[df_vin['pmid'] != pmid]
-        df_vin.to_csv(VIN_CSV, index=False)
-        
-    trigger_reload()
+    # Removes the publication and its vinculos in one transaction
+    get_storage().delete_publication(pmid)
+
+    apply_delta(lambda snap, version: deltas.rederive(
+        snap, version,
+        df_pub=snap.df_pub[pmid_strings(snap.df_pub) != pmid],
+        df_vin=snap.df_vin[snap.df_vin['pmid'].astype(str).str.strip() != pmid],
+    ))
     return {"message": "Publicação removida com sucesso"}
 
 # ================= SYNC (PUBMED) ================= #
 
-from .sync_service import run_sync_for_professor
+from . import jobs
+from .sync_service import JOB_KIND as SYNC_JOB_KIND, submit_sync
 
 class SyncRequest(BaseModel):
     id_professor: int
     mode: str = "variantes" # ou "nome_exato"
+    incremental: bool = True # False: full history (reconciliation)
 
-@router.post("/sync")
+class SyncAllRequest(BaseModel):
+    mode: str = "variantes" # ou "nome_exato"
+    incremental: bool = True
+
+def _sync_job_or_404(job_id: str):
+    job = jobs.get_job(job_id)
+    if job is None or job.kind != SYNC_JOB_KIND:
+        raise HTTPException(status_code=404, detail="Sincronização não encontrada")
+    return job
+
+@router.post("/sync", status_code=status.HTTP_202_ACCEPTED)
 def trigger_sync(req: SyncRequest, admin: str = Depends(get_current_admin)):
-    # Em produção pesada, isso deveria ser um processo em background tasks
-    # Aqui vamos usar sincrono, pois a API do Pubmed é rápida para 1 pesquisador
-    try:
-        resultado = run_sync_for_professor(req.id_professor, req.mode)
-        if "error" in resultado:
-            raise HTTPException(status_code=400, detail=resultado["error"])
-        
-        trigger_reload()
-        return resultado
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """
+    Queues a PubMed sync for the professor and returns the job right away; poll
+    GET /sync/jobs/{id} for progress and the result. The job reloads the data itself
+    once, after its commit. A sync already queued/running for the same professor and
+    mode is returned instead of starting another one. Incremental syncs only fetch
+    records added to PubMed since the professor's last sync (full history when there
+    is none, the terms changed or the last full search is older than SYNC_FULL_EVERY_DAYS).
+    """
+    if get_storage().get_professor(req.id_professor) is None:
+        raise HTTPException(status_code=404, detail="Professor não encontrado")
+    job = submit_sync(req.id_professor, req.mode, req.incremental)
+    return job.to_dict()
+
+@router.post("/sync/all", status_code=status.HTTP_202_ACCEPTED)
+def trigger_sync_all(req: SyncAllRequest, admin: str = Depends(get_current_admin)):
+    """
+    Queues one batched sync of every professor: search terms are shared, each PMID is
+    fetched once and links go to every matching professor. Poll it like a single sync.
+    """
+    job = submit_sync(None, req.mode, req.incremental)
+    return job.to_dict()
+
+@router.get("/sync/jobs")
+def list_sync_jobs(limit: int = Query(20, ge=1, le=200), admin: str = Depends(get_current_admin)):
+    """Most recent sync jobs (including ones from previous server runs), newest first."""
+    return [job.to_dict() for job in jobs.recent_jobs(SYNC_JOB_KIND, limit)]
+
+@router.get("/sync/jobs/{job_id}")
+def get_sync_job(job_id: str, admin: str = Depends(get_current_admin)):
+    """Status (queued, running, done, error or cancelled), progress and result of a sync job."""
+    return _sync_job_or_404(job_id).to_dict()
+
+@router.post("/sync/jobs/{job_id}/cancel")
+def cancel_sync_job(job_id: str, admin: str = Depends(get_current_admin)):
+    """Cancels a queued job, or asks a running one to stop before its next request (nothing is committed)."""
+    job = _sync_job_or_404(job_id)
+    if job.finished:
+        raise HTTPException(status_code=409, detail="Sincronização já terminada")
+    job.cancel()
+    return job.to_dict()
+
+
+# ================= TEMPLATES ================= #
+
+from . import template_import
+
+def _import_job_or_404(job_id: str):
+    job = jobs.get_job(job_id)
+    if job is None or job.kind != template_import.JOB_KIND:
+        raise HTTPException(status_code=404, detail="Importação não encontrada")
+    return job
+
+@router.get("/templates")
+def list_templates(admin: str = Depends(get_current_admin)):
+    """Templates sent through /upload-template that are still waiting for approval, newest first."""
+    return template_import.pending_uploads()
+
+@router.post("/templates/{filename}/import", status_code=status.HTTP_202_ACCEPTED)
+def import_template(filename: str, admin: str = Depends(get_current_admin)):
+    """
+    Approves a pending template: queues its import (merge into the database and the
+    snapshot) and returns the job; poll GET /templates/jobs/{id} for the result.
+    """
+    upload = template_import.pending_upload(filename)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Template não encontrado")
+    return template_import.submit_import(upload).to_dict()
+
+@router.get("/templates/jobs")
+def list_import_jobs(limit: int = Query(20, ge=1, le=200), admin: str = Depends(get_current_admin)):
+    """Most recent template imports, newest first."""
+    return [job.to_dict() for job in jobs.recent_jobs(template_import.JOB_KIND, limit)]
+
+@router.get("/templates/jobs/{job_id}")
+def get_import_job(job_id: str, admin: str = Depends(get_current_admin)):
+    """Status (queued, running, done or error) and result of a template import job."""
+    return _import_job_or_404(job_id).to_dict()
+
+
+# ================= PROFILING ================= #
+
+class ProfilingSettings(BaseModel):
+    sample_rate: Optional[float] = None  # fraction of requests profiled (0 = only X-Profile requests)
+    interval_ms: Optional[float] = None  # stack sampling interval
+
+@router.get("/profiling")
+def profiling_status(admin: str = Depends(get_current_admin)):
+    """Current settings and, per route, profiled requests and collected samples."""
+    return profiler.status()
+
+@router.put("/profiling")
+def configure_profiling(settings: ProfilingSettings, admin: str = Depends(get_current_admin)):
+    if settings.sample_rate is not None and not 0 <= settings.sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate deve estar entre 0 e 1")
+    if settings.interval_ms is not None and not 1 <= settings.interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms deve estar entre 1 e 1000")
+    profiler.configure(settings.sample_rate, settings.interval_ms)
+    return profiler.status()
 
+@router.get("/profiling/flamegraph")
+def profiling_flamegraph(route: Optional[str] = None, admin: str = Depends(get_current_admin)):
+    """
+    Collapsed stacks ("route;frame;frame count"), ready for flamegraph.pl or speedscope.
+    `route` narrows to one endpoint, as "GET /stats" or "/stats".
+    """
+    return Response(profiler.collapsed(route), media_type="text/plain; charset=utf-8")
 
+@router.delete("/profiling")
+def reset_profiling(admin: str = Depends(get_current_admin)):
+    profiler.reset()
+    return {"message": "Amostras de perfil descartadas"}
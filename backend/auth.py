@@ -43,18 +43,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_admin(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Credenciais inválidas ou token expirado",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def admin_from_token(token: str) -> Optional[str]:
+    """Admin username carried by a valid, unexpired token; None otherwise."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None or username != ADMIN_USERNAME:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
+        return None
+    username = payload.get("sub")
+    return username if username is not None and username == ADMIN_USERNAME else None
+
+async def get_current_admin(token: str = Depends(oauth2_scheme)):
+    username = admin_from_token(token)
+    if username is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Credenciais inválidas ou token expirado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return username
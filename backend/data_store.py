@@ -0,0 +1,433 @@
+import os
+import itertools
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import pandas as pd
+
+from .indexes import (
+    QUALIS_STRATA,
+    sort_publications,
+    build_row_index,
+    build_professor_index,
+    build_link_table,
+    build_qualis_table,
+    build_publication_professors,
+    build_coauthorship,
+    build_publication_summaries,
+    build_graph_links,
+)
+from .pub_table import (
+    AbstractStore,
+    compact_publications,
+    pmid_strings,
+    split_abstracts,
+)
+from .search_index import SearchIndex
+from . import metrics, photos
+from .storage import get_storage
+from .table_cache import load_cached
+from .stats_cube import StatsCube
+
+# Carga dos dados (via storage) e publicação em memória.
+#
+# Tudo o que os endpoints leem fica num único DataSnapshot imutável. Uma recarga
+# monta um snapshot novo inteiro (fora da thread da requisição, via request_reload)
+# e o publica trocando uma única referência: quem já pegou o snapshot antigo
+# continua lendo um estado consistente, e ninguém vê um estado pela metade.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Limite de entradas no memo de cada snapshot (variações de payload, etc.)
+MEMO_LIMIT = 64
+
+
+@dataclass(frozen=True, eq=False)
+class DataSnapshot:
+    """
+    Versão imutável dos dados: tabelas, índices e payloads derivados.
+    Os DataFrames e dicionários internos nunca são alterados depois de publicados;
+    `memo` é o único campo mutável e só guarda valores derivados desta mesma versão.
+    """
+    version: int
+    loaded_at: datetime
+    qualis_map: dict
+    df_prof: pd.DataFrame
+    df_pub: pd.DataFrame              # publicações em layout compacto (resumos ficam em `abstracts`)
+    df_vin: pd.DataFrame
+    df_proj: pd.DataFrame
+    df_links: pd.DataFrame            # vínculos + ano/qualis da publicação (base das agregações)
+    df_qualis_prof: pd.DataFrame      # id_professor x estrato Qualis (contagens)
+    pmid_index: dict                  # pmid (str) -> posição em df_pub
+    prof_row_index: dict              # id_professor -> posição em df_prof
+    prof_pub_index: dict              # id_professor -> array de posições em df_pub (ano desc)
+    search_index: SearchIndex         # índice invertido para /publicacoes/busca
+    pub_professors: dict              # pmid -> nomes dos professores vinculados
+    coauthor_index: dict              # id_professor -> {id_coautor: [pmids compartilhados]}
+    shared_pub_summaries: dict        # pmid -> resumo (só publicações com coautoria interna)
+    graph_payload: dict               # /graph completo desta versão
+    stats_cube: StatsCube             # agregados de /stats por (ano, área de atuação)
+    abstracts: AbstractStore          # abstract_id -> resumo (arquivo mapeado em memória)
+    memo: dict = field(default_factory=dict, repr=False)
+
+    def cached(self, key, factory):
+        """Valor derivado deste snapshot, calculado uma vez por chave."""
+        try:
+            value = self.memo[key]
+            metrics.cache_hit("snapshot_memo")
+            return value
+        except KeyError:
+            metrics.cache_miss("snapshot_memo")
+            value = factory()
+            if len(self.memo) < MEMO_LIMIT:
+                self.memo[key] = value
+            return value
+
+
+def load_qualis(base_dir=None):
+    """Carrega o arquivo de Qualis e cria um dicionário de ISSN -> Estrato"""
+    qualis_path = os.path.join(base_dir or BASE_DIR, "qualis_odontologia.csv")
+    if os.path.exists(qualis_path):
+        try:
+            # Lê o CSV com tratamento de BOM (utf-8-sig)
+            df = pd.read_csv(qualis_path, encoding='utf-8-sig')
+            # Normaliza ISSN (remove traços e espaços) para comparação
+            df['issn_clean'] = df['ISSN'].astype(str).str.replace('-', '').str.replace(' ', '').str.upper()
+            qualis_map = df.set_index('issn_clean')['Estrato'].to_dict()
+            print(f"[OK] Qualis carregado: {len(qualis_map)} revistas.")
+            return qualis_map
+        except Exception as e:
+            print(f"[ERROR] Erro ao carregar Qualis: {e}")
+            return {}
+    print("[WARN] Arquivo qualis_odontologia.csv não encontrado.")
+    return {}
+
+
+def get_qualis_stratum(issn_str, qualis_map):
+    """
+    Retorna o melhor estrato Qualis para uma string que pode conter múltiplos ISSNs
+    separados por ';'. Tenta o match para cada um e retorna o melhor.
+    """
+    if not issn_str or issn_str == "N/A" or not qualis_map:
+        return "N/A"
+
+    # Ordem de importância do Qualis
+    hierarchy = {"A1": 1, "A2": 2, "A3": 3, "A4": 4, "B1": 5, "B2": 6, "B3": 7, "B4": 8, "N/A": 9}
+
+    # Divide a string em diversos ISSNs (PubMed costuma enviar Print e Electronic)
+    issns = [i.strip() for i in str(issn_str).split(';') if i.strip()]
+
+    results = []
+    for issn in issns:
+        # Normaliza cada ISSN
+        issn_clean = issn.replace('-', '').replace(' ', '').upper()
+        res = qualis_map.get(issn_clean, "N/A")
+        results.append(res)
+
+    if not results:
+        return "N/A"
+
+    # Ordena os resultados pela hierarquia e pega o melhor (o que tem menor valor numérico)
+    best_stratum = min(results, key=lambda x: hierarchy.get(x, 9))
+    return best_stratum
+
+
+def empty_tables():
+    """DataFrames vazios usados quando os arquivos faltam ou estão corrompidos."""
+    return (
+        pd.DataFrame(columns=["id_professor", "nome", "categoria", "atuacao"]),
+        pd.DataFrame(columns=["pmid", "doi", "titulo", "revista", "ano", "autores", "abstract", "issn", "qualis"]),
+        pd.DataFrame(columns=["pmid", "id_professor"]),
+        pd.DataFrame(columns=["professor_nome", "ano", "titulo"]),
+    )
+
+
+def read_tables(base_dir, qualis_map):
+    """Lê as tabelas do armazenamento, garante integridade referencial e aplica o Qualis às publicações."""
+    df_prof, df_pub, df_vin, df_proj = empty_tables()
+
+    storage = get_storage(base_dir)
+    print(f"Lendo {getattr(storage, 'path', base_dir)}...")
+    stored_prof, stored_pub, stored_vin = storage.read_tables()
+    if not stored_prof.empty:
+        df_prof = stored_prof
+    if not stored_pub.empty:
+        df_pub = stored_pub
+        # Converte para string para evitar erros de tipo em filtros e buscas
+        df_pub['pmid'] = df_pub['pmid'].astype(str).str.strip()
+    else:
+        print("[WARN] Nenhuma publicação cadastrada.")
+
+    if not stored_vin.empty:
+        df_vin = stored_vin
+
+        # Garantir integridade referencial (remover órfãos)
+        if not df_pub.empty:
+            original_count = len(df_vin)
+            df_vin['pmid'] = df_vin['pmid'].astype(str).str.strip()
+            pub_pmids = set(df_pub['pmid'].unique())
+
+            df_vin = df_vin[df_vin['pmid'].isin(pub_pmids)]
+            removed = original_count - len(df_vin)
+            if removed > 0:
+                print(f"[DATA INTEGRITY] Ignorados {removed} vínculos órfãos (PMIDs sem publicação cadastrada).")
+
+    # Load Projects if exists
+    proj_path = os.path.join(base_dir, "projetos.csv")
+    if os.path.exists(proj_path):
+        print(f"Lendo {proj_path}...")
+        df_proj = pd.read_csv(proj_path)
+        df_proj = df_proj.fillna("")
+    else:
+        print("Aviso: projetos.csv não encontrado.")
+
+    # Ensure new columns exist even if CSV is old format (safety)
+    if 'atuacao' not in df_prof.columns:
+        df_prof['atuacao'] = ""
+
+    # Ensure ISSN column exists in publications
+    if 'issn' not in df_pub.columns:
+        df_pub['issn'] = "N/A"
+
+    # Apply Qualis to Publications (New column 'qualis')
+    print("Mapeando Qualis para publicações...")
+    df_pub['qualis'] = df_pub['issn'].apply(get_qualis_stratum, qualis_map=qualis_map)
+
+    # Helper: Fill NaNs
+    df_prof = df_prof.fillna("")
+    df_pub = df_pub.fillna("")
+
+    return df_prof, df_pub, df_vin, df_proj
+
+
+def prepare_publications(df_pub, base_dir=None):
+    """Separa os resumos (arquivo auxiliar em `base_dir`) e compacta a tabela de publicações."""
+    df_pub, abstracts = split_abstracts(df_pub, base_dir)
+    return compact_publications(df_pub), abstracts
+
+
+def parse_tables(base_dir):
+    """
+    Qualis + tabelas lidas, limpas e com o estrato Qualis de cada publicação,
+    e o store dos resumos que saíram da tabela de publicações.
+    """
+    # Load Qualis first
+    qualis_map = load_qualis(base_dir)
+    df_prof, df_pub, df_vin, df_proj = read_tables(base_dir, qualis_map)
+    df_pub, abstracts = prepare_publications(df_pub, base_dir)
+    return qualis_map, (df_prof, df_pub, df_vin, df_proj), abstracts
+
+
+def load_tables(base_dir):
+    """parse_tables servido pelo cache binário enquanto nenhuma fonte mudar."""
+    sources = get_storage(base_dir).source_files() + [
+        os.path.join(base_dir, "qualis_odontologia.csv"),
+        os.path.join(base_dir, "projetos.csv"),
+    ]
+    return load_cached(base_dir, sources, lambda: parse_tables(base_dir))
+
+
+def build_graph_payload(df_prof, prof_pub_index, coauthor_index):
+    """
+    Nodes and links for the force-directed graph, computed once per data version.
+    Nodes: Professors / Links: Shared publications (Co-authorship)
+    """
+    nodes = df_prof[['id_professor', 'nome', 'atuacao', 'categoria']].to_dict(orient="records")
+    photo_urls = df_prof['photos'].tolist() if 'photos' in df_prof.columns else [None] * len(nodes)
+    # Rename for graph lib compatibility commonly used (id, label)
+    for n, urls in zip(nodes, photo_urls):
+        n['id'] = n['id_professor']
+        n['label'] = n['nome']
+        # Photo: the resized thumbnail (content-hashed URL), None if there is no photo
+        n['photo'] = urls['thumb']['webp'] if urls else None
+        # Add publication count for node sizing
+        n['total_publicacoes'] = len(prof_pub_index.get(n['id_professor'], []))
+
+    return {"nodes": nodes, "links": build_graph_links(coauthor_index)}
+
+
+def derive_snapshot(version, qualis_map, df_prof, df_pub, df_vin, df_proj, search_index=None, abstracts=None):
+    """
+    Monta o snapshot (agregados e índices) a partir das tabelas já lidas e limpas.
+    `search_index` de um snapshot anterior com as mesmas publicações é reaproveitado
+    se a ordenação por ano não mudar nenhuma posição. `abstracts` é o store dos
+    resumos referenciados pela coluna 'abstract_id' de df_pub.
+    """
+    # Duração de cada fase em /metrics (odontopub_load_phase_*)
+    timer = metrics.PhaseTimer()
+
+    # --- Calculate Per-Professor Qualis Stats ---
+    # One join (vinculos x publicacoes) + one groupby for every professor at once
+    print("Calculando estatísticas de Qualis por professor...")
+    df_links = build_link_table(df_vin, df_pub)
+    df_qualis_prof = build_qualis_table(df_links, df_prof['id_professor'].tolist() if not df_prof.empty else [])
+    df_prof = df_prof.assign(qualis_stats=df_qualis_prof[QUALIS_STRATA].to_dict(orient="records"))
+    timer.mark("qualis_stats")
+    # URLs of the resized photo variants (generated on first sight of each photo)
+    df_prof = df_prof.assign(photos=photos.manifest(df_prof['nome']))
+    timer.mark("photos")
+
+    # SORT PROFESSORS ALPHABETICALLY
+    if not df_prof.empty:
+        df_prof = df_prof.sort_values(by="nome").reset_index(drop=True)
+
+    # --- Build Lookup Indexes ---
+    # Publications are presorted by year (desc) so per-professor slices need no sort
+    print("Construindo índices professor -> publicações...")
+    sorted_pub = sort_publications(df_pub)
+    if search_index is not None and not sorted_pub['pmid'].equals(df_pub['pmid'].reset_index(drop=True)):
+        search_index = None
+    df_pub = sorted_pub
+    pmid_index = build_row_index(df_pub.assign(pmid=pmid_strings(df_pub)), 'pmid')
+    prof_row_index = build_row_index(df_prof, 'id_professor') if not df_prof.empty else {}
+    prof_pub_index = build_professor_index(df_vin, pmid_index)
+    timer.mark("indexes")
+
+    if search_index is None:
+        print("Construindo índice de busca de publicações...")
+        search_index = SearchIndex(df_pub)
+    pub_professors = build_publication_professors(df_links, df_prof)
+    timer.mark("search_index")
+
+    print("Construindo matriz de coautoria...")
+    coauthor_index = build_coauthorship(df_links, pmid_index)
+    shared_pmids = {p for neighbours in coauthor_index.values() for pmids in neighbours.values() for p in pmids}
+    shared_pub_summaries = build_publication_summaries(df_pub, pmid_index, shared_pmids)
+    timer.mark("coauthorship")
+
+    print("Montando grafo de colaboração...")
+    graph_payload = build_graph_payload(df_prof, prof_pub_index, coauthor_index)
+    timer.mark("graph")
+
+    print("Pré-calculando agregados de estatísticas...")
+    stats_cube = StatsCube(df_pub, df_prof, df_links, pmid_index)
+    timer.mark("stats_cube")
+
+    return DataSnapshot(
+        version=version,
+        loaded_at=datetime.now(),
+        qualis_map=qualis_map,
+        df_prof=df_prof,
+        df_pub=df_pub,
+        df_vin=df_vin,
+        df_proj=df_proj,
+        df_links=df_links,
+        df_qualis_prof=df_qualis_prof,
+        pmid_index=pmid_index,
+        prof_row_index=prof_row_index,
+        prof_pub_index=prof_pub_index,
+        search_index=search_index,
+        pub_professors=pub_professors,
+        coauthor_index=coauthor_index,
+        shared_pub_summaries=shared_pub_summaries,
+        graph_payload=graph_payload,
+        stats_cube=stats_cube,
+        abstracts=abstracts if abstracts is not None else AbstractStore(),
+    )
+
+
+def build_snapshot(version, base_dir=None):
+    """Lê tudo do disco e monta um snapshot completo; em caso de erro, um snapshot vazio."""
+    base_dir = base_dir or BASE_DIR
+    try:
+        print("--- Iniciando carregamento de dados ---")
+        # Log to file for verification if print is buffered
+        with open(os.path.join(base_dir, "backend_startup.log"), "a") as f:
+            f.write(f"\n[{pd.Timestamp.now()}] Iniciando carregamento de dados...\n")
+        timer = metrics.PhaseTimer()
+        qualis_map, tables, abstracts = load_tables(base_dir)
+        timer.mark("load_tables")
+        snapshot = derive_snapshot(version, qualis_map, *tables, abstracts=abstracts)
+        timer.mark("derive")
+        print("[OK] Dados carregados com sucesso!")
+        return snapshot
+    except Exception as e:
+        print(f"[ERROR] ERRO CRÍTICO no carregamento de dados: {e}")
+        traceback.print_exc()
+        # Fallback: empty data, so the API keeps answering
+        df_prof, df_pub, df_vin, df_proj = empty_tables()
+        df_pub, abstracts = prepare_publications(df_pub)
+        return derive_snapshot(version, {}, df_prof, df_pub, df_vin, df_proj, abstracts=abstracts)
+
+
+# ================= PUBLICAÇÃO ================= #
+
+_current = None
+_versions = itertools.count(1)
+# (segundo, versão) da primeira versão publicada no segundo mais recente: o Last-Modified
+# tem resolução de 1 s e não distingue versões publicadas no mesmo segundo
+_first_in_second = (None, None)
+_build_lock = threading.Lock()
+
+_reload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="data-reload")
+_reload_lock = threading.Lock()
+_pending_reload = None
+
+
+def get_snapshot():
+    """Snapshot publicado mais recente (None antes da primeira carga). Nunca bloqueia."""
+    return _current
+
+
+def publish(snapshot):
+    """Torna `snapshot` visível para as próximas requisições (troca de uma referência)."""
+    global _current, _first_in_second
+    second = int(snapshot.loaded_at.timestamp())
+    if _first_in_second[0] != second:
+        _first_in_second = (second, snapshot.version)
+    _current = snapshot
+
+
+def shares_modified_second(snapshot):
+    """Outra versão foi publicada antes de `snapshot` no mesmo segundo (mesmo Last-Modified)."""
+    second, version = _first_in_second
+    return second == int(snapshot.loaded_at.timestamp()) and version != snapshot.version
+
+
+def load_data():
+    """
+    Monta e publica um snapshot novo de forma síncrona (usado na inicialização).
+    As versões são atribuídas sob lock, então crescem na mesma ordem da publicação.
+    """
+    with _build_lock:
+        snapshot = build_snapshot(next(_versions))
+        publish(snapshot)
+    return snapshot
+
+
+def apply_change(change):
+    """
+    Aplica uma alteração pontual: `change(snapshot_atual, versão)` devolve o snapshot
+    novo, que é publicado. Roda sob o mesmo lock das recargas, então parte sempre do
+    último snapshot publicado. Se a alteração falhar, agenda uma recarga completa.
+    """
+    with _build_lock:
+        try:
+            snapshot = change(_current, next(_versions))
+        except Exception as e:
+            print(f"[WARN] Atualização incremental falhou ({e}); recarregando tudo.")
+            traceback.print_exc()
+            snapshot = None
+        else:
+            publish(snapshot)
+    if snapshot is None:
+        request_reload()
+    return snapshot
+
+
+def request_reload():
+    """
+    Agenda uma recarga na thread de recarga e retorna o Future correspondente.
+    Pedidos que chegam enquanto outra recarga ainda está na fila são agrupados nela:
+    como ela ainda não começou a ler os arquivos, verá também as escritas mais novas.
+    """
+    global _pending_reload
+    with _reload_lock:
+        pending = _pending_reload
+        if pending is not None and not pending.running() and not pending.done():
+            return pending
+        _pending_reload = _reload_executor.submit(load_data)
+        return _pending_reload
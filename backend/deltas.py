@@ -0,0 +1,218 @@
+import dataclasses
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .indexes import (
+    QUALIS_STRATA,
+    order_by_year,
+    build_publication_summaries,
+)
+from .pub_table import (
+    assign_values,
+    concat_rows,
+    pmid_strings,
+    pmid_value,
+)
+from .storage import clean_value
+from . import photos
+from .data_store import (
+    derive_snapshot,
+    get_qualis_stratum,
+    build_graph_payload,
+)
+
+# Alterações pontuais vindas do painel admin, aplicadas sobre o snapshot atual.
+#
+# Cada função recebe o snapshot publicado e devolve um snapshot novo (copy-on-write:
+# só as estruturas afetadas são copiadas, o resto é compartilhado). Nada é relido do
+# disco e o Qualis só é calculado para a linha alterada. Se algo não puder ser aplicado
+# incrementalmente, a função levanta exceção e quem chamou cai na recarga completa.
+
+
+def _as_loaded(row):
+    """
+    Normaliza a linha como o storage grava e a carga completa lê (vazios e textos
+    como "N/A" viram ""), para que o snapshot fique igual ao de uma recarga.
+    """
+    values = {c: clean_value(v) for c, v in row.items()}
+    return {c: "" if v is None else v for c, v in values.items()}
+
+
+def _coerce_year(ano, column):
+    """Converte o ano recebido (texto) para o tipo da coluna 'ano' carregada do CSV."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.cat.categories
+    if pd.api.types.is_integer_dtype(column):
+        text = str(ano).strip()
+        if not text.lstrip('-').isdigit():
+            # Misturaria texto numa coluna inteira: só a recarga completa trata isso
+            raise ValueError(f"Ano não numérico: {ano!r}")
+        return int(text)
+    return ano
+
+
+def _ordered_pmids(df_pub, pmid_index, pmids):
+    positions = order_by_year(df_pub, [pmid_index[p] for p in pmids])
+    return pmid_strings(df_pub).iloc[positions].tolist()
+
+
+def apply_publication(snap, version, pmid, pub=None, id_professor=None):
+    """
+    Inclui/atualiza a publicação `pmid` com os campos de `pub` (None = mantém a linha)
+    e, se `id_professor` for dado, vincula o professor a ela.
+    Índices, contagens Qualis, coautoria, postings de busca e células de /stats
+    são atualizados só para a publicação e os professores vinculados a ela.
+    """
+    pmid = str(pmid).strip()
+    df_pub = snap.df_pub
+    pmid_index = snap.pmid_index
+    pos = pmid_index.get(pmid)
+    if pos is None and pub is None:
+        raise KeyError(f"Publicação {pmid} não está carregada")
+
+    # (ano, professores) antes da alteração, para as células de /stats
+    before = None if pos is None else (df_pub['ano'].iat[pos], [])
+    row = None
+    abstracts = snap.abstracts
+    if pub is not None:
+        current = df_pub.iloc[pos].to_dict() if pos is not None else {}
+        if pos is not None:
+            current['abstract'] = snap.abstracts.get(current['abstract_id'])
+        fields = [c for c in df_pub.columns if c not in ('qualis', 'abstract_id')] + ['abstract']
+        row = _as_loaded({c: pub.get(c, current.get(c, "")) for c in fields})
+        row['pmid'] = pmid
+        row['ano'] = _coerce_year(row['ano'], df_pub['ano'])
+        row['qualis'] = get_qualis_stratum(row.get('issn', "N/A"), snap.qualis_map)
+
+        # O resumo vai para o store (a tabela guarda só o número dele); na atualização
+        # substitui o anterior no mesmo número
+        abstracts, abstract_id = snap.abstracts.with_abstract(
+            row['abstract'], None if pos is None else current['abstract_id'])
+        values = {c: row[c] for c in df_pub.columns if c in row}
+        values['pmid'] = pmid_value(df_pub, pmid)
+        values['abstract_id'] = abstract_id
+
+        if pos is None:
+            pos = len(df_pub)
+            df_pub = concat_rows(df_pub, [values])
+            pmid_index = dict(pmid_index)
+            pmid_index[pmid] = pos
+        else:
+            df_pub = assign_values(df_pub.copy(), pos, values)
+
+    # Vínculos: atualiza ano/qualis das linhas desta publicação e acrescenta o novo par
+    df_vin, df_links = snap.df_vin, snap.df_links
+    link_mask = (df_links['pmid'] == pmid).to_numpy()
+    profs = set(df_links.loc[link_mask, 'id_professor'].tolist())
+    if before is not None:
+        before = (before[0], sorted(profs))
+    if row is not None and link_mask.any():
+        df_links = assign_values(df_links.copy(), link_mask, {'ano': row['ano'], 'qualis': row['qualis']})
+    if id_professor is not None and id_professor not in profs:
+        df_vin = pd.concat([df_vin, pd.DataFrame([{"pmid": pmid, "id_professor": id_professor}])], ignore_index=True)
+        link = {"pmid": pmid, "id_professor": id_professor,
+                "ano": df_pub['ano'].iat[pos], "qualis": df_pub['qualis'].iat[pos]}
+        df_links = concat_rows(df_links, [link])
+        profs.add(id_professor)
+
+    # Publicações por professor (reordenadas por ano, que pode ter mudado)
+    prof_pub_index = dict(snap.prof_pub_index)
+    for p in profs:
+        prof_pub_index[p] = order_by_year(df_pub, np.append(prof_pub_index.get(p, []), pos))
+
+    # Contagens Qualis por professor: só as linhas dos professores afetados
+    df_qualis_prof = snap.df_qualis_prof.copy()
+    df_prof = snap.df_prof
+    qualis_stats = df_prof['qualis_stats'].tolist() if 'qualis_stats' in df_prof.columns else None
+    for p in profs:
+        if p not in df_qualis_prof.index:
+            continue
+        counts = df_pub['qualis'].iloc[prof_pub_index[p]].value_counts()
+        counts = counts[counts > 0]
+        for stratum in counts.index.difference(df_qualis_prof.columns):
+            df_qualis_prof[stratum] = 0
+        df_qualis_prof.loc[p] = counts.reindex(df_qualis_prof.columns, fill_value=0).astype(int)
+        if qualis_stats is not None and p in snap.prof_row_index:
+            qualis_stats[snap.prof_row_index[p]] = {q: int(df_qualis_prof.at[p, q]) for q in QUALIS_STRATA}
+    if qualis_stats is not None:
+        df_prof = df_prof.assign(qualis_stats=qualis_stats)
+
+    # Professores da publicação (para os resultados de busca)
+    names = sorted(df_prof['nome'].iat[snap.prof_row_index[p]] for p in profs if p in snap.prof_row_index)
+    pub_professors = dict(snap.pub_professors)
+    if names:
+        pub_professors[pmid] = names
+
+    # Coautoria: pares entre os professores desta publicação
+    coauthor_index = dict(snap.coauthor_index)
+    shared_pub_summaries = snap.shared_pub_summaries
+    if len(profs) > 1:
+        for a in profs:
+            neighbours = dict(coauthor_index.get(a, {}))
+            for b in profs - {a}:
+                pmids = set(neighbours.get(b, [])) | {pmid}
+                neighbours[b] = _ordered_pmids(df_pub, pmid_index, pmids)
+            coauthor_index[a] = neighbours
+        shared_pub_summaries = dict(shared_pub_summaries)
+        shared_pub_summaries.update(build_publication_summaries(df_pub, pmid_index, [pmid]))
+
+    search_index = snap.search_index
+    if row is not None:
+        search_index = search_index.with_document(pos, row)
+
+    after = (df_pub['ano'].iat[pos], sorted(profs))
+    stats_cube = snap.stats_cube.with_publication(pos, df_pub.iloc[pos], before, after)
+
+    return dataclasses.replace(
+        snap,
+        version=version,
+        loaded_at=datetime.now(),
+        df_prof=df_prof,
+        df_pub=df_pub,
+        df_vin=df_vin,
+        df_links=df_links,
+        df_qualis_prof=df_qualis_prof,
+        pmid_index=pmid_index,
+        prof_pub_index=prof_pub_index,
+        search_index=search_index,
+        pub_professors=pub_professors,
+        coauthor_index=coauthor_index,
+        shared_pub_summaries=shared_pub_summaries,
+        graph_payload=build_graph_payload(df_prof, prof_pub_index, coauthor_index),
+        stats_cube=stats_cube,
+        abstracts=abstracts,
+        memo={},
+    )
+
+
+def rederive(snap, version, df_prof=None, df_pub=None, df_vin=None):
+    """
+    Snapshot novo a partir das tabelas em memória, trocando as que foram passadas.
+    Usado para alterações que mexem em muitas estruturas (remoções, professores):
+    não relê os CSVs nem recalcula o Qualis, e reaproveita o índice de busca
+    quando as publicações não mudaram.
+    """
+    search_index = snap.search_index if df_pub is None else None
+    df_prof = snap.df_prof if df_prof is None else df_prof
+    df_pub = snap.df_pub if df_pub is None else df_pub
+    df_vin = snap.df_vin if df_vin is None else df_vin
+    return derive_snapshot(version, snap.qualis_map, df_prof.drop(columns=['qualis_stats', 'photos'], errors='ignore'),
+                           df_pub, df_vin, snap.df_proj, search_index=search_index, abstracts=snap.abstracts)
+
+
+def refresh_photos(snap, version):
+    """
+    Snapshot novo com as URLs das fotos relidas (depois do envio de uma foto).
+    Só a coluna 'photos' de df_prof e o payload do grafo mudam.
+    """
+    df_prof = snap.df_prof.assign(photos=photos.manifest(snap.df_prof['nome']))
+    return dataclasses.replace(
+        snap,
+        version=version,
+        loaded_at=datetime.now(),
+        df_prof=df_prof,
+        graph_payload=build_graph_payload(df_prof, snap.prof_pub_index, snap.coauthor_index),
+        memo={},
+    )
@@ -0,0 +1,139 @@
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.staticfiles import StaticFiles
+
+from .data_store import get_snapshot, shares_modified_second
+from . import metrics
+
+# GET condicional amarrado à versão dos dados.
+#
+# Todo snapshot publicado (load_data, recarga, alteração do admin) tem uma versão nova,
+# e as rotas públicas só leem o snapshot: a versão identifica o conteúdo de qualquer
+# GET. O middleware responde 304 a If-None-Match / If-Modified-Since da versão atual
+# antes de chegar ao endpoint (nada é calculado nem serializado) e acrescenta ETag e
+# Last-Modified às respostas 200. Last-Modified só tem resolução de segundos: quando
+# duas versões saem no mesmo segundo (ex.: edição do admin logo após uma recarga), um
+# If-Modified-Since daquele segundo não prova que a cópia é a atual e recebe 200.
+
+# Rotas fora do esquema: admin (autenticado), arquivos estáticos (têm ETag próprio), docs
+# e o andamento das importações (muda sem mudar a versão dos dados)
+EXCLUDED_PREFIXES = ("/api/admin", "/assets", "/docs", "/redoc", "/openapi.json", "/upload-template",
+                     "/metrics")
+
+# O navegador guarda a resposta mas revalida a cada uso (dados mudam sem aviso)
+CACHE_CONTROL = "no-cache"
+# Arquivos com hash do conteúdo no nome nunca mudam: um ano, sem revalidar
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def snapshot_tag(snap):
+    """
+    Identificador da versão dos dados. Leva o instante da carga junto com o contador,
+    para não coincidir entre processos (cada worker numera as próprias versões).
+    """
+    return f"v{snap.version}.{int(snap.loaded_at.timestamp() * 1000):x}"
+
+
+def etag(snap, encoding=None):
+    """ETag forte da representação: versão + Content-Encoding (gzip e identidade são bytes diferentes)."""
+    suffix = f"-{encoding}" if encoding else ""
+    return f'"{snapshot_tag(snap)}{suffix}"'
+
+
+def last_modified(snap):
+    return formatdate(snap.loaded_at.timestamp(), usegmt=True)
+
+
+def _matching_etag(if_none_match, snap):
+    """ETag de If-None-Match que é desta versão dos dados (em qualquer codificação), ou None."""
+    tag = snapshot_tag(snap)
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return etag(snap)
+        opaque = candidate.removeprefix("W/").strip('"')
+        if opaque == tag or opaque.startswith(f"{tag}-"):
+            return f'"{opaque}"'
+    return None
+
+
+def _not_modified_since(if_modified_since, snap):
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    second = int(snap.loaded_at.timestamp())
+    if second == since.timestamp() and shares_modified_second(snap):
+        return False  # a cópia pode ser de uma versão anterior do mesmo segundo
+    return second <= since.timestamp()
+
+
+def not_modified_etag(headers, snap):
+    """
+    ETag a devolver num 304 se a cópia do cliente é desta versão, senão None.
+    If-None-Match tem precedência; If-Modified-Since só vale sem ele (RFC 9110).
+    """
+    if "if-none-match" in headers:
+        return _matching_etag(headers["if-none-match"], snap)
+    if "if-modified-since" in headers and _not_modified_since(headers["if-modified-since"], snap):
+        return etag(snap)
+    return None
+
+
+class ConditionalGetMiddleware:
+    """Middleware ASGI: 304 sem executar o endpoint e cabeçalhos de validação nos 200."""
+
+    def __init__(self, app, excluded_prefixes=EXCLUDED_PREFIXES):
+        self.app = app
+        self.excluded_prefixes = excluded_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD") \
+                or scope["path"].startswith(self.excluded_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        snap = get_snapshot()
+        if snap is None:
+            await self.app(scope, receive, send)
+            return
+
+        matched = not_modified_etag(Headers(scope=scope), snap)
+        if matched is not None:
+            metrics.cache_hit("conditional_get")
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [
+                    (b"etag", matched.encode()),
+                    (b"last-modified", last_modified(snap).encode()),
+                    (b"cache-control", CACHE_CONTROL.encode()),
+                    (b"vary", b"Accept-Encoding"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+        metrics.cache_miss("conditional_get")
+
+        async def send_with_validators(message):
+            # O corpo foi gerado a partir do snapshot lido acima ou de um mais novo;
+            # no segundo caso o ETag antigo só faz a próxima revalidação baixar de novo
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(scope=message)
+                if "etag" not in headers:
+                    headers["ETag"] = etag(snap, headers.get("content-encoding"))
+                    headers["Last-Modified"] = last_modified(snap)
+                    headers.setdefault("Cache-Control", CACHE_CONTROL)
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles para arquivos de nome versionado (hash do conteúdo): cache de longa duração."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
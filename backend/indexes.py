@@ -0,0 +1,231 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Índices em memória construídos uma vez por carga de dados (load_data).
+# Todos usam posições de linha (iloc) em df_pub / df_prof, de modo que os
+# endpoints por professor custam O(publicações daquele professor), e não
+# O(total de linhas) como um filtro booleano sobre o DataFrame inteiro.
+
+
+PMID_DIGITS = re.compile(r"[0-9]+")
+
+
+def publication_sort_key(ano, pmid):
+    """
+    Chave da ordem de exibição das publicações: ano decrescente (anos inválidos por
+    último) e, no mesmo ano, pmid numérico decrescente (pmids não numéricos depois,
+    em ordem alfabética). É uma ordem total e estável entre versões dos dados, usada
+    como cursor de paginação; sort_publications e order_by_year seguem a mesma regra.
+    """
+    year = pd.to_numeric(ano, errors='coerce')
+    year_missing = bool(pd.isna(year))
+    text = str(pmid)
+    numeric = PMID_DIGITS.fullmatch(text) is not None
+    return (year_missing, 0.0 if year_missing else -float(year),
+            not numeric, -int(text) if numeric else 0, text)
+
+
+def _sort_key_columns(anos, pmids):
+    """Colunas da chave de publication_sort_key, vetorizadas (na mesma ordem)."""
+    anos = pd.to_numeric(pd.Series(anos), errors='coerce').to_numpy(dtype=float)
+    texts = pd.Series(pmids).astype(str)
+    numeric = texts.str.fullmatch(PMID_DIGITS.pattern).to_numpy(dtype=bool)
+    values = pd.to_numeric(texts.where(numeric), errors='coerce').fillna(0).to_numpy(dtype=float)
+    missing = np.isnan(anos)
+    return missing, -np.nan_to_num(anos), ~numeric, -values, texts.to_numpy(dtype=object)
+
+
+def _ordering(missing, neg_year, non_numeric, neg_pmid, texts):
+    """Permutação que ordena as linhas pelas colunas da chave (a primeira é a mais importante)."""
+    text_codes = pd.factorize(texts, sort=True)[0]
+    return np.lexsort((text_codes, neg_pmid, non_numeric, neg_year, missing))
+
+
+def sort_publications(df_pub):
+    """
+    Ordena as publicações pela chave de publication_sort_key (ano desc, pmid desc)
+    e reinicia o índice. Com a tabela pré-ordenada, qualquer subconjunto de posições
+    em ordem crescente já sai na ordem "mais recentes primeiro" sem um sort por requisição.
+    """
+    if df_pub.empty:
+        return df_pub.reset_index(drop=True)
+    order = _ordering(*_sort_key_columns(df_pub['ano'], df_pub['pmid']))
+    return df_pub.iloc[order].reset_index(drop=True)
+
+
+def build_row_index(df, column):
+    """Mapeia cada valor de `column` para a posição (iloc) da sua primeira linha."""
+    index = {}
+    for pos, key in enumerate(df[column].tolist()):
+        index.setdefault(key, pos)
+    return index
+
+
+def order_by_year(df_pub, positions):
+    """
+    Ordena posições de df_pub pela chave de publication_sort_key (ano desc, pmid desc).
+    Na tabela recém-carregada isso coincide com a ordem das posições; é usado quando
+    uma atualização incremental acrescenta ou altera linhas.
+    """
+    positions = np.unique(np.asarray(positions, dtype=np.int64))
+    if len(positions) == 0:
+        return positions
+    rows = df_pub.iloc[positions]
+    return positions[_ordering(*_sort_key_columns(rows['ano'].to_numpy(dtype=object), rows['pmid'].to_numpy()))]
+
+
+def build_professor_index(df_vin, pmid_pos):
+    """
+    Agrupa os vínculos em id_professor -> array de posições em df_pub.
+    As posições saem ordenadas (crescentes) e sem duplicatas; como df_pub é
+    pré-ordenado por ano, isso equivale à ordem por ano decrescente.
+    """
+    if df_vin.empty:
+        return {}
+
+    pos = df_vin['pmid'].astype(str).str.strip().map(pmid_pos)
+    links = pd.DataFrame({
+        'id_professor': df_vin['id_professor'].to_numpy(),
+        'pos': pos.to_numpy()
+    }).dropna()
+    links['pos'] = links['pos'].astype(np.int64)
+    links = links.drop_duplicates().sort_values(['id_professor', 'pos'], kind='stable')
+
+    ids = links['id_professor'].to_numpy()
+    positions = links['pos'].to_numpy()
+    # Fronteiras entre grupos consecutivos do mesmo professor
+    bounds = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+    starts = np.concatenate(([0], bounds))
+    return {
+        int(ids[s]): chunk
+        for s, chunk in zip(starts, np.split(positions, bounds))
+    }
+
+
+# Estratos Qualis na ordem de exibição (do melhor para o pior)
+QUALIS_STRATA = ["A1", "A2", "A3", "A4", "B1", "B2", "B3", "B4", "N/A"]
+
+
+def build_link_table(df_vin, df_pub):
+    """
+    Junta os vínculos às colunas de publicação usadas nas agregações
+    (uma linha por par professor/publicação, sem órfãos nem duplicatas).
+    """
+    links = df_vin[['pmid', 'id_professor']].copy()
+    links['pmid'] = links['pmid'].astype(str).str.strip()
+    links = links.drop_duplicates()
+    # df_pub pode guardar pmids como inteiros (layout compacto); o vínculo usa texto
+    pubs = df_pub[['pmid', 'ano', 'qualis']].assign(pmid=df_pub['pmid'].astype(str))
+    return links.merge(pubs, on='pmid', how='inner')
+
+
+def build_qualis_table(df_links, prof_ids):
+    """
+    Contagem de publicações por estrato Qualis para todos os professores em uma
+    única passada (groupby + unstack). Linhas seguem `prof_ids`; professores sem
+    publicações recebem zeros. Estratos fora de QUALIS_STRATA (ex.: "C") são
+    mantidos ao final, para que a soma da linha seja o total do professor.
+    """
+    counts = df_links.groupby(['id_professor', 'qualis'], observed=True).size().unstack(fill_value=0)
+    extra = sorted(c for c in counts.columns if c not in QUALIS_STRATA)
+    return counts.reindex(index=prof_ids, columns=QUALIS_STRATA + extra, fill_value=0).astype(int)
+
+
+def build_publication_professors(df_links, df_prof):
+    """
+    Mapeia pmid -> lista de nomes dos professores vinculados (em ordem alfabética,
+    a mesma de df_prof), para juntar autores do departamento a resultados de busca.
+    """
+    if df_links.empty or df_prof.empty:
+        return {}
+    names = df_prof.set_index('id_professor')['nome']
+    named = df_links[['pmid', 'id_professor']].merge(
+        names.rename('nome'), left_on='id_professor', right_index=True, how='inner'
+    ).sort_values('nome', kind='stable')
+    return named.groupby('pmid', sort=False)['nome'].agg(list).to_dict()
+
+
+def build_coauthorship(df_links, pmid_pos):
+    """
+    Estrutura esparsa de coautoria: id_professor -> {id_coautor: [pmids compartilhados]}.
+    Só pares que de fato compartilham publicações são armazenados (lista de adjacência),
+    cada lista de pmids na ordem de df_pub (ano desc). A relação é simétrica.
+    """
+    if df_links.empty:
+        return {}
+
+    links = df_links[['pmid', 'id_professor']].drop_duplicates()
+    links = links.assign(pos=links['pmid'].map(pmid_pos))
+    pairs = links.merge(links[['pmid', 'id_professor']], on='pmid')
+    pairs = pairs[pairs['id_professor_x'] != pairs['id_professor_y']]
+    pairs = pairs.sort_values(['id_professor_x', 'id_professor_y', 'pos'], kind='stable')
+    if pairs.empty:
+        return {}
+
+    a = pairs['id_professor_x'].to_numpy()
+    b = pairs['id_professor_y'].to_numpy()
+    pmids = pairs['pmid'].to_numpy()
+    bounds = np.flatnonzero((a[1:] != a[:-1]) | (b[1:] != b[:-1])) + 1
+    starts = np.concatenate(([0], bounds))
+
+    coauthors = {}
+    for s, chunk in zip(starts, np.split(pmids, bounds)):
+        coauthors.setdefault(int(a[s]), {})[int(b[s])] = chunk.tolist()
+    return coauthors
+
+
+def build_publication_summaries(df_pub, pmid_pos, pmids):
+    """
+    Resumo (pmid, título, ano, DOI) das publicações pedidas, indexado por pmid.
+    O abstract não entra: fica no arquivo de resumos e é lido por requisição.
+    """
+    positions = sorted({pmid_pos[p] for p in pmids if p in pmid_pos})
+    if not positions:
+        return {}
+    rows = df_pub.iloc[positions][['pmid', 'titulo', 'ano', 'doi']].astype(str)
+    return {
+        row['pmid']: {
+            'pmid': row['pmid'],
+            'title': row['titulo'],
+            'year': row['ano'],
+            'doi': row['doi']
+        }
+        for row in rows.to_dict(orient="records")
+    }
+
+
+def build_graph_links(coauthor_index):
+    """
+    Lista de arestas do grafo de coautoria (source < target, value = nº de publicações
+    compartilhadas), derivada da estrutura esparsa de coautoria sem self-join.
+    """
+    links = []
+    for source, neighbours in sorted(coauthor_index.items()):
+        for target, pmids in sorted(neighbours.items()):
+            if source < target:
+                links.append({"source": source, "target": target, "value": len(pmids)})
+    return links
+
+
+def prune_graph_links(links, min_weight=1, top_k_per_node=None):
+    """
+    Poda de arestas para grafos grandes: descarta arestas com peso < min_weight e,
+    se top_k_per_node for dado, mantém só as arestas que estão entre as k mais
+    fortes de pelo menos uma das duas pontas.
+    """
+    kept = [link for link in links if link["value"] >= min_weight]
+    if not top_k_per_node:
+        return kept
+
+    incident = {}
+    for i, link in enumerate(kept):
+        incident.setdefault(link["source"], []).append(i)
+        incident.setdefault(link["target"], []).append(i)
+
+    selected = set()
+    for edges in incident.values():
+        edges.sort(key=lambda i: -kept[i]["value"])
+        selected.update(edges[:top_k_per_node])
+    return [kept[i] for i in sorted(selected)]
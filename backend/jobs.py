@@ -0,0 +1,411 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Tarefas em segundo plano com estado consultável.
+#
+# Trabalhos demorados (ex.: importar um template enviado, sincronizar com o PubMed) não
+# rodam na requisição: o endpoint registra um Job, devolve o id e o cliente consulta o
+# andamento depois. Cada tipo de tarefa tem sua fila (um executor com poucos workers,
+# 1 por padrão), então tarefas do mesmo tipo rodam na ordem de chegada, no máximo
+# `max_workers` ao mesmo tempo. A tarefa publica o progresso em job.progress e checa
+# job.raise_if_cancelled() nos pontos em que pode parar; o cancelamento é cooperativo.
+#
+# O registro em memória guarda os MAX_FINISHED jobs terminados mais recentes e cada
+# mudança de estado vai também para um SQLite (JOBS_PATH), de onde saem jobs antigos
+# e os de execuções anteriores do servidor. Cada job registra o processo que o executa
+# (owner); na inicialização, os que estavam em andamento num processo que já não existe
+# ficam como 'error'. Os de outros workers vivos (vários processos do uvicorn dividindo
+# o mesmo arquivo) não são tocados. Cancelar um job de outro worker marca o pedido no
+# banco (coluna própria, que as gravações do dono não sobrescrevem) e o dono o lê nos
+# pontos de checagem, no máximo a cada CANCEL_CHECK_SECONDS.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOBS_FILENAME = "odontopub_jobs.sqlite3"
+
+MAX_FINISHED = 200
+# Jobs terminados ficam no banco por esse tempo
+RETENTION_SECONDS = 30 * 24 * 3600
+# Atualizações de progresso são gravadas no máximo uma vez por esse intervalo
+PROGRESS_SAVE_SECONDS = 1.0
+# Intervalo mínimo entre consultas ao banco por um pedido de cancelamento vindo de outro processo
+CANCEL_CHECK_SECONDS = 1.0
+
+QUEUED, RUNNING, DONE, ERROR, CANCELLED = "queued", "running", "done", "error", "cancelled"
+FINISHED_STATUSES = (DONE, ERROR, CANCELLED)
+
+HOSTNAME = socket.gethostname()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_kind ON jobs (kind, created_at);
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _start_time(pid):
+    """Instante de início do processo (campo starttime de /proc/<pid>/stat); "" se indisponível."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return f.read().rsplit(b")", 1)[1].split()[19].decode()
+    except (OSError, IndexError):
+        return ""
+
+
+def process_owner(pid=None):
+    """Identificação do processo: máquina, pid e início (pids são reaproveitados depois de reiniciar)."""
+    pid = os.getpid() if pid is None else pid
+    return f"{HOSTNAME}:{pid}:{_start_time(pid)}"
+
+
+def owner_alive(owner):
+    """
+    O processo dono do job ainda roda? Só dá para saber na mesma máquina; um dono de
+    outra máquina (ex.: container anterior, com outro hostname) conta como encerrado.
+    """
+    try:
+        host, pid, start = (owner or "").rsplit(":", 2)
+        pid = int(pid)
+    except ValueError:
+        return False  # job gravado antes do registro do dono
+    if host != HOSTNAME:
+        return False
+    if start:
+        return _start_time(pid) == start
+    try:
+        os.kill(pid, 0)  # sem /proc: só a existência do pid
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class Job:
+    """
+    Estado de uma tarefa. `result` é o que a função devolveu; `error`, a mensagem da
+    exceção; `progress`, contadores que a própria tarefa atualiza enquanto roda.
+    """
+
+    def __init__(self, kind, params=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.owner = process_owner()
+        self._cancel = threading.Event()
+        self._saved_at = 0.0
+        self._cancel_checked_at = 0.0
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Pede o cancelamento: um job na fila nem começa; um em andamento para no próximo ponto de checagem."""
+        self._cancel.set()
+        if _jobs.get(self.id) is not self:
+            # Cópia lida do banco (job de outro processo): o dono vê o pedido e finaliza o job
+            _request_cancel(self)
+            return
+        if self.status == QUEUED:
+            self.status, self.finished_at = CANCELLED, time.time()
+        _save(self)
+
+    def refresh_cancel(self):
+        """Traz um pedido de cancelamento feito por outro processo (consulta o banco no máximo a cada CANCEL_CHECK_SECONDS)."""
+        if self._cancel.is_set() or time.time() - self._cancel_checked_at < CANCEL_CHECK_SECONDS:
+            return
+        self._cancel_checked_at = time.time()
+        store = get_store()
+        try:
+            if store is not None and store.cancel_requested(self.id):
+                self._cancel.set()
+        except sqlite3.Error as e:
+            print(f"[WARN] Pedido de cancelamento do job {self.id} não consultado: {e}")
+
+    def raise_if_cancelled(self):
+        self.refresh_cancel()
+        if self._cancel.is_set():
+            raise JobCancelled("Cancelado a pedido")
+
+    def update(self, **progress):
+        """Define valores de progresso (gravados no banco no máximo a cada PROGRESS_SAVE_SECONDS)."""
+        self.progress.update(progress)
+        self._save_progress()
+
+    def advance(self, **increments):
+        """Soma aos contadores de progresso."""
+        for key, value in increments.items():
+            self.progress[key] = self.progress.get(key, 0) + value
+        self._save_progress()
+
+    def _save_progress(self):
+        if time.time() - self._saved_at >= PROGRESS_SAVE_SECONDS:
+            _save(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "progress": self.progress,
+            "cancel_requested": self.cancel_requested,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "owner": self.owner,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data["kind"], data.get("params"))
+        job.owner = None  # registros antigos não têm dono
+        for key in ("id", "status", "progress", "result", "error", "created_at", "started_at", "finished_at", "owner"):
+            setattr(job, key, data.get(key, getattr(job, key)))
+        if data.get("cancel_requested"):
+            job._cancel.set()
+        return job
+
+
+# ================= PERSISTÊNCIA ================= #
+
+class JobStore:
+    """Estado dos jobs em SQLite (um registro por job, o to_dict() em JSON)."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._transaction() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "cancel_requested" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, job):
+        # O pedido de cancelamento só é ligado aqui, nunca desligado: outro processo pode tê-lo gravado
+        data = job.to_dict()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, created_at, updated_at, data, cancel_requested) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at, "
+                "data = excluded.data, cancel_requested = MAX(cancel_requested, excluded.cancel_requested)",
+                (job.id, job.kind, job.status, job.created_at, time.time(), json.dumps(data, default=str),
+                 int(job.cancel_requested)),
+            )
+
+    def request_cancel(self, job_id):
+        """Marca o pedido de cancelamento de um job não terminado; False se ele já terminou."""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN (?, ?)",
+                                (job_id, QUEUED, RUNNING)).rowcount > 0
+
+    def cancel_requested(self, job_id):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    @staticmethod
+    def _job(data, cancel_requested):
+        job = Job.from_dict(json.loads(data))
+        if cancel_requested:
+            job._cancel.set()
+        return job
+
+    def load(self, job_id):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data, cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(*row) if row else None
+
+    def recent(self, kind, limit):
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT data, cancel_requested FROM jobs WHERE kind = ? ORDER BY created_at DESC "
+                                "LIMIT ?", (kind, limit)).fetchall()
+        return [self._job(*row) for row in rows]
+
+    def recover(self, now=None):
+        """
+        Na inicialização: jobs na fila ou em andamento cujo processo dono não existe mais
+        viram 'error' (o trabalho se perdeu) e terminados além da retenção são apagados.
+        Devolve quantos jobs foram marcados.
+        """
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT data FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+            lost = [job for job in (Job.from_dict(json.loads(data)) for (data,) in rows) if not owner_alive(job.owner)]
+            for job in lost:
+                job.status, job.error, job.finished_at = ERROR, "Interrompido: o servidor foi reiniciado", now
+                conn.execute("UPDATE jobs SET status = ?, updated_at = ?, data = ? WHERE id = ?",
+                             (job.status, now, json.dumps(job.to_dict(), default=str), job.id))
+            conn.execute("DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?",
+                         (*FINISHED_STATUSES, now - RETENTION_SECONDS))
+        return len(lost)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """JobStore do processo (criado e recuperado na primeira chamada); None se o banco falhar."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            path = os.getenv("JOBS_PATH") or os.path.join(BASE_DIR, JOBS_FILENAME)
+            try:
+                _store = JobStore(path)
+                interrupted = _store.recover()
+                if interrupted:
+                    print(f"[WARN] {interrupted} job(s) interrompido(s) pela reinicialização marcados como erro.")
+            except sqlite3.Error as e:
+                print(f"[WARN] Estado dos jobs só em memória: {e}")
+                _store = False
+        return _store or None
+
+
+def _request_cancel(job):
+    store = get_store()
+    if store is None:
+        return
+    try:
+        store.request_cancel(job.id)
+    except sqlite3.Error as e:
+        print(f"[WARN] Pedido de cancelamento do job {job.id} não gravado: {e}")
+
+
+def _save(job):
+    store = get_store()
+    if store is None:
+        return
+    try:
+        store.save(job)
+        job._saved_at = time.time()
+    except sqlite3.Error as e:
+        print(f"[WARN] Estado do job {job.id} não gravado: {e}")
+
+
+# ================= EXECUÇÃO ================= #
+
+_jobs = OrderedDict()
+_lock = threading.Lock()
+_executors = {}
+
+
+def _executor(kind, max_workers=1):
+    with _lock:
+        if kind not in _executors:
+            _executors[kind] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"job-{kind}")
+        return _executors[kind]
+
+
+def _forget_old():
+    """Descarta da memória os jobs terminados mais antigos além de MAX_FINISHED (chamada sob _lock)."""
+    finished = [job_id for job_id, job in _jobs.items() if job.finished]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED)]:
+        del _jobs[job_id]
+
+
+def _run(job, fn, args, kwargs):
+    job.refresh_cancel()
+    if job.cancel_requested:
+        if not job.finished:
+            # Cancelado por outro processo enquanto estava na fila
+            job.status, job.error, job.finished_at = CANCELLED, "Cancelado a pedido", time.time()
+            _save(job)
+            with _lock:
+                _forget_old()
+        return
+    job.status, job.started_at = RUNNING, time.time()
+    _save(job)
+    try:
+        job.result = fn(job, *args, **kwargs)
+        job.status = DONE
+    except JobCancelled as e:
+        print(f"[WARN] Job {job.kind} {job.id} cancelado.")
+        job.error, job.status = str(e), CANCELLED
+    except Exception as e:
+        print(f"[ERROR] Job {job.kind} {job.id} falhou: {e}")
+        job.error, job.status = str(e), ERROR
+    finally:
+        job.finished_at = time.time()
+        _save(job)
+        with _lock:
+            _forget_old()
+
+
+def submit(kind, fn, *args, params=None, max_workers=1, **kwargs):
+    """
+    Agenda `fn(job, *args, **kwargs)` na fila de `kind` e devolve o Job (já registrado).
+    `max_workers` (quantos jobs de `kind` rodam ao mesmo tempo) vale a partir do primeiro submit do tipo.
+    """
+    job = Job(kind, params)
+    with _lock:
+        _jobs[job.id] = job
+    _save(job)
+    _executor(kind, max_workers).submit(_run, job, fn, args, kwargs)
+    return job
+
+
+def get_job(job_id):
+    """Job pelo id: da memória ou, se já saiu dela (ou é de outro processo), do banco. None se não existe."""
+    job = _jobs.get(job_id)
+    if job is None and get_store() is not None:
+        job = get_store().load(job_id)
+    return job
+
+
+def active_jobs(kind, **params):
+    """Jobs de `kind` ainda não terminados cujos params incluem os valores dados."""
+    with _lock:
+        jobs = list(_jobs.values())
+    return [job for job in jobs if job.kind == kind and not job.finished
+            and all(job.params.get(k) == v for k, v in params.items())]
+
+
+def recent_jobs(kind, limit=20):
+    """Os `limit` jobs mais recentes de `kind` (em memória sobrepõe o banco), do mais novo ao mais antigo."""
+    jobs = {job.id: job for job in (get_store().recent(kind, limit) if get_store() is not None else [])}
+    with _lock:
+        jobs.update((job.id, job) for job in _jobs.values() if job.kind == kind)
+    return sorted(jobs.values(), key=lambda job: job.created_at, reverse=True)[:limit]
@@ -0,0 +1,379 @@
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+
+# Envio de e-mails fora da requisição.
+#
+# Antes o /contact abria uma conexão SMTP nova (STARTTLS + login) dentro do handler:
+# um handshake lento com o Gmail segurava uma thread do servidor por segundos. Agora o
+# endpoint só grava a mensagem numa caixa de saída persistente (SQLite) e acorda o
+# worker de envio. O worker mantém uma conexão autenticada aberta entre envios e, em
+# caso de falha, reagenda a mensagem com espera crescente. Mensagens que estavam na
+# fila quando o processo parou são enviadas no próximo início.
+#
+# Configuração por variáveis de ambiente (EMAIL_USER / EMAIL_PASSWORD como antes):
+#   SMTP_HOST, SMTP_PORT        servidor (padrão smtp.gmail.com:587, com STARTTLS)
+#   SMTP_SSL=1                  SMTP_SSL direto (porta 465; ex.: Railway bloqueia a 587)
+#   CONTACT_RECIPIENT           destinatário das mensagens de contato
+#   OUTBOX_PATH                 arquivo da caixa de saída
+# Para testar localmente sem Gmail basta apontar SMTP_HOST/SMTP_PORT para um servidor
+# de teste (ex.: `python -m aiosmtpd -n -l localhost:8025`); sem senha não há login.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTBOX_FILENAME = "odontopub_outbox.sqlite3"
+
+DEFAULT_SMTP_HOST = "smtp.gmail.com"
+DEFAULT_SMTP_PORT_TLS = 587
+DEFAULT_SMTP_PORT_SSL = 465
+DEFAULT_RECIPIENT = "renatodc89@gmail.com"
+PLACEHOLDER_PASSWORDS = {"your_app_password_here", "sua_senha_de_app_de_16_digitos"}
+
+# Novas tentativas: 30 s, 1 min, 2 min, ... até 1 h entre elas; depois de
+# MAX_ATTEMPTS a mensagem fica como 'failed' (continua no banco para consulta)
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+MAX_ATTEMPTS = 10
+# Uma mensagem em envio fica reservada por esse tempo; se o processo morrer no meio,
+# outro worker (ou o próximo início) a retoma depois disso
+LEASE_SECONDS = 120
+# Conexão ociosa: confirmada com NOOP antes de reutilizar, fechada depois de IDLE_CLOSE
+IDLE_CHECK_SECONDS = 30
+IDLE_CLOSE_SECONDS = 300
+SMTP_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    reply_to TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+def retry_delay(attempts):
+    """Espera antes da próxima tentativa, depois de `attempts` tentativas falhas."""
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+class SmtpSettings:
+    """Servidor e credenciais de envio, lidos das variáveis de ambiente."""
+
+    def __init__(self, host=None, port=None, use_ssl=None, user=None, password=None, recipient=None):
+        env_ssl = os.getenv("SMTP_SSL", "").lower() in ("1", "true", "yes")
+        self.use_ssl = env_ssl if use_ssl is None else use_ssl
+        self.host = host or os.getenv("SMTP_HOST") or DEFAULT_SMTP_HOST
+        default_port = DEFAULT_SMTP_PORT_SSL if self.use_ssl else DEFAULT_SMTP_PORT_TLS
+        self.port = int(port or os.getenv("SMTP_PORT") or default_port)
+        self.user = user if user is not None else os.getenv("EMAIL_USER")
+        password = password if password is not None else os.getenv("EMAIL_PASSWORD")
+        self.password = None if password in PLACEHOLDER_PASSWORDS else password
+        self.recipient = recipient or os.getenv("CONTACT_RECIPIENT") or DEFAULT_RECIPIENT
+        self.explicit_host = bool(host or os.getenv("SMTP_HOST"))
+
+    @property
+    def configured(self):
+        """Dá para enviar: há senha, ou um servidor escolhido explicitamente (ex.: de teste, sem login)."""
+        return bool(self.password) or self.explicit_host
+
+    @property
+    def sender(self):
+        return self.user or f"odontopub@{self.host}"
+
+
+class Outbox:
+    """
+    Caixa de saída em SQLite. Mensagens passam por 'pending' -> 'sending' -> 'sent'
+    (ou de volta a 'pending' com nova data de tentativa, ou 'failed' no fim).
+    A reserva ('sending' com prazo) é atômica, então vários processos podem dividir a fila.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._transaction() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, recipient, subject, body, reply_to=None):
+        """Grava a mensagem para envio imediato e devolve o id dela."""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "INSERT INTO outbox (created_at, recipient, subject, body, reply_to, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (now, recipient, subject, body, reply_to, now),
+            ).lastrowid
+
+    def claim(self, limit=20, now=None):
+        """Reserva até `limit` mensagens vencidas (pendentes ou com reserva expirada) e as devolve."""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE status IN ('pending', 'sending') AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', next_attempt_at = ? WHERE id = ?",
+                [(now + LEASE_SECONDS, row["id"]) for row in rows],
+            )
+        return [dict(row) for row in rows]
+
+    def mark_sent(self, message_id):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', sent_at = ?, attempts = attempts + 1, last_error = NULL "
+                "WHERE id = ?",
+                (time.time(), message_id),
+            )
+
+    def mark_failed(self, message_id, error, permanent=False):
+        """Registra a falha e reagenda (ou desiste, se permanente ou sem tentativas restantes)."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (message_id,)).fetchone()
+            if row is None:
+                return None
+            attempts = row["attempts"] + 1
+            status = "failed" if permanent or attempts >= MAX_ATTEMPTS else "pending"
+            conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (status, attempts, str(error)[:500], time.time() + retry_delay(attempts), message_id),
+            )
+            return status
+
+    def next_due(self):
+        """Instante da próxima tentativa agendada (None se a fila está vazia)."""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status IN ('pending', 'sending')"
+            ).fetchone()
+        return row[0]
+
+    def counts(self):
+        """Quantidade de mensagens por status."""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+
+def _is_permanent(error):
+    """Recusas definitivas do servidor (5xx de destinatário/conteúdo); o resto vale nova tentativa."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False  # credencial errada: pode ser corrigida sem perder a fila
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500 \
+        and not isinstance(error, smtplib.SMTPSenderRefused)
+
+
+class MailWorker:
+    """
+    Thread que esvazia a caixa de saída. Dorme até a próxima mensagem vencida ou até
+    ser acordada por notify(); reutiliza a conexão SMTP enquanto houver envios.
+    """
+
+    def __init__(self, outbox, settings):
+        self.outbox = outbox
+        self.settings = settings
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+        self._last_used = 0.0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mail-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._close()
+
+    def notify(self):
+        """Avisa que há mensagem nova na fila."""
+        self._wake.set()
+
+    # --- Conexão ---
+    def _connect(self):
+        s = self.settings
+        if s.use_ssl:
+            server = smtplib.SMTP_SSL(s.host, s.port, timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(s.host, s.port, timeout=SMTP_TIMEOUT)
+            server.ehlo()
+            # Com senha o STARTTLS é obrigatório (starttls() falha se o servidor não
+            # oferecer): o login nunca vai em texto puro. Só um servidor de teste sem
+            # login (ex.: aiosmtpd) pode ficar sem TLS
+            if s.password or server.has_extn("starttls"):
+                server.starttls()
+                server.ehlo()
+        if s.password:
+            server.login(s.user, s.password)
+        return server
+
+    def _connection(self):
+        """Conexão aberta e autenticada (a atual, se ainda responde, ou uma nova)."""
+        if self._server is not None and time.time() - self._last_used > IDLE_CHECK_SECONDS:
+            try:
+                if self._server.noop()[0] != 250:
+                    self._close()
+            except (smtplib.SMTPException, OSError):
+                self._close()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def _close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    # --- Envio ---
+    def _build(self, message):
+        msg = MIMEText(message["body"], "plain", "utf-8")
+        msg["From"] = self.settings.sender
+        msg["To"] = message["recipient"]
+        msg["Subject"] = message["subject"]
+        msg["Date"] = formatdate(message["created_at"], localtime=True)
+        msg["Message-ID"] = make_msgid(f"outbox{message['id']}", domain="odontopub")
+        if message.get("reply_to"):
+            msg["Reply-To"] = message["reply_to"]
+        return msg
+
+    def deliver(self, message):
+        """Envia uma mensagem reservada e registra o resultado na caixa de saída."""
+        try:
+            text = self._build(message).as_string()
+        except Exception as e:
+            # Cabeçalho inválido (ex.: quebra de linha no assunto): nenhuma tentativa resolve
+            self.outbox.mark_failed(message["id"], e, permanent=True)
+            print(f"[WARN] Email #{message['id']} inválido ({e}); desistindo.")
+            return False
+        try:
+            server = self._connection()
+            server.sendmail(self.settings.sender, [message["recipient"]], text)
+        except Exception as e:
+            # Conexão em estado desconhecido: a próxima tentativa abre outra
+            self._close()
+            status = self.outbox.mark_failed(message["id"], e, permanent=_is_permanent(e))
+            print(f"[WARN] Email #{message['id']} não enviado ({e}); "
+                  f"{'desistindo' if status == 'failed' else 'nova tentativa agendada'}.")
+            return False
+        self._last_used = time.time()
+        self.outbox.mark_sent(message["id"])
+        print(f"[OK] Email #{message['id']} enviado para {message['recipient']}.")
+        return True
+
+    def run_once(self):
+        """Envia tudo o que está vencido. Devolve quantas mensagens foram enviadas."""
+        sent = 0
+        while not self._stop.is_set():
+            batch = self.outbox.claim()
+            if not batch:
+                break
+            for message in batch:
+                sent += self.deliver(message)
+            if self._server is None:
+                break  # última tentativa falhou: o resto do lote espera a reserva expirar
+        return sent
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.run_once()
+                next_due = self.outbox.next_due()
+            except Exception as e:
+                print(f"[ERROR] Worker de email: {e}")
+                next_due = None
+            now = time.time()
+            timeout = IDLE_CLOSE_SECONDS if next_due is None else max(0.0, next_due - now)
+            if self._server is not None:
+                idle_left = self._last_used + IDLE_CLOSE_SECONDS - now
+                if idle_left <= 0:
+                    self._close()
+                else:
+                    timeout = min(timeout, idle_left)
+            self._wake.wait(timeout)
+
+
+# ================= INSTÂNCIA DO PROCESSO ================= #
+
+_outbox = None
+_worker = None
+_lock = threading.Lock()
+
+
+def get_outbox():
+    global _outbox
+    with _lock:
+        if _outbox is None:
+            _outbox = Outbox(os.getenv("OUTBOX_PATH") or os.path.join(BASE_DIR, OUTBOX_FILENAME))
+        return _outbox
+
+
+def start_worker():
+    """Inicia o worker de envio (no startup da API). Sem configuração SMTP, as mensagens só ficam na fila."""
+    global _worker
+    settings = SmtpSettings()
+    if not settings.configured:
+        print("[WARN] EMAIL_PASSWORD não definido: mensagens de contato ficam na caixa de saída até configurar o SMTP.")
+        return None
+    outbox = get_outbox()
+    with _lock:
+        if _worker is None:
+            _worker = MailWorker(outbox, settings)
+        worker = _worker
+    worker.start()
+    return worker
+
+
+def stop_worker():
+    global _worker
+    with _lock:
+        worker, _worker = _worker, None
+    if worker is not None:
+        worker.stop()
+
+
+def send_later(subject, body, reply_to=None, recipient=None):
+    """Coloca a mensagem na caixa de saída e acorda o worker. Devolve o id da mensagem."""
+    recipient = recipient or SmtpSettings().recipient
+    message_id = get_outbox().enqueue(recipient, subject, body, reply_to)
+    if _worker is not None:
+        _worker.notify()
+    return message_id
@@ -0,0 +1,317 @@
+import bisect
+import os
+import threading
+import time
+
+from starlette.routing import Match, Route
+
+# Métricas no formato texto do Prometheus (GET /metrics).
+#
+# Um registro mínimo, sem dependências: contadores, gauges e histogramas com rótulos,
+# seguros entre threads (os endpoints síncronos rodam no threadpool). Os valores são
+# do processo; com vários workers cada um expõe os seus (o Prometheus agrega por
+# instância). Medimos:
+#   - requisições HTTP por rota (o template, ex. /professores/{id_professor}), latência
+#     e requisições em andamento (MetricsMiddleware);
+#   - duração de cada fase de load_data()/derive_snapshot (PhaseTimer);
+#   - linhas e memória de cada tabela do snapshot publicado (calculadas na coleta);
+#   - acertos e faltas dos caches (memo do snapshot, cache de tabelas, GET condicional);
+#   - chamadas ao PubMed feitas pelo cliente de pubmed.py.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Segundos; os padrões do cliente oficial, mais caudas longas para cargas e o PubMed
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_START_TIME = time.time()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: rótulos esperados {self.labelnames}, recebidos {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+# ================= MÉTRICAS ================= #
+
+HTTP_REQUESTS = Counter("odontopub_http_requests_total", "Requisições HTTP atendidas.",
+                        ("method", "route", "status"))
+HTTP_LATENCY = Histogram("odontopub_http_request_duration_seconds", "Latência das requisições HTTP.",
+                         ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("odontopub_http_requests_in_flight", "Requisições HTTP em andamento.", ("method",))
+
+LOAD_PHASE = Histogram("odontopub_load_phase_duration_seconds",
+                       "Duração das fases de carga/derivação do snapshot.", ("phase",), buckets=SLOW_BUCKETS)
+LOAD_PHASE_LAST = Gauge("odontopub_load_phase_last_seconds",
+                        "Duração da fase na carga/derivação mais recente.", ("phase",))
+
+CACHE_REQUESTS = Counter("odontopub_cache_requests_total", "Consultas aos caches internos.", ("cache", "result"))
+
+PUBMED_REQUESTS = Counter("odontopub_pubmed_requests_total", "Chamadas HTTP ao PubMed (E-utilities).",
+                          ("endpoint", "outcome"))
+PUBMED_LATENCY = Histogram("odontopub_pubmed_request_duration_seconds", "Latência das chamadas ao PubMed.",
+                           ("endpoint",), buckets=SLOW_BUCKETS)
+
+REGISTRY = [HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT, LOAD_PHASE, LOAD_PHASE_LAST,
+            CACHE_REQUESTS, PUBMED_REQUESTS, PUBMED_LATENCY]
+
+
+def cache_hit(cache):
+    CACHE_REQUESTS.inc(cache=cache, result="hit")
+
+
+def cache_miss(cache):
+    CACHE_REQUESTS.inc(cache=cache, result="miss")
+
+
+class PhaseTimer:
+    """
+    Cronômetro de fases: cada mark(fase) registra o tempo desde a marca anterior
+    (ou desde a criação), sem reindentar o código medido.
+    """
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        LOAD_PHASE.observe(elapsed, phase=phase)
+        LOAD_PHASE_LAST.set(elapsed, phase=phase)
+        return elapsed
+
+
+# ================= COLETA ================= #
+
+def _rss_bytes():
+    """Memória residente do processo (Linux: /proc; senão o pico via resource)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except Exception:
+            return None
+
+
+def snapshot_tables(snap):
+    """{tabela: (linhas, bytes)} do snapshot, calculado uma vez por versão (memory_usage deep é caro)."""
+    def measure():
+        tables = {
+            "professores": snap.df_prof,
+            "publicacoes": snap.df_pub,
+            "vinculos": snap.df_vin,
+            "projetos": snap.df_proj,
+            "links": snap.df_links,
+        }
+        sizes = {name: (len(df), int(df.memory_usage(index=True, deep=True).sum())) for name, df in tables.items()}
+        abstracts_bytes = int(snap.abstracts.offsets[-1]) + sum(len(t) for t in snap.abstracts.extra.values())
+        sizes["resumos"] = (len(snap.abstracts), abstracts_bytes)
+        return sizes
+    return snap.cached(("metrics", "tables"), measure)
+
+
+def _snapshot_lines(snap):
+    lines = [
+        "# HELP odontopub_snapshot_version Versão dos dados publicada.",
+        "# TYPE odontopub_snapshot_version gauge",
+        f"odontopub_snapshot_version {snap.version}",
+        "# HELP odontopub_snapshot_loaded_timestamp_seconds Instante em que a versão publicada foi montada.",
+        "# TYPE odontopub_snapshot_loaded_timestamp_seconds gauge",
+        f"odontopub_snapshot_loaded_timestamp_seconds {_number(snap.loaded_at.timestamp())}",
+    ]
+    tables = snapshot_tables(snap)
+    lines += ["# HELP odontopub_snapshot_rows Linhas de cada tabela do snapshot publicado.",
+              "# TYPE odontopub_snapshot_rows gauge"]
+    lines += [f'odontopub_snapshot_rows{{table="{t}"}} {rows}' for t, (rows, _) in tables.items()]
+    lines += ["# HELP odontopub_snapshot_memory_bytes Memória de cada tabela do snapshot (resumos: tamanho do texto).",
+              "# TYPE odontopub_snapshot_memory_bytes gauge"]
+    lines += [f'odontopub_snapshot_memory_bytes{{table="{t}"}} {size}' for t, (_, size) in tables.items()]
+    return lines
+
+
+def _cache_ratio_lines():
+    caches = sorted({key[0] for key in CACHE_REQUESTS._values})
+    lines = ["# HELP odontopub_cache_hit_ratio Acertos / consultas de cada cache desde o início do processo.",
+             "# TYPE odontopub_cache_hit_ratio gauge"]
+    for cache in caches:
+        hits = CACHE_REQUESTS.value(cache=cache, result="hit")
+        total = hits + CACHE_REQUESTS.value(cache=cache, result="miss")
+        lines.append(f'odontopub_cache_hit_ratio{{cache="{_escape(cache)}"}} {_number(hits / total if total else 0.0)}')
+    return lines
+
+
+def render(snap=None):
+    """Todas as métricas no formato texto do Prometheus (bytes)."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.header() + metric.samples()
+    lines += _cache_ratio_lines()
+    if snap is not None:
+        lines += _snapshot_lines(snap)
+    rss = _rss_bytes()
+    if rss is not None:
+        lines += ["# HELP process_resident_memory_bytes Memória residente do processo.",
+                  "# TYPE process_resident_memory_bytes gauge",
+                  f"process_resident_memory_bytes {rss}"]
+    lines += ["# HELP process_start_time_seconds Início do processo (epoch).",
+              "# TYPE process_start_time_seconds gauge",
+              f"process_start_time_seconds {_number(_START_TIME)}"]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# ================= MIDDLEWARE ================= #
+
+def match_route(scope, root_path=""):
+    """
+    Rota do app que atende `scope` (None se nenhuma). O roteador grava a rota no
+    próprio scope; antes dele (ou em respostas dadas antes dele, ex. 304 do GET
+    condicional) o caminho é casado com as rotas do app. `root_path` é o de antes do
+    roteamento: as montagens (arquivos estáticos) o alteram no scope.
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route
+    router = getattr(scope.get("app"), "router", None)
+    original = dict(scope, root_path=root_path)
+    for candidate in getattr(router, "routes", ()):
+        match, _ = candidate.matches(original)
+        if match == Match.FULL:
+            return candidate
+    return None
+
+
+def route_label(route):
+    """Template da rota (cardinalidade limitada); montagens viram '{prefixo}/*'."""
+    if route is None:
+        return "<unmatched>"
+    return route.path if isinstance(route, Route) else f"{route.path}/*"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: contagem, latência e requisições em andamento por rota."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        root_path = scope.get("root_path", "")
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec(method=method)
+            route = route_label(match_route(scope, root_path))
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            HTTP_LATENCY.observe(elapsed, method=method, route=route)
@@ -0,0 +1,60 @@
+import base64
+import bisect
+import json
+
+from fastapi import HTTPException
+
+# Paginação por cursor (keyset).
+#
+# O cursor é a chave de ordenação do último item entregue, codificada de forma opaca
+# (JSON em base64 url-safe). A página seguinte começa no primeiro item com chave maior
+# que a do cursor, então não depende de deslocamento: inclusões e remoções entre uma
+# página e outra não repetem nem pulam itens que já estavam na lista.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Inteiros aceitos num cursor (os que o SQLite guarda)
+CURSOR_INT_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+def encode_cursor(key):
+    """Cursor opaco para a chave (lista/tupla de valores JSON)."""
+    raw = json.dumps(list(key), separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _matches(value, types):
+    if isinstance(value, bool) or not isinstance(value, types):
+        return False
+    return not isinstance(value, int) or CURSOR_INT_RANGE[0] <= value <= CURSOR_INT_RANGE[1]
+
+
+def decode_cursor(cursor, shape):
+    """
+    Chave contida no cursor (lista), ou None se não há cursor. `shape` traz o tipo (ou
+    tupla de tipos) aceito em cada posição da chave; cursor malformado ou com outra
+    forma -> 400 (os valores vão direto para comparações e parâmetros SQL).
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except ValueError:
+        key = None
+    if not isinstance(key, list) or len(key) != len(shape) \
+            or not all(_matches(value, types) for value, types in zip(key, shape)):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return key
+
+
+def keyset_page(items, sort_key, cursor_key, limit):
+    """
+    Página de `items` (já ordenados por `sort_key`) que começa após `cursor_key`.
+    Devolve (itens da página, item que serve de cursor para a próxima ou None).
+    Busca binária: custo O(log n + limit), não importa o tamanho da lista.
+    """
+    start = 0 if cursor_key is None else bisect.bisect_right(items, cursor_key, key=sort_key)
+    page = items[start:start + limit]
+    last = page[-1] if start + limit < len(items) and len(page) else None
+    return page, last
@@ -0,0 +1,173 @@
+import glob
+import hashlib
+import io
+import os
+import re
+import threading
+import unicodedata
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # opcional: sem ele as variantes são cópias do original
+    Image = None
+
+# Fotos dos professores em tamanhos prontos para a interface.
+#
+# O original enviado pelo admin fica em assets/{nome_normalizado}.jpg. A partir dele são
+# geradas variantes quadradas (miniatura do grafo/listas, card e perfil) em WebP e JPEG,
+# em assets/derived/, com o hash do conteúdo no nome: a URL muda quando a foto muda, então
+# o navegador pode guardar cada arquivo para sempre (Cache-Control immutable). O manifesto
+# (nome normalizado -> URLs) vive neste módulo; derive_snapshot põe as URLs de cada
+# professor na coluna 'photos' de df_prof, que segue para as respostas da API.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+DERIVED_DIR = os.path.join(ASSETS_DIR, "derived")
+ASSETS_URL = "/assets"
+DERIVED_URL = f"{ASSETS_URL}/derived"
+
+# Lado (px) de cada variante: cobre o tamanho exibido em telas 2x
+VARIANTS = {"thumb": 96, "card": 160, "profile": 320}
+FORMATS = {"webp": {"format": "WEBP", "quality": 80, "method": 6},
+           "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True}}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+# Mudar a forma de gerar as variantes muda este número (e portanto todos os nomes)
+PIPELINE_VERSION = 1
+
+
+def photo_basename(nome):
+    """Nome do arquivo da foto (sem extensão), igual ao getProfessorPhotoUrl do frontend."""
+    n = unicodedata.normalize('NFD', str(nome))
+    n = n.encode('ascii', 'ignore').decode('utf-8').lower()
+    n = re.sub(r'[^a-z0-9\s_]', '', n)
+    return "_".join(n.split())
+
+
+def source_path(basename):
+    return os.path.join(ASSETS_DIR, f"{basename}.jpg")
+
+
+def _digest(data, spec):
+    h = hashlib.blake2b(digest_size=6)
+    h.update(f"{PIPELINE_VERSION}:{spec}".encode())
+    h.update(data)
+    return h.hexdigest()
+
+
+def _render(image, size, fmt):
+    """Bytes da variante: recorte quadrado central de `size` px no formato `fmt`."""
+    square = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    out = io.BytesIO()
+    options = dict(FORMATS[fmt])
+    square.save(out, options.pop("format"), **options)
+    return out.getvalue()
+
+
+def _write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def open_image(data):
+    """Imagem decodificada (orientação EXIF aplicada, RGB). ValueError se não for imagem."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image)
+        return image.convert("RGB")
+    except Exception as e:
+        raise ValueError("Arquivo não é uma imagem válida") from e
+
+
+def build_derivatives(basename, data):
+    """
+    Gera (se ainda não existirem) as variantes da foto `data` e devolve as URLs:
+    {variante: {formato: url}}. Arquivos de versões anteriores desta foto são removidos.
+    """
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+    urls, keep = {}, set()
+    image = None
+    for variant, size in VARIANTS.items():
+        urls[variant] = {}
+        for fmt in FORMATS:
+            if Image is None:
+                # Sem Pillow: uma cópia do original com hash no nome serve todas as variantes
+                name = f"{basename}.{_digest(data, 'original')}.jpg"
+            else:
+                name = f"{basename}.{variant}.{_digest(data, f'{size}:{fmt}')}.{EXTENSIONS[fmt]}"
+            path = os.path.join(DERIVED_DIR, name)
+            if not os.path.exists(path):
+                if Image is None:
+                    _write(path, data)
+                else:
+                    if image is None:
+                        image = open_image(data)
+                    _write(path, _render(image, size, fmt))
+            urls[variant][fmt] = f"{DERIVED_URL}/{name}"
+            keep.add(name)
+
+    # O nome normalizado não tem pontos: "{basename}.*" só casa com arquivos desta foto
+    for old in glob.glob(os.path.join(DERIVED_DIR, f"{basename}.*")):
+        if os.path.basename(old) not in keep:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return urls
+
+
+# ================= MANIFESTO ================= #
+
+_manifest = {}  # basename -> ((tamanho, mtime) do original, URLs)
+_lock = threading.Lock()
+_warned = False
+
+
+def photo_urls(nome):
+    """
+    URLs das variantes da foto do professor (None se não há foto). Na primeira vez
+    (ou quando o original muda) lê o original e gera as variantes que faltam.
+    """
+    global _warned
+    basename = photo_basename(nome)
+    path = source_path(basename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        cached = _manifest.get(basename)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        if Image is None and not _warned:
+            print("[WARN] Pillow não instalado: fotos servidas sem redimensionar.")
+            _warned = True
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            urls = build_derivatives(basename, data)
+        except (ValueError, OSError) as e:
+            print(f"[WARN] Foto de {nome} ignorada: {e}")
+            urls = None
+        _manifest[basename] = (key, urls)
+        return urls
+
+
+def manifest(names):
+    """Lista de URLs (photo_urls) para cada nome, na mesma ordem."""
+    return [photo_urls(nome) for nome in names]
+
+
+def save_photo(nome, data):
+    """
+    Grava `data` como a foto original do professor e gera as variantes.
+    ValueError se `data` não for uma imagem (só verificável com Pillow).
+    """
+    if Image is not None:
+        open_image(data)
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    basename = photo_basename(nome)
+    _write(source_path(basename), data)
+    return basename, photo_urls(nome)
@@ -0,0 +1,210 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from .auth import admin_from_token
+from . import metrics
+
+# Perfil de amostragem das requisições, para ver onde o tempo de um endpoint é gasto.
+#
+# Desligado por padrão. Com PROFILE_SAMPLE_RATE > 0 (ou ajustado em PUT /api/admin/profiling)
+# essa fração das requisições é perfilada; um admin também perfila uma requisição específica
+# mandando "X-Profile: 1" junto do seu token (Authorization: Bearer ...). Enquanto houver
+# requisição perfilada, uma thread lê as pilhas de todas as threads a cada PROFILE_INTERVAL_MS
+# (sys._current_frames) e conta as que passam pelo endpoint da requisição, do endpoint para
+# dentro. O resultado, por rota, sai no formato "collapsed stacks" (quadro;quadro;... contagem)
+# de flamegraph.pl, speedscope e afins. Desligado, o custo por requisição é um teste da taxa e
+# a procura de um cabeçalho; a thread de amostragem só acorda com requisições perfiladas.
+#
+# Limitação: a amostra é atribuída pela função do endpoint, então requisições simultâneas não
+# perfiladas ao mesmo endpoint também entram na contagem. Endpoints async só aparecem quando
+# estão executando (não enquanto aguardam), os síncronos durante todo o tempo no threadpool.
+
+PROFILE_HEADER = b"x-profile"
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+# Pilhas distintas guardadas por rota; as demais somam em OVERFLOW_STACK
+MAX_STACKS_PER_ROUTE = 5000
+OVERFLOW_STACK = "[outras pilhas]"
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def frame_name(code):
+    """Quadro da pilha: função qualificada e arquivo (relativo ao repositório ou ao site-packages)."""
+    path = code.co_filename
+    if "site-packages" + os.sep in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    elif path.startswith(BASE_DIR):
+        path = os.path.relpath(path, BASE_DIR)
+    # ';' separa quadros no formato colapsado
+    return f"{code.co_qualname} ({path})".replace(";", ",")
+
+
+class Profiler:
+    def __init__(self, sample_rate=SAMPLE_RATE, interval_ms=INTERVAL_MS):
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._active = {}          # código do endpoint -> [rótulo, requisições em andamento]
+        self._stacks = {}          # rótulo -> Counter(pilha colapsada -> amostras)
+        self._requests = Counter()  # rótulo -> requisições perfiladas
+        self._names = {}           # código -> frame_name (cache)
+
+    # ---------- decisão por requisição ---------- #
+
+    def should_profile(self, scope):
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return True
+        headers = scope["headers"]
+        for name, value in headers:
+            if name == PROFILE_HEADER:
+                return value not in (b"", b"0") and self._is_admin(headers)
+        return False
+
+    @staticmethod
+    def _is_admin(headers):
+        authorization = dict(headers).get(b"authorization", b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        return scheme.lower() == "bearer" and admin_from_token(token.strip()) is not None
+
+    # ---------- requisições perfiladas ---------- #
+
+    def start(self, label, code):
+        with self._lock:
+            entry = self._active.setdefault(code, [label, 0])
+            entry[1] += 1
+            self._requests[label] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            self._wakeup.set()
+
+    def stop(self, code):
+        with self._lock:
+            entry = self._active.get(code)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._active[code]
+
+    # ---------- amostragem ---------- #
+
+    def _run(self):
+        me = threading.get_ident()
+        delay = None
+        while True:
+            if not self._wakeup.is_set():
+                self._wakeup.wait()
+                delay = None
+            # Ao acordar, primeira amostra num ponto aleatório do intervalo: requisições mais
+            # curtas que o intervalo ainda recebem, em média, duração / intervalo amostras
+            interval = self.interval_ms / 1000
+            time.sleep(random.uniform(0, interval) if delay is None else interval)
+            delay = interval
+            with self._lock:
+                active = {code: entry[0] for code, entry in self._active.items()}
+                if not active:
+                    self._wakeup.clear()
+                    continue
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self._sample(frame, active)
+
+    def _sample(self, frame, active):
+        """Conta a pilha de `frame` se ela passa por um endpoint perfilado (do endpoint até a folha)."""
+        codes = []
+        label = None
+        while frame is not None:
+            code = frame.f_code
+            codes.append(code)
+            if code in active:
+                label = active[code]
+                break
+            frame = frame.f_back
+        if label is None:
+            return
+        names = []
+        for code in reversed(codes):
+            name = self._names.get(code)
+            if name is None:
+                name = self._names[code] = frame_name(code)
+            names.append(name)
+        stack = ";".join(names)
+        with self._lock:
+            stacks = self._stacks.setdefault(label, Counter())
+            if stack not in stacks and len(stacks) >= MAX_STACKS_PER_ROUTE:
+                stack = OVERFLOW_STACK
+            stacks[stack] += 1
+
+    # ---------- resultados ---------- #
+
+    def _labels(self, route=None):
+        """Rótulos ('GET /stats') que casam com `route` (rótulo completo ou só o caminho)."""
+        labels = sorted(set(self._stacks) | set(self._requests))
+        if route is None:
+            return labels
+        return [label for label in labels if route in (label, label.split(" ", 1)[-1])]
+
+    def status(self):
+        with self._lock:
+            routes = [{
+                "route": label,
+                "requests": self._requests[label],
+                "samples": sum(self._stacks.get(label, {}).values()),
+            } for label in self._labels()]
+        return {"sample_rate": self.sample_rate, "interval_ms": self.interval_ms, "routes": routes}
+
+    def collapsed(self, route=None):
+        """Pilhas colapsadas ('rota;quadro;... amostras' por linha), opcionalmente de uma rota."""
+        lines = []
+        with self._lock:
+            for label in self._labels(route):
+                for stack, count in sorted(self._stacks.get(label, {}).items()):
+                    lines.append(f"{label.replace(';', ',')};{stack} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def configure(self, sample_rate=None, interval_ms=None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if interval_ms is not None:
+            self.interval_ms = interval_ms
+        state = f"ligado ({self.sample_rate:.1%} das requisições)" if self.sample_rate > 0 else "só sob demanda"
+        print(f"[OK] Perfil de requisições {state}, amostras a cada {self.interval_ms:g} ms.")
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._requests.clear()
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI: perfila as requisições escolhidas por profiler.should_profile."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        route = metrics.match_route(scope, scope.get("root_path", ""))
+        code = getattr(getattr(route, "endpoint", None), "__code__", None)
+        if code is None:
+            await self.app(scope, receive, send)
+            return
+
+        profiler.start(f"{scope['method']} {route.path}", code)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop(code)
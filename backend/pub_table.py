@@ -0,0 +1,251 @@
+import glob
+import hashlib
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+from .indexes import publication_sort_key
+
+# Layout compacto da tabela de publicações em memória.
+#
+# Revista, Qualis e ano se repetem muito: viram colunas categóricas (um código
+# pequeno por linha + a lista de valores distintos). Os pmids viram int64 quando
+# todos são números. Os resumos (a maior parte do texto) saem da tabela: ficam num
+# arquivo auxiliar mapeado em memória (mmap), com um vetor de offsets, e a tabela
+# guarda só o número do resumo (coluna 'abstract_id'). Um resumo só é lido do
+# arquivo quando alguém pede aquela publicação.
+
+CATEGORICAL_COLUMNS = ['revista', 'qualis', 'ano']
+
+# Arquivo auxiliar: cabeçalho (MAGIC + quantidade n), n + 1 offsets int64 e o texto UTF-8.
+# O nome leva o hash do conteúdo, então processos que leem os mesmos dados geram
+# (e compartilham) o mesmo arquivo.
+ABSTRACTS_PREFIX = "odontopub_abstracts-"
+ABSTRACTS_MAGIC = b"ODPABS01"
+_HEADER_SIZE = len(ABSTRACTS_MAGIC) + 8
+
+
+def integer_pmids(pmids):
+    """pmids como int64 se todos forem inteiros sem zeros à esquerda (str(int) == pmid); senão None."""
+    values = pd.Series(pmids, dtype=object).astype(str)
+    if values.empty or not values.str.fullmatch(r"[1-9][0-9]{0,17}").all():
+        return None
+    return values.astype(np.int64)
+
+
+def pmid_strings(df_pub):
+    """pmids de df_pub como texto (a forma usada nos índices, vínculos e respostas)."""
+    return df_pub['pmid'].astype(str)
+
+
+def pmid_value(df_pub, pmid):
+    """Converte o pmid (texto) para o tipo da coluna 'pmid' de df_pub."""
+    if pd.api.types.is_integer_dtype(df_pub['pmid']):
+        converted = integer_pmids([pmid])
+        if converted is not None:
+            return int(converted.iat[0])
+    return pmid
+
+
+def compact_publications(df_pub):
+    """Converte as colunas repetitivas para categóricas e os pmids para inteiros, se possível."""
+    df_pub = df_pub.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in df_pub.columns:
+            df_pub[column] = df_pub[column].astype('category')
+    pmids = integer_pmids(df_pub['pmid'])
+    if pmids is not None:
+        df_pub['pmid'] = pmids.to_numpy()
+    return df_pub
+
+
+def _with_categories(df, values):
+    """Acrescenta às colunas categóricas de `df` os valores novos de `values` ({coluna: [valores]})."""
+    for column, new in values.items():
+        if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype):
+            missing = [v for v in dict.fromkeys(new) if v not in df[column].cat.categories]
+            if missing:
+                df[column] = df[column].cat.add_categories(missing)
+    return df
+
+
+def concat_rows(df, rows):
+    """`df` com `rows` (lista de dicts) no fim, mantendo as colunas categóricas."""
+    new = pd.DataFrame(rows, columns=df.columns)
+    df = _with_categories(df.copy(), {c: new[c].tolist() for c in new.columns})
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            new[column] = pd.Categorical(new[column], categories=df[column].cat.categories)
+    return pd.concat([df, new], ignore_index=True)
+
+
+def assign_values(df, where, values):
+    """Atribui `values` ({coluna: valor}) às linhas `where` de `df` (alterado no lugar)."""
+    _with_categories(df, {c: [v] for c, v in values.items()})
+    df.loc[where, list(values)] = list(values.values())
+    return df
+
+
+def publication_records(df_pub, positions, abstracts=None, include_abstract=False):
+    """
+    Linhas de df_pub nas posições dadas como dicts prontos para resposta: pmid como
+    texto e sem a coluna interna 'abstract_id'. Com `abstracts`, cada registro diz se
+    tem resumo ('has_abstract') e, se include_abstract, traz o texto ('abstract').
+    """
+    rows = df_pub.iloc[positions]
+    records = rows.drop(columns='abstract_id', errors='ignore').to_dict(orient="records")
+    for record in records:
+        record['pmid'] = str(record['pmid'])
+    if abstracts is not None and 'abstract_id' in rows.columns:
+        for record, abstract_id in zip(records, rows['abstract_id'].tolist()):
+            record['has_abstract'] = abstracts.has(abstract_id)
+            if include_abstract:
+                record['abstract'] = abstracts.get(abstract_id)
+    return records
+
+
+def publication_cursor_at(df_pub, pos):
+    """Valores da chave de ordenação (ano, pmid) da publicação na posição `pos`, prontos para JSON."""
+    ano = df_pub['ano'].iat[pos]
+    return [ano.item() if isinstance(ano, np.generic) else ano, str(df_pub['pmid'].iat[pos])]
+
+
+def publication_key_at(df_pub, pos):
+    """publication_sort_key da publicação na posição `pos`."""
+    return publication_sort_key(*publication_cursor_at(df_pub, pos))
+
+
+def publications_per_year(df_pub, positions):
+    """Contagem das publicações nas posições dadas por ano ("" = sem ano), em ordem crescente de ano."""
+    counts = df_pub['ano'].iloc[positions].astype(object).value_counts()
+    return {str(ano): int(n) for ano, n in sorted(counts.items(), key=lambda item: str(item[0]))}
+
+
+class AbstractStore:
+    """
+    Resumos das publicações por número (abstract_id). Os da carga completa ficam no
+    arquivo mapeado em memória; os incluídos ou substituídos depois por alterações
+    pontuais ficam em `extra` (cópia a cada alteração, como no índice de busca), que
+    tem precedência sobre o arquivo. Um resumo substituído reaproveita o número, então
+    `extra` cresce só com as publicações alteradas, não com o número de alterações.
+    """
+
+    def __init__(self, path=None, extra=None):
+        self.path = path
+        self.extra = dict(extra or {})
+        self._open()
+
+    def _open(self):
+        self._map = None
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self._data_start = 0
+        if self.path is None:
+            return
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(ABSTRACTS_MAGIC)] != ABSTRACTS_MAGIC:
+            raise ValueError(f"Arquivo de resumos inválido: {self.path}")
+        count = int.from_bytes(self._map[len(ABSTRACTS_MAGIC):_HEADER_SIZE], "little")
+        self.offsets = np.frombuffer(self._map, dtype="<i8", count=count + 1, offset=_HEADER_SIZE)
+        self._data_start = _HEADER_SIZE + 8 * (count + 1)
+        if self._data_start + int(self.offsets[-1]) != len(self._map):
+            raise ValueError(f"Arquivo de resumos truncado: {self.path}")
+
+    # Só o caminho e os resumos extras são serializados (cache de tabelas);
+    # o arquivo é mapeado de novo ao desserializar
+    def __getstate__(self):
+        return {"path": self.path, "extra": self.extra}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self.extra = state["extra"]
+        self._open()
+
+    def __copy__(self):
+        store = AbstractStore.__new__(AbstractStore)
+        store.__dict__.update(self.__dict__)
+        return store
+
+    @property
+    def base_count(self):
+        return len(self.offsets) - 1
+
+    def __len__(self):
+        # Números em `extra` podem sobrepor os do arquivo (resumos substituídos)
+        return max(self.base_count, max(self.extra, default=-1) + 1)
+
+    def get(self, abstract_id):
+        """Resumo de número `abstract_id` ("" se não existir)."""
+        abstract_id = int(abstract_id)
+        if abstract_id in self.extra:
+            return self.extra[abstract_id]
+        if not 0 <= abstract_id < self.base_count:
+            return ""
+        start = self._data_start + int(self.offsets[abstract_id])
+        end = self._data_start + int(self.offsets[abstract_id + 1])
+        return self._map[start:end].decode("utf-8")
+
+    def has(self, abstract_id):
+        """Se o resumo `abstract_id` não é vazio (sem ler o texto do arquivo)."""
+        abstract_id = int(abstract_id)
+        if abstract_id in self.extra:
+            return bool(self.extra[abstract_id])
+        if not 0 <= abstract_id < self.base_count:
+            return False
+        return bool(self.offsets[abstract_id + 1] > self.offsets[abstract_id])
+
+    def with_abstract(self, text, abstract_id=None):
+        """
+        (cópia do store com `text` no número `abstract_id`, número usado).
+        Com abstract_id=None o resumo ganha um número novo; senão substitui o anterior.
+        """
+        store = self.__copy__()
+        store.extra = dict(self.extra)
+        abstract_id = len(self) if abstract_id is None else int(abstract_id)
+        store.extra[abstract_id] = text
+        return store, abstract_id
+
+
+def write_abstracts(base_dir, texts):
+    """
+    Grava os resumos no arquivo auxiliar de `base_dir` e devolve o AbstractStore.
+    Arquivos de versões anteriores são removidos quando possível.
+    """
+    encoded = [str(t).encode("utf-8") for t in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    header = ABSTRACTS_MAGIC + len(encoded).to_bytes(8, "little") + offsets.tobytes()
+    body = b"".join(encoded)
+
+    digest = hashlib.blake2b(header, digest_size=10)
+    digest.update(body)
+    path = os.path.join(base_dir, f"{ABSTRACTS_PREFIX}{digest.hexdigest()}.bin")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    for old in glob.glob(os.path.join(base_dir, f"{ABSTRACTS_PREFIX}*.bin")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass  # ainda aberto por outro processo (Windows): fica para a próxima carga
+    return AbstractStore(path)
+
+
+def split_abstracts(df_pub, base_dir=None):
+    """
+    Tira a coluna 'abstract' de df_pub: os textos vão para o AbstractStore (arquivo em
+    `base_dir`, ou só em memória se base_dir for None) e a tabela ganha 'abstract_id'.
+    """
+    texts = df_pub['abstract'].tolist() if 'abstract' in df_pub.columns else [""] * len(df_pub)
+    df_pub = df_pub.drop(columns='abstract', errors='ignore')
+    df_pub['abstract_id'] = np.arange(len(df_pub), dtype=np.int32)
+    if base_dir is None:
+        return df_pub, AbstractStore(extra=dict(enumerate(texts)))
+    return df_pub, write_abstracts(base_dir, texts)
@@ -0,0 +1,357 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+import httpx
+
+from . import metrics, pubmed_cache
+
+# Cliente assíncrono das E-utilities do PubMed (esearch / efetch), usado pela sincronização
+# do admin (sync_service) e pelo coletor de linha de comando (data_manager).
+#
+# Antes cada chamada era um requests bloqueante seguido de time.sleep(1 s), então uma coleta
+# completa era limitada pelos sleeps, não pelo NCBI. Agora as chamadas correm em paralelo num
+# httpx.AsyncClient (conexões keep-alive) e o ritmo vem de um token bucket único no processo,
+# no limite do NCBI: 3 req/s, ou 10 req/s com NCBI_API_KEY. Respostas 429/5xx e falhas de rede
+# são repetidas com backoff exponencial com jitter (ou o Retry-After do servidor). Artigos e
+# resultados de busca ficam num cache local (pubmed_cache): o efetch só pede o que falta.
+# PUBMED_EUTILS_URL aponta o cliente para outro servidor (ex.: um stub local em testes).
+
+EUTILS_URL = os.getenv("PUBMED_EUTILS_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils").rstrip("/")
+API_KEY = os.getenv("NCBI_API_KEY", "")
+EMAIL = os.getenv("EMAIL_USER", "renatodc89@gmail.com")
+TOOL = "odontopub"
+
+# Requisições por segundo (limite do NCBI; PUBMED_RATE_LIMIT só para stubs locais)
+RATE_LIMIT = float(os.getenv("PUBMED_RATE_LIMIT", 10 if API_KEY else 3))
+# Margem abaixo do limite: variações na rede não juntam chamadas demais na mesma janela de 1 s
+RATE_MARGIN = 0.9
+MAX_CONNECTIONS = 10
+TIMEOUT = 30
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+ESEARCH_RETMAX = 1000
+# Maior resposta do esearch do PubMed (retmax acima disso é ignorado)
+ESEARCH_RETMAX_MAX = 10000
+# Nomes [Author] combinados com OR numa mesma busca (search_any_author)
+AUTHOR_OR_CHUNK = 20
+# Fim do intervalo de datas do esearch (mindate exige maxdate; um ano distante = "até hoje")
+MAX_DATE = "3000"
+# Buscas com o termo maior que isso vão por POST (a URL tem limite de tamanho)
+POST_TERM_LENGTH = 1000
+# PMIDs por efetch: as listas vão por POST (recomendado pelo NCBI acima de 200 ids), então o
+# lote pode ser maior que o de GET; 500 artigos com abstract dão respostas de poucos MB
+EFETCH_BATCH = 500
+
+
+class PubMedError(Exception):
+    pass
+
+
+class TokenBucket:
+    """
+    Limite de taxa compartilhado entre threads e event loops. reserve() consome uma
+    vaga e devolve quanto esperar por ela; com capacidade 1 as chamadas saem espaçadas
+    de 1/rate, sem rajadas que passem do limite em qualquer janela de 1 s.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_bucket = TokenBucket(RATE_LIMIT * RATE_MARGIN)
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After", "")
+    return min(float(value), BACKOFF_MAX) if value.replace(".", "", 1).isdigit() else None
+
+
+def _backoff(attempt):
+    """Espera antes da tentativa attempt + 1: exponencial, metade fixa e metade aleatória."""
+    backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+def added_since_params(since):
+    """Parâmetros do esearch para só os registros incluídos no PubMed (Entrez date) desde `since` (epoch)."""
+    return {"datetype": "edat", "mindate": time.strftime("%Y/%m/%d", time.gmtime(since)), "maxdate": MAX_DATE}
+
+
+# ================= PARSER ================= #
+
+def parse_articles(xml_text):
+    """
+    Artigos de uma resposta XML do efetch, no formato usado pela sincronização.
+    XML inválido (ex.: resposta truncada) levanta PubMedError: o lote conta como falha.
+    """
+    try:
+        root = ET.fromstring(xml_text)
+    except ET.ParseError as e:
+        raise PubMedError(f"XML inválido na resposta do efetch: {e}") from e
+
+    artigos = []
+    for article in root.findall(".//PubmedArticle"):
+        pmid = article.findtext(".//PMID")
+        title = article.findtext(".//ArticleTitle") or "Sem título"
+        revista = article.findtext(".//Journal/Title") or "N/A"
+
+        year = article.findtext(".//PubDate/Year")
+        if not year:
+            medline_date = article.findtext(".//PubDate/MedlineDate")
+            year = medline_date[:4] if medline_date else "N/A"
+
+        doi_elem = article.find(".//ArticleId[@IdType='doi']")
+        doi = doi_elem.text if doi_elem is not None else "N/A"
+
+        autores_nomes = []
+        for a in article.findall(".//Author"):
+            last = a.findtext("LastName") or ""
+            init = a.findtext("Initials") or ""
+            autores_nomes.append(f"{last} {init}".strip())
+
+        # Todos os ISSNs disponíveis (impresso e eletrônico), separados por ponto e vírgula
+        issns = [i.text.strip() for i in article.findall(".//Journal/ISSN") if i.text]
+        issn = "; ".join(set(issns)) if issns else "N/A"
+
+        # itertext() traz o conteúdo completo (inclusive <b>, <i> etc.)
+        abstract_texts = []
+        abstract_node = article.find(".//Abstract")
+        if abstract_node is not None:
+            for abs_text in abstract_node.iter("AbstractText"):
+                full_text = "".join(abs_text.itertext()).strip()
+                label = abs_text.get("Label")
+                if label:
+                    full_text = f"{label}: {full_text}"
+                abstract_texts.append(full_text)
+        abstract = " ".join(abstract_texts).strip() if abstract_texts else "N/A"
+
+        artigos.append({
+            "pmid": pmid, "doi": doi, "issn": issn, "titulo": title,
+            "revista": revista, "ano": year, "autores_string": "; ".join(autores_nomes),
+            "autores_lista": autores_nomes, "abstract": abstract
+        })
+    return artigos
+
+
+# ================= CLIENTE ================= #
+
+class EutilsClient:
+    """
+    Uso: `async with EutilsClient() as client: ids = await client.esearch(...)`.
+    Todas as chamadas de um cliente reutilizam as mesmas conexões. `check`, se dado, é
+    chamado antes de cada requisição e pode interromper a coleta levantando uma exceção
+    (ex.: job.raise_if_cancelled de um job cancelado). `cache`: PubMedCache a usar (padrão:
+    o do processo; False desliga). `stats` conta o que veio do cache e o que foi à rede.
+    """
+
+    def __init__(self, base_url=None, api_key=None, bucket=None, max_connections=MAX_CONNECTIONS, check=None,
+                 cache=None):
+        # Padrões lidos na criação (não na importação): testes podem trocar pubmed.EUTILS_URL
+        self.base_url = (base_url or EUTILS_URL).rstrip("/")
+        self.api_key = API_KEY if api_key is None else api_key
+        self.bucket = bucket or _bucket
+        self.max_connections = max_connections
+        self.check = check
+        self.cache = pubmed_cache.get_cache() if cache is None else (cache or None)
+        self.stats = Counter()
+        self._client = None
+
+    async def __aenter__(self):
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        self._client = httpx.AsyncClient(timeout=TIMEOUT, limits=limits)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+
+    async def request(self, endpoint, params, post=False):
+        """Resposta de `endpoint` ('esearch', 'efetch'); PubMedError se esgotar as tentativas."""
+        url = f"{self.base_url}/{endpoint}.fcgi"
+        params = {"db": "pubmed", "tool": TOOL, "email": EMAIL, **params}
+        if self.api_key:
+            params["api_key"] = self.api_key
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            if self.check is not None:
+                self.check()
+            await self.bucket.acquire()
+            if self.check is not None:
+                self.check()
+            start = time.perf_counter()
+            response, retry_after = None, None
+            try:
+                if post:
+                    response = await self._client.post(url, data=params)
+                else:
+                    response = await self._client.get(url, params=params)
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code < 400:
+                    metrics.PUBMED_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+                    metrics.PUBMED_REQUESTS.inc(endpoint=endpoint, outcome="ok")
+                    return response
+                error = f"HTTP {response.status_code}"
+                retry_after = _retry_after(response)
+            metrics.PUBMED_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+            metrics.PUBMED_REQUESTS.inc(endpoint=endpoint, outcome="error")
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                break
+            if attempt < MAX_ATTEMPTS:
+                delay = retry_after if retry_after is not None else _backoff(attempt)
+                print(f"[WARN] PubMed {endpoint}: {error} (tentativa {attempt}/{MAX_ATTEMPTS}), "
+                      f"nova tentativa em {delay:.1f}s...")
+                await asyncio.sleep(delay)
+        raise PubMedError(f"PubMed {endpoint}: {error}")
+
+    async def _esearch(self, term, retmax, **extra):
+        """(PMIDs devolvidos, total de resultados da busca); do cache se a mesma busca foi feita há pouco."""
+        key_params = {"retmax": retmax, **extra}
+        if self.cache is not None:
+            cached = self.cache.get_search(term, key_params)
+            if cached is not None:
+                self.stats["searches_cached"] += 1
+                return cached["ids"], cached["count"]
+
+        params = {"term": term, "retmode": "json", "retmax": retmax, **extra}
+        response = await self.request("esearch", params, post=len(term) > POST_TERM_LENGTH)
+        result = response.json().get("esearchresult", {})
+        ids, count = result.get("idlist", []), int(result.get("count") or 0)
+        self.stats["searches_fetched"] += 1
+        if self.cache is not None:
+            self.cache.put_search(term, key_params, {"ids": ids, "count": count})
+        return ids, count
+
+    async def esearch(self, term, retmax=ESEARCH_RETMAX, **extra):
+        """PMIDs encontrados para `term` (extra: outros parâmetros do esearch, ex. mindate)."""
+        ids, _ = await self._esearch(term, retmax, **extra)
+        return ids
+
+    async def search_authors(self, names, on_result=None, **extra):
+        """
+        PMIDs de cada nome buscado como [Author], em paralelo; None onde a busca falhou.
+        on_result(nome, pmids) é chamado a cada busca concluída (para progresso).
+        """
+        async def search(name):
+            try:
+                ids = await self.esearch(f"{name}[Author]", **extra)
+            except (PubMedError, ValueError) as e:
+                print(f"[WARN] Busca por '{name}' falhou: {e}")
+                self.stats["searches_failed"] += 1
+                ids = None
+            if on_result is not None:
+                on_result(name, ids)
+            return ids
+        return await asyncio.gather(*(search(name) for name in names))
+
+    async def search_any_author(self, names, chunk=AUTHOR_OR_CHUNK, on_result=None, **extra):
+        """
+        Conjunto dos PMIDs em que algum dos nomes é autor. Os nomes vão combinados com OR,
+        `chunk` por busca (buscas em paralelo), em vez de um esearch por nome; uma busca com
+        mais de ESEARCH_RETMAX_MAX resultados é refeita em duas metades. Para quando não
+        importa qual nome trouxe cada PMID. on_result(nomes, pmids ou None) a cada busca.
+        """
+        names = list(dict.fromkeys(names))
+
+        async def search(group):
+            query = " OR ".join(f"{name}[Author]" for name in group)
+            try:
+                ids, count = await self._esearch(query, ESEARCH_RETMAX_MAX, **extra)
+            except (PubMedError, ValueError) as e:
+                print(f"[WARN] Busca por {len(group)} nome(s) ({group[0]}...) falhou: {e}")
+                self.stats["searches_failed"] += 1
+                ids = None
+            else:
+                if count > len(ids):
+                    if len(group) > 1:
+                        half = len(group) // 2
+                        return set().union(*await asyncio.gather(search(group[:half]), search(group[half:])))
+                    print(f"[WARN] Busca por '{group[0]}' truncada: {len(ids)} de {count} resultados.")
+            if on_result is not None:
+                on_result(group, ids)
+            return set(ids or ())
+
+        groups = [names[i:i + chunk] for i in range(0, len(names), chunk)]
+        return set().union(*await asyncio.gather(*(search(group) for group in groups)))
+
+    async def efetch(self, pmids, on_batch=None):
+        """
+        Artigos dos PMIDs, em lotes de EFETCH_BATCH buscados em paralelo; lotes com falha são pulados.
+        Só vão à rede os PMIDs ausentes ou vencidos no cache; os baixados entram nele.
+        on_batch(pmids_do_lote, artigos) é chamado a cada lote concluído (para progresso; os
+        encontrados no cache contam como um primeiro lote).
+        """
+        pmids = [str(p) for p in pmids]
+        cached = []
+        if self.cache is not None and pmids:
+            cached, pmids = self.cache.get_articles(pmids)
+            self.stats["articles_cached"] += len(cached)
+            if cached and on_batch is not None:
+                on_batch([a["pmid"] for a in cached], cached)
+
+        async def fetch(batch):
+            try:
+                response = await self.request("efetch", {"id": ",".join(batch), "retmode": "xml"}, post=True)
+                articles = parse_articles(response.text)
+                if self.cache is not None:
+                    self.cache.put_articles(articles)
+            except PubMedError as e:
+                print(f"[WARN] Lote de {len(batch)} PMIDs não baixado: {e}")
+                self.stats["batches_failed"] += 1
+                articles = []
+            if on_batch is not None:
+                on_batch(batch, articles)
+            return articles
+
+        batches = [pmids[i:i + EFETCH_BATCH] for i in range(0, len(pmids), EFETCH_BATCH)]
+        results = await asyncio.gather(*(fetch(batch) for batch in batches))
+        fetched = [article for articles in results for article in articles]
+        self.stats["articles_fetched"] += len(fetched)
+        return cached + fetched
+
+
+# ================= USO SÍNCRONO ================= #
+
+def run(fn, **client_options):
+    """
+    Executa a corrotina fn(client) num event loop próprio e devolve o resultado: para
+    código síncrono (CLI, endpoints e jobs em threads). Um cliente por chamada.
+    """
+    async def main():
+        async with EutilsClient(**client_options) as client:
+            return await fn(client)
+    return asyncio.run(main())
+
+
+def search_authors(names, **extra):
+    return run(lambda client: client.search_authors(names, **extra))
+
+
+def fetch_articles(pmids):
+    return run(lambda client: client.efetch(pmids))
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from . import metrics
+
+# Cache local das respostas do PubMed, usado pelo cliente de pubmed.py.
+#
+# Cada sincronização baixava de novo o XML de todos os PMIDs encontrados, inclusive
+# artigos já gravados que o PubMed não mudou. Agora os artigos já interpretados
+# (formato de parse_articles) ficam num SQLite por PMID e os resultados do esearch
+# por termo de busca; o efetch só pede os PMIDs ausentes ou vencidos e um esearch
+# repetido dentro do prazo nem sai para a rede.
+#
+# Cada entrada vale por um prazo (artigos mudam pouco; buscas precisam enxergar artigos
+# novos logo) e o arquivo tem tamanho máximo: passando dele, saem as entradas usadas há
+# mais tempo (LRU) até sobrar CACHE_EVICT_TO do limite.
+#
+# Configuração por variáveis de ambiente:
+#   PUBMED_CACHE_PATH             arquivo do cache
+#   PUBMED_CACHE_MAX_MB           tamanho máximo (0 desliga o cache)
+#   PUBMED_ARTICLE_TTL_DAYS       validade de um artigo baixado
+#   PUBMED_SEARCH_TTL_HOURS       validade do resultado de uma busca
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_FILENAME = "odontopub_pubmed_cache.sqlite3"
+
+MAX_BYTES = int(float(os.getenv("PUBMED_CACHE_MAX_MB", 200)) * 1024 * 1024)
+ARTICLE_TTL = float(os.getenv("PUBMED_ARTICLE_TTL_DAYS", 30)) * 24 * 3600
+SEARCH_TTL = float(os.getenv("PUBMED_SEARCH_TTL_HOURS", 6)) * 3600
+# Fração do limite que sobra depois de uma limpeza (folga para não limpar a cada gravação)
+CACHE_EVICT_TO = 0.9
+# Chaves por consulta IN (...) (limite de variáveis do SQLite)
+QUERY_CHUNK = 500
+
+ARTICLE, SEARCH = "article", "search"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_used ON entries (used_at);
+"""
+
+
+def search_key(term, params):
+    """Chave de uma busca: o termo e os demais parâmetros (retmax, mindate...), em hash."""
+    raw = json.dumps({"term": term, **{k: str(v) for k, v in params.items()}}, sort_keys=True)
+    return "search:" + hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class PubMedCache:
+    def __init__(self, path, max_bytes=MAX_BYTES, article_ttl=ARTICLE_TTL, search_ttl=SEARCH_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = {ARTICLE: article_ttl, SEARCH: search_ttl}
+        self._size = None
+        self._lock = threading.Lock()
+        with self._transaction() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ---------- leitura ---------- #
+
+    def _get(self, kind, keys, now):
+        """{chave: dado} das entradas válidas de `keys`; marca as encontradas como usadas agora."""
+        try:
+            return self._read(kind, keys, now)
+        except sqlite3.Error as e:
+            print(f"[WARN] Cache do PubMed indisponível para leitura: {e}")
+            return {}
+
+    def _read(self, kind, keys, now):
+        found = {}
+        min_fetched = now - self.ttl[kind]
+        with self._transaction() as conn:
+            for i in range(0, len(keys), QUERY_CHUNK):
+                chunk = keys[i:i + QUERY_CHUNK]
+                marks = ", ".join("?" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT key, data FROM entries WHERE key IN ({marks}) AND fetched_at >= ?", (*chunk, min_fetched)
+                ).fetchall()
+                found.update((key, json.loads(data)) for key, data in rows)
+                if rows:
+                    hits = [key for key, _ in rows]
+                    conn.execute(f"UPDATE entries SET used_at = ? WHERE key IN ({', '.join('?' for _ in hits)})",
+                                 (now, *hits))
+        return found
+
+    def get_articles(self, pmids, now=None):
+        """(artigos válidos em cache, PMIDs ausentes ou vencidos), na ordem de `pmids`."""
+        now = time.time() if now is None else now
+        pmids = [str(p) for p in pmids]
+        found = self._get(ARTICLE, [f"article:{p}" for p in pmids], now)
+        articles, missing = [], []
+        for pmid in pmids:
+            article = found.get(f"article:{pmid}")
+            if article is None:
+                missing.append(pmid)
+            else:
+                articles.append(article)
+        metrics.CACHE_REQUESTS.inc(len(articles), cache="pubmed_articles", result="hit")
+        metrics.CACHE_REQUESTS.inc(len(missing), cache="pubmed_articles", result="miss")
+        return articles, missing
+
+    def get_search(self, term, params, now=None):
+        """Resultado guardado da busca (term + params) ou None."""
+        now = time.time() if now is None else now
+        key = search_key(term, params)
+        result = self._get(SEARCH, [key], now).get(key)
+        (metrics.cache_miss if result is None else metrics.cache_hit)("pubmed_search")
+        return result
+
+    # ---------- gravação ---------- #
+
+    def _put(self, kind, items, now):
+        rows = []
+        for key, value in items:
+            data = json.dumps(value, ensure_ascii=False)
+            rows.append((key, kind, data, len(data.encode("utf-8")), now, now))
+        if not rows:
+            return
+        try:
+            with self._transaction() as conn:
+                conn.executemany(
+                    "INSERT INTO entries (key, kind, data, size, fetched_at, used_at) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET data = excluded.data, size = excluded.size, "
+                    "fetched_at = excluded.fetched_at, used_at = excluded.used_at",
+                    rows,
+                )
+            with self._lock:
+                # Tamanho aproximado entre limpezas (substituições contam em dobro até a próxima)
+                self._size = (self.size() if self._size is None else self._size + sum(r[3] for r in rows))
+                if self._size > self.max_bytes:
+                    self._size = self.evict(int(self.max_bytes * CACHE_EVICT_TO))
+        except sqlite3.Error as e:
+            # Sem cache a coleta continua, só baixa de novo da próxima vez
+            print(f"[WARN] Cache do PubMed não gravado: {e}")
+
+    def put_articles(self, articles, now=None):
+        now = time.time() if now is None else now
+        self._put(ARTICLE, [(f"article:{a['pmid']}", a) for a in articles if a.get("pmid")], now)
+
+    def put_search(self, term, params, result, now=None):
+        now = time.time() if now is None else now
+        self._put(SEARCH, [(search_key(term, params), result)], now)
+
+    # ---------- tamanho ---------- #
+
+    def size(self):
+        with self._transaction() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self, target):
+        """Remove as entradas usadas há mais tempo até o total caber em `target` bytes; devolve o total."""
+        with self._transaction() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= target:
+                return total
+            doomed = []
+            for key, size in conn.execute("SELECT key, size FROM entries ORDER BY used_at"):
+                doomed.append((key,))
+                total -= size
+                if total <= target:
+                    break
+            conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        print(f"[OK] Cache do PubMed: {len(doomed)} entradas antigas removidas ({total / 1024 / 1024:.1f} MB).")
+        return total
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM entries")
+        with self._lock:
+            self._size = 0
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def get_cache():
+    """Cache do processo (criado na primeira chamada); None se desligado ou se o arquivo falhar."""
+    global _cache
+    with _lock:
+        if _cache is None:
+            if MAX_BYTES <= 0:
+                _cache = False
+            else:
+                path = os.getenv("PUBMED_CACHE_PATH") or os.path.join(BASE_DIR, CACHE_FILENAME)
+                try:
+                    _cache = PubMedCache(path)
+                except sqlite3.Error as e:
+                    print(f"[WARN] Cache do PubMed desligado: {e}")
+                    _cache = False
+        return _cache or None
@@ -0,0 +1,124 @@
+import gzip
+import json
+from datetime import date, datetime
+
+import numpy as np
+from fastapi import Response
+
+# Camada de resposta JSON.
+#
+# Retornar um dict do endpoint faz o FastAPI percorrer tudo com jsonable_encoder antes
+# de serializar; para listas grandes isso domina o tempo de CPU. Aqui os endpoints
+# devolvem um Response com os bytes já codificados: orjson quando instalado (entende
+# escalares e arrays numpy), senão o json da biblioteca padrão com um `default` para
+# esses tipos. Para respostas que só dependem do snapshot, os bytes (e as variantes
+# comprimidas) ficam no memo do snapshot: servir vira só copiar bytes.
+
+try:
+    import orjson
+except ImportError:  # opcional: sem ele usa o json da biblioteca padrão
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele só gzip
+    brotli = None
+
+# Abaixo disso não compensa comprimir
+MIN_COMPRESS_SIZE = 1024
+
+
+def _default(obj):
+    """Tipos que o json padrão não conhece (numpy, datas, conjuntos)."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Tipo não serializável em JSON: {type(obj).__name__}")
+
+
+def dumps(obj):
+    """Serializa `obj` para bytes JSON (UTF-8)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class EncodedBody:
+    """Bytes JSON de uma resposta e, sob demanda, suas versões comprimidas."""
+
+    def __init__(self, body):
+        self.body = body
+        self._variants = {}
+
+    def variant(self, encoding):
+        """Corpo para o Content-Encoding pedido (calculado uma vez por encoding)."""
+        if encoding is None:
+            return self.body
+        if encoding not in self._variants:
+            if encoding == "br":
+                self._variants[encoding] = brotli.compress(self.body, quality=5)
+            else:
+                self._variants[encoding] = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._variants[encoding]
+
+
+def _quality(params):
+    """Valor q dos parâmetros de um item de Accept-Encoding (1.0 se ausente; 0.0 se inválido)."""
+    for param in params:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepted_encoding(request, size):
+    """Melhor Content-Encoding aceito pelo cliente para um corpo de `size` bytes (None = sem compressão)."""
+    if request is None or size < MIN_COMPRESS_SIZE:
+        return None
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, *params = part.split(";")
+        if _quality(params) > 0:  # q=0 (ou 0.0, 0.000...) recusa a codificação
+            accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def encoded_response(encoded, request=None, status_code=200, headers=None):
+    """Response com o corpo de `encoded` na melhor codificação aceita pelo cliente."""
+    encoding = accepted_encoding(request, len(encoded.body))
+    response = Response(
+        content=encoded.variant(encoding),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
+    response.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def json_response(content, request=None, status_code=200, headers=None):
+    """Serializa `content` com o codificador rápido (sem passar pelo jsonable_encoder)."""
+    return encoded_response(EncodedBody(dumps(content)), request, status_code, headers)
+
+
+def cached_json_response(snap, key, factory, request=None, headers=None):
+    """
+    Resposta de um payload que só depende do snapshot: serializado (e comprimido)
+    uma vez por versão dos dados e guardado no memo do snapshot sob ("json", key).
+    """
+    encoded = snap.cached(("json", key), lambda: EncodedBody(dumps(factory())))
+    return encoded_response(encoded, request, headers=headers)
@@ -0,0 +1,206 @@
+import bisect
+import copy
+import unicodedata
+import re
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+# Peso de cada campo no ranking. Um termo que aparece em vários campos da mesma
+# publicação soma os pesos (ex.: título + revista).
+FIELD_WEIGHTS = {
+    "titulo": 3.0,
+    "autores": 2.0,
+    "revista": 1.5,
+    "doi": 1.0,
+    "pmid": 4.0,
+    "ano": 1.0,
+}
+
+# Casamento apenas por prefixo vale menos que o termo completo
+PREFIX_FACTOR = 0.5
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold_text(texto):
+    """Remove acentos, converte para minúsculas e devolve a lista de tokens alfanuméricos."""
+    if not texto:
+        return []
+    n = unicodedata.normalize('NFKD', str(texto))
+    n = n.encode('ascii', 'ignore').decode("utf-8").lower()
+    return TOKEN_RE.findall(n)
+
+
+class SearchIndex:
+    """
+    Índice invertido (token -> publicações) sobre título, autores, revista, DOI, PMID e ano.
+
+    As listas de postings ficam em formato CSR, na ordem lexicográfica do vocabulário:
+    todos os tokens que começam com um mesmo prefixo ocupam um intervalo contíguo,
+    então a busca "conforme o usuário digita" vira uma fatia de array, sem varrer df_pub.
+    Os documentos são as posições (iloc) em df_pub.
+
+    Atualizações incrementais (with_document) não mexem nos arrays CSR: o documento
+    alterado é marcado como removido da base e seus postings vão para um segmento
+    extra pequeno, consultado junto. Uma recarga completa reconstrói tudo compactado.
+    """
+
+    def __init__(self, df_pub):
+        self.n_docs = len(df_pub)
+        self.base_docs = self.n_docs   # documentos cobertos pelos arrays CSR
+        self.vocab = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.docs = np.zeros(0, dtype=np.int32)
+        self.weights = np.zeros(0, dtype=np.float32)
+        # Segmento incremental: token -> {doc: peso}, doc -> tokens e docs da base invalidados
+        self.extra = {}
+        self.extra_vocab = []
+        self.extra_docs = {}
+        self.dead = np.zeros(0, dtype=np.int64)
+        if self.n_docs:
+            self._build(df_pub)
+
+    def _build(self, df_pub):
+        fields = [f for f in FIELD_WEIGHTS if f in df_pub.columns]
+        field_weights = np.array([FIELD_WEIGHTS[f] for f in fields], dtype=np.float32)
+        n_fields = len(fields)
+
+        tokens, docs, field_ids = [], [], []
+        for f_idx, field in enumerate(fields):
+            # Tokeniza cada valor distinto uma vez só (revistas e anos se repetem muito)
+            value_codes, values = pd.factorize(df_pub[field].astype(str))
+            folded = (
+                pd.Series(values, dtype=object)
+                .str.normalize('NFKD')
+                .str.encode('ascii', 'ignore')
+                .str.decode('ascii')
+                .str.lower()
+                .str.findall(TOKEN_RE.pattern)
+                .tolist()
+            )
+            per_doc = [folded[c] for c in value_codes]
+            lengths = np.fromiter(map(len, per_doc), dtype=np.int64, count=len(per_doc))
+            tokens.extend(chain.from_iterable(per_doc))
+            docs.append(np.repeat(np.arange(self.n_docs, dtype=np.int64), lengths))
+            field_ids.append(np.full(lengths.sum(), f_idx, dtype=np.int64))
+
+        # Vocabulário ordenado: os códigos de token já seguem a ordem lexicográfica
+        codes, vocab = pd.factorize(np.array(tokens, dtype=object), sort=True)
+        docs = np.concatenate(docs)
+        field_ids = np.concatenate(field_ids)
+
+        # Um token repetido no mesmo campo conta uma vez; entre campos, os pesos somam.
+        # Chave inteira (token, doc, campo), ordenada: agrupar vira detectar sequências.
+        keys = np.sort((codes.astype(np.int64) * self.n_docs + docs) * n_fields + field_ids)
+        keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+        pair_keys = keys // n_fields
+        starts = np.flatnonzero(np.r_[True, pair_keys[1:] != pair_keys[:-1]])
+        pairs = pair_keys[starts]
+        weights = np.add.reduceat(field_weights[keys % n_fields], starts) if len(keys) else field_weights[:0]
+
+        token_codes = pairs // self.n_docs
+        self.vocab = list(vocab)
+        self.offsets = np.searchsorted(token_codes, np.arange(len(vocab) + 1)).astype(np.int64)
+        self.docs = (pairs % self.n_docs).astype(np.int32)
+        self.weights = weights.astype(np.float32)
+
+    def _prefix_range(self, token, vocab=None):
+        vocab = self.vocab if vocab is None else vocab
+        lo = bisect.bisect_left(vocab, token)
+        hi = bisect.bisect_left(vocab, token + "\uffff", lo)
+        return lo, hi
+
+    def with_document(self, doc, row):
+        """
+        Cópia do índice com a publicação na posição `doc` (re)indexada a partir de `row`
+        (dict com os campos de df_pub). Os arrays da base são compartilhados, não copiados.
+        """
+        index = copy.copy(self)
+        index.n_docs = max(self.n_docs, doc + 1)
+        index.extra = {t: dict(postings) for t, postings in self.extra.items()}
+        index.extra_docs = dict(self.extra_docs)
+        if doc < self.base_docs and not np.isin(doc, self.dead):
+            index.dead = np.append(self.dead, doc)
+
+        for token in index.extra_docs.pop(doc, []):
+            index.extra[token].pop(doc, None)
+            if not index.extra[token]:
+                del index.extra[token]
+
+        doc_weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            if field in row:
+                for token in set(fold_text(row[field])):
+                    doc_weights[token] = doc_weights.get(token, 0.0) + weight
+        for token, weight in doc_weights.items():
+            index.extra.setdefault(token, {})[doc] = weight
+        index.extra_docs[doc] = list(doc_weights)
+        index.extra_vocab = sorted(index.extra)
+        return index
+
+    def _term_postings(self, term):
+        """(docs, pesos) que casam `term` por prefixo, já com o fator de prefixo aplicado."""
+        lo, hi = self._prefix_range(term)
+        start, end = self.offsets[lo], self.offsets[hi]
+        docs = self.docs[start:end]
+        weights = self.weights[start:end].copy()
+        # Casamento exato do termo vale o peso cheio; os demais são só prefixo
+        if lo < hi and self.vocab[lo] == term:
+            weights[self.offsets[lo + 1] - start:] *= PREFIX_FACTOR
+        else:
+            weights *= PREFIX_FACTOR
+
+        if len(self.dead) and len(docs):
+            alive = ~np.isin(docs, self.dead)
+            docs, weights = docs[alive], weights[alive]
+
+        if self.extra_vocab:
+            e_lo, e_hi = self._prefix_range(term, self.extra_vocab)
+            extra_docs, extra_weights = [], []
+            for token in self.extra_vocab[e_lo:e_hi]:
+                factor = 1.0 if token == term else PREFIX_FACTOR
+                for doc, weight in self.extra[token].items():
+                    extra_docs.append(doc)
+                    extra_weights.append(weight * factor)
+            if extra_docs:
+                docs = np.concatenate((docs, np.array(extra_docs, dtype=np.int32)))
+                weights = np.concatenate((weights, np.array(extra_weights, dtype=np.float32)))
+        return docs, weights
+
+    def search(self, query, limit=50, offset=0):
+        """
+        Retorna (posições em df_pub da página pedida, total de resultados).
+        Todos os termos da consulta precisam casar (AND), cada um por prefixo;
+        o ranking soma os pesos dos campos e desempata pela ordem de df_pub (ano desc).
+        """
+        terms = list(dict.fromkeys(fold_text(query)))
+        if not terms or not self.n_docs:
+            return np.zeros(0, dtype=np.int64), 0
+
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        hits = np.zeros(self.n_docs, dtype=np.int32)
+        for term in terms:
+            docs, weights = self._term_postings(term)
+            if not len(docs):
+                return np.zeros(0, dtype=np.int64), 0
+
+            term_scores = np.bincount(docs, weights=weights, minlength=self.n_docs)
+            scores += term_scores.astype(np.float32)
+            hits += term_scores > 0
+
+        matches = np.flatnonzero(hits == len(terms))
+        total = len(matches)
+        match_scores = scores[matches]
+
+        # Só a página pedida precisa de ordenação completa: descarta primeiro tudo
+        # que fica abaixo do k-ésimo melhor score (os empates no corte são mantidos)
+        k = offset + limit
+        if total > k:
+            kth = np.partition(match_scores, total - k)[total - k]
+            keep = match_scores >= kth
+            matches, match_scores = matches[keep], match_scores[keep]
+
+        order = np.lexsort((matches, -match_scores))
+        return matches[order][offset:k], total
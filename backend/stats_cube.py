@@ -0,0 +1,234 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from .indexes import QUALIS_STRATA
+
+TOP_JOURNALS = 20
+TOP_RESEARCHERS = 15
+
+# Chave usada para "todos os anos" / "todas as áreas"
+ALL = None
+
+
+def _year_value(ano):
+    """Ano como em years_evolution (coluna convertida para object): int/str do Python."""
+    return ano.item() if isinstance(ano, np.generic) else ano
+
+
+class StatsCube:
+    """
+    Agregados pré-calculados para /stats, indexados por (ano, área de atuação).
+
+    Cada célula guarda as posições (em df_pub) das publicações únicas, a distribuição
+    Qualis, as revistas mais frequentes e a contagem de publicações por professor.
+    Uma consulta com um único ano e uma única área (ou sem filtro) é respondida lendo
+    uma célula; quando o filtro de área casa várias áreas, as células são combinadas:
+    contagens por professor somam direto (cada professor pertence a uma área) e as
+    publicações únicas são unidas antes de recontar Qualis e revistas.
+    """
+
+    def __init__(self, df_pub, df_prof, df_links, pmid_pos):
+        self.n_pubs = len(df_pub)
+        self.cells = {}
+
+        qualis_labels = QUALIS_STRATA + sorted(set(df_pub['qualis'].unique()) - set(QUALIS_STRATA)) \
+            if not df_pub.empty else list(QUALIS_STRATA)
+        self.qualis_labels = qualis_labels
+        self.qualis_codes = pd.Categorical(df_pub['qualis'], categories=qualis_labels).codes.astype(np.int64)
+        # Colunas categóricas viram valores simples: a ordem dos rótulos segue a primeira
+        # aparição em df_pub, e só anos presentes entram nas contagens
+        self.journal_codes, self.journal_names = pd.factorize(pd.Index(df_pub['revista'].to_numpy(dtype=object)))
+        anos = df_pub['ano'].astype(object)
+        self.year_keys = anos.astype(str).to_numpy()
+
+        self.prof_names = dict(zip(df_prof['id_professor'], df_prof['nome']))
+        self.prof_areas = prof_areas = dict(zip(df_prof['id_professor'], df_prof['atuacao']))
+        self.areas = sorted({a for a in prof_areas.values() if a})
+        self.area_sizes = df_prof['atuacao'].value_counts().to_dict()
+        self.total_profs = len(df_prof)
+
+        # Filtros e séries que não dependem da consulta
+        self.available_years = sorted(anos.unique().tolist(), reverse=True)
+        try:
+            self.years_evolution = anos.value_counts().sort_index().to_dict()
+        except TypeError:
+            self.years_evolution = {}
+
+        self._build(df_links, prof_areas, pmid_pos)
+
+    def _build(self, df_links, prof_areas, pmid_pos):
+        links = df_links[['pmid', 'id_professor']].copy()
+        links['area'] = links['id_professor'].map(prof_areas)
+        links['pos'] = links['pmid'].map(pmid_pos)
+        links = links.dropna(subset=['area', 'pos'])
+        links['pos'] = links['pos'].astype(np.int64)
+        links['ano'] = self.year_keys[links['pos'].to_numpy()] if len(links) else []
+
+        # Área = ALL: todas as publicações (inclusive as sem vínculo), como no filtro só por ano
+        all_positions = np.arange(self.n_pubs)
+        self.cells[(ALL, ALL)] = self._cell(all_positions, links['id_professor'].value_counts())
+        links_by_year = dict(tuple(links.groupby('ano')))
+        for year, positions in pd.Series(all_positions).groupby(self.year_keys):
+            year_links = links_by_year.get(year, links.iloc[:0])
+            self.cells[(year, ALL)] = self._cell(positions.to_numpy(), year_links['id_professor'].value_counts())
+
+        # Área específica: publicações vinculadas a professores daquela área
+        for area, area_links in links.groupby('area'):
+            self.cells[(ALL, area)] = self._links_cell(area_links)
+            for year, cell_links in area_links.groupby('ano'):
+                self.cells[(year, area)] = self._links_cell(cell_links)
+
+    def _links_cell(self, links):
+        positions = np.unique(links['pos'].to_numpy())
+        return self._cell(positions, links['id_professor'].value_counts())
+
+    def _cell(self, positions, researcher_counts):
+        return {
+            'positions': positions,
+            'qualis': np.bincount(self.qualis_codes[positions], minlength=len(self.qualis_labels)),
+            'top_journals': self._top_journals(positions),
+            'researchers': {int(k): int(v) for k, v in researcher_counts.items()},
+        }
+
+    def _top_journals(self, positions):
+        counts = np.bincount(self.journal_codes[positions], minlength=len(self.journal_names))
+        # Ordenação estável: empates seguem a ordem de primeira aparição da revista
+        top = np.argsort(-counts, kind='stable')[:TOP_JOURNALS]
+        return {self.journal_names[i]: int(counts[i]) for i in top if counts[i] > 0}
+
+    def _publication_cells(self, year, profs):
+        """Células que contêm uma publicação do ano `year` vinculada a `profs` -> professores contados."""
+        profs = [p for p in profs if p in self.prof_areas]
+        cells = {(ALL, ALL): profs, (year, ALL): profs}
+        for p in profs:
+            area = self.prof_areas[p]
+            cells.setdefault((ALL, area), []).append(p)
+            cells.setdefault((year, area), []).append(p)
+        return cells
+
+    def with_publication(self, pos, row, before, after):
+        """
+        Cópia do cubo com a publicação na posição `pos` incluída/alterada para `row`.
+        `before` e `after` são (ano, [id_professor vinculados]) antes e depois da
+        alteração (`before` = None para publicação nova). Só as células que continham
+        ou passam a conter a publicação são refeitas; as demais são compartilhadas.
+        """
+        cube = copy.copy(self)
+        cube.cells = dict(self.cells)
+
+        # Códigos por publicação (cópia dos arrays, novos rótulos entram no fim)
+        qualis, revista, year = row['qualis'], row['revista'], str(row['ano'])
+        if qualis not in self.qualis_labels:
+            cube.qualis_labels = self.qualis_labels + [qualis]
+        journal = self.journal_names.get_indexer([revista])[0]
+        if journal < 0:
+            journal = len(self.journal_names)
+            cube.journal_names = self.journal_names.append(pd.Index([revista]))
+        cube.n_pubs = max(self.n_pubs, pos + 1)
+        cube.qualis_codes = np.resize(self.qualis_codes, cube.n_pubs)
+        cube.journal_codes = np.resize(self.journal_codes, cube.n_pubs)
+        cube.year_keys = np.resize(self.year_keys, cube.n_pubs)
+        cube.qualis_codes[pos] = cube.qualis_labels.index(qualis)
+        cube.journal_codes[pos] = journal
+        cube.year_keys[pos] = year
+
+        # Chaves com o tipo Python da carga completa (escalares numpy não serializam como chave)
+        evolution = dict(self.years_evolution)
+        if before is not None:
+            old_year = _year_value(before[0])
+            evolution[old_year] -= 1
+            if not evolution[old_year]:
+                del evolution[old_year]
+        new_year = _year_value(row['ano'])
+        evolution[new_year] = evolution.get(new_year, 0) + 1
+        cube.years_evolution = dict(sorted(evolution.items()))
+        cube.available_years = sorted(evolution, reverse=True)
+
+        old_cells = self._publication_cells(str(before[0]), before[1]) if before is not None else {}
+        new_cells = self._publication_cells(year, after[1])
+        for key in old_cells.keys() | new_cells.keys():
+            cell = cube.cells.get(key)
+            positions = cell['positions'] if cell else np.zeros(0, dtype=np.int64)
+            researchers = dict(cell['researchers']) if cell else {}
+            for p in old_cells.get(key, []):
+                researchers[p] -= 1
+            for p in new_cells.get(key, []):
+                researchers[p] = researchers.get(p, 0) + 1
+            researchers = {p: c for p, c in researchers.items() if c}
+
+            if key not in new_cells:
+                positions = positions[positions != pos]
+            elif key[0] is ALL and key[1] is ALL:
+                positions = np.arange(cube.n_pubs)
+            elif not np.isin(pos, positions):
+                positions = np.insert(positions, np.searchsorted(positions, pos), pos)
+
+            if len(positions) or key == (ALL, ALL):
+                cube.cells[key] = {
+                    'positions': positions,
+                    'qualis': np.bincount(cube.qualis_codes[positions], minlength=len(cube.qualis_labels)),
+                    'top_journals': cube._top_journals(positions),
+                    'researchers': researchers,
+                }
+            else:
+                cube.cells.pop(key, None)
+        return cube
+
+    def matching_areas(self, atuacao):
+        """Áreas cujo nome contém `atuacao` (sem diferenciar maiúsculas/minúsculas)."""
+        needle = atuacao.lower()
+        return [a for a in self.areas if needle in a.lower()]
+
+    def query(self, ano=None, atuacao=None):
+        year = str(ano) if ano else ALL
+        if atuacao:
+            areas = self.matching_areas(atuacao)
+            total_profs = sum(self.area_sizes.get(a, 0) for a in areas)
+            cells = [self.cells[(year, a)] for a in areas if (year, a) in self.cells]
+        else:
+            total_profs = self.total_profs
+            cells = [self.cells.get((year, ALL))]
+            cells = [c for c in cells if c is not None]
+
+        if len(cells) == 1:
+            cell = cells[0]
+            n_pubs = len(cell['positions'])
+            qualis = cell['qualis']
+            top_journals = cell['top_journals']
+            researchers = cell['researchers']
+        elif cells:
+            # União das publicações por máscara (evita ordenar para deduplicar)
+            mask = np.zeros(self.n_pubs, dtype=bool)
+            for c in cells:
+                mask[c['positions']] = True
+            positions = np.flatnonzero(mask)
+            n_pubs = len(positions)
+            qualis = np.bincount(self.qualis_codes[positions], minlength=len(self.qualis_labels))
+            top_journals = self._top_journals(positions)
+            researchers = {}
+            for c in cells:
+                researchers.update(c['researchers'])
+        else:
+            n_pubs = 0
+            qualis = np.zeros(len(self.qualis_labels), dtype=np.int64)
+            top_journals = {}
+            researchers = {}
+
+        q_counts = dict(zip(self.qualis_labels, qualis.tolist()))
+        ranked = sorted(
+            ((self.prof_names[i], c) for i, c in researchers.items() if i in self.prof_names and c > 0),
+            key=lambda item: (-item[1], item[0])
+        )[:TOP_RESEARCHERS]
+
+        return {
+            "total_professores": total_profs,
+            "total_publicacoes": n_pubs,
+            "qualis_distribution": {q: int(q_counts.get(q, 0)) for q in QUALIS_STRATA},
+            "top_journals": top_journals,
+            "publications_by_year": self.years_evolution,
+            "top_researchers": dict(ranked),
+            "available_years": self.available_years,
+            "available_areas": self.areas,
+        }
@@ -0,0 +1,516 @@
+import os
+import sys
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Armazenamento dos dados editáveis (professores, publicações e vínculos).
+#
+# Antes cada escrita lia um CSV inteiro com pandas, alterava e regravava o arquivo todo.
+# Agora admin_routes, sync_service e data_manager falam com uma interface Storage; a
+# implementação padrão é SQLite, com índices por pmid e id_professor e transações que
+# cobrem várias tabelas, de modo que o custo de uma escrita depende do tamanho da
+# alteração, e não do acervo. Os CSVs continuam como formato de troca (import/export).
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_FILENAME = "odontopub.sqlite3"
+
+# Ordem das colunas (a mesma dos CSVs originais)
+PROF_COLUMNS = ["id_professor", "nome", "variantes", "categoria", "lattes_id", "atuacao"]
+PUB_COLUMNS = ["pmid", "doi", "titulo", "revista", "ano", "autores", "abstract", "issn"]
+VIN_COLUMNS = ["pmid", "id_professor"]
+
+# Textos que o read_csv do pandas lê como vazio. São gravados como NULL, para que o
+# banco devolva o mesmo que a leitura dos CSVs devolvia (ex.: DOI "N/A" -> "").
+NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+
+def clean_value(value):
+    """Converte um valor vindo de pandas/API para o que é gravado no banco."""
+    if value is None:
+        return None
+    if hasattr(value, "item"):  # escalares numpy
+        value = value.item()
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return None
+        return int(value) if value.is_integer() else value
+    if isinstance(value, str) and value.strip() in NA_VALUES:
+        return None
+    return value
+
+
+def clean_year(value):
+    """Ano numérico vira inteiro (como o read_csv inferia); o resto fica como texto."""
+    value = clean_value(value)
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value.strip())
+    return value
+
+
+def clean_pmid(value):
+    value = clean_value(value)
+    return "" if value is None else str(value).strip()
+
+
+class Storage(ABC):
+    """
+    Interface do armazenamento. As tabelas devolvidas por read_tables têm os mesmos
+    tipos que a leitura dos CSVs produzia (id_professor inteiro, pmid/lattes_id texto,
+    vazios como None), então data_store trata as duas origens do mesmo jeito.
+    Uma implementação que não defina todos os métodos abstratos falha já ao ser instanciada.
+    """
+
+    # --- Leitura em bloco (carga do data_store) ---
+    @abstractmethod
+    def source_files(self):
+        """Arquivos cujo conteúdo determina read_tables (para o cache de tabelas)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_tables(self):
+        """(df_prof, df_pub, df_vin) completos."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def replace_tables(self, df_prof, df_pub, df_vin):
+        """Substitui todo o conteúdo, numa única transação."""
+        raise NotImplementedError
+
+    # --- Professores ---
+    @abstractmethod
+    def list_professors(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_professor(self, id_professor):
+        """Linha do professor (dict) ou None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_professor(self, fields):
+        """Inclui com o próximo id (max + 1) e devolve a linha gravada."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_professor(self, id_professor, fields):
+        """False se o professor não existir."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_professor(self, id_professor):
+        """Remove o professor e seus vínculos. False se não existir."""
+        raise NotImplementedError
+
+    # --- Publicações e vínculos ---
+    @abstractmethod
+    def list_publications(self, limit=100, pmid=None, after=None):
+        """
+        Página de publicações em ordem (ano, pmid) decrescente, opcionalmente filtradas por
+        trecho do pmid. `after` é a chave de ordenação da última linha da página anterior.
+        Devolve (linhas, chave da última linha, ou None se não há mais páginas).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_publications(self, pmid=None):
+        """Total de publicações (filtradas por trecho do pmid, como em list_publications)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_pmids(self):
+        """Conjunto de todos os pmids cadastrados."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_publication(self, pub, id_professor):
+        """
+        Inclui a publicação (se o pmid ainda não existir) e o vínculo com o professor
+        (se ainda não existir). Devolve True se a publicação foi criada.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_publication(self, pmid, fields):
+        """False se a publicação não existir."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_publication(self, pmid):
+        """Remove a publicação e seus vínculos. False se não existir."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def merge_publications(self, pubs, links):
+        """
+        Grava o resultado de uma coleta: publicações já existentes são atualizadas
+        (a versão nova prevalece) e vínculos repetidos são ignorados.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_orphan_links(self):
+        """Remove vínculos cujo pmid não está em publicações; devolve quantos."""
+        raise NotImplementedError
+
+    # --- Estado da sincronização com o PubMed ---
+    @abstractmethod
+    def get_sync_states(self, mode):
+        """
+        {id_professor: {synced_at, full_synced_at, terms_hash}} da última sincronização
+        concluída de cada professor no modo (inícios em epoch; full_synced_at é o da
+        última busca no histórico inteiro, sem filtro de data).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_sync_states(self, mode, states):
+        """Grava estados ({id_professor, synced_at, full_synced_at, terms_hash}) de sincronizações concluídas."""
+        raise NotImplementedError
+
+    # --- Compatibilidade com CSV ---
+    def import_csv(self, base_dir):
+        """Substitui o conteúdo pelo de professores.csv, publicacoes.csv e vinculos.csv."""
+        def read(name, **kwargs):
+            path = os.path.join(base_dir, name)
+            return pd.read_csv(path, **kwargs) if os.path.exists(path) else pd.DataFrame()
+
+        df_prof = read("professores.csv", dtype={'lattes_id': str})
+        df_pub = read("publicacoes.csv")
+        df_vin = read("vinculos.csv")
+        self.replace_tables(df_prof, df_pub, df_vin)
+        return len(df_prof), len(df_pub), len(df_vin)
+
+    def export_csv(self, base_dir):
+        """Grava as três tabelas como CSV (mesmos nomes e colunas dos arquivos originais)."""
+        df_prof, df_pub, df_vin = self.read_tables()
+        os.makedirs(base_dir, exist_ok=True)
+        df_prof.to_csv(os.path.join(base_dir, "professores.csv"), index=False)
+        df_pub.to_csv(os.path.join(base_dir, "publicacoes.csv"), index=False)
+        df_vin.to_csv(os.path.join(base_dir, "vinculos.csv"), index=False)
+        return len(df_prof), len(df_pub), len(df_vin)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS professores (
+    id_professor INTEGER PRIMARY KEY,
+    nome TEXT,
+    variantes TEXT,
+    categoria TEXT,
+    lattes_id TEXT,
+    atuacao TEXT
+);
+CREATE TABLE IF NOT EXISTS publicacoes (
+    pmid TEXT PRIMARY KEY,
+    doi TEXT,
+    titulo TEXT,
+    revista TEXT,
+    ano,
+    autores TEXT,
+    abstract TEXT,
+    issn TEXT
+);
+CREATE TABLE IF NOT EXISTS vinculos (
+    pmid TEXT NOT NULL,
+    id_professor INTEGER NOT NULL,
+    PRIMARY KEY (pmid, id_professor)
+);
+CREATE INDEX IF NOT EXISTS idx_vinculos_professor ON vinculos (id_professor);
+CREATE TABLE IF NOT EXISTS sync_state (
+    id_professor INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    full_synced_at REAL,
+    terms_hash TEXT,
+    PRIMARY KEY (id_professor, mode)
+);
+CREATE INDEX IF NOT EXISTS idx_publicacoes_ano ON publicacoes (ano);
+CREATE INDEX IF NOT EXISTS idx_publicacoes_ordem ON publicacoes (
+    COALESCE(CAST(ano AS INTEGER), 0) DESC, CAST(pmid AS INTEGER) DESC, pmid DESC
+);
+"""
+
+# Chave de ordenação da listagem (mesmas expressões do índice idx_publicacoes_ordem)
+PUB_ORDER_KEY = ("COALESCE(CAST(ano AS INTEGER), 0)", "CAST(pmid AS INTEGER)", "pmid")
+
+
+class SqliteStorage(Storage):
+    """
+    Implementação em SQLite (um arquivo, sem servidor). Cada operação abre sua própria
+    conexão e roda numa transação: alterações em várias tabelas (ex.: publicação +
+    vínculos) são gravadas juntas ou não são gravadas. O modo WAL deixa as leituras
+    seguirem enquanto uma escrita acontece.
+    """
+
+    def __init__(self, path, csv_dir=None):
+        self.path = path
+        is_new = not os.path.exists(path)
+        with self._transaction() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        # Primeira execução: migra os CSVs existentes para o banco
+        if is_new and csv_dir and os.path.exists(os.path.join(csv_dir, "publicacoes.csv")):
+            counts = self.import_csv(csv_dir)
+            print(f"[OK] Banco {os.path.basename(path)} criado a partir dos CSVs "
+                  f"({counts[0]} professores, {counts[1]} publicações, {counts[2]} vínculos).")
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _rows(cursor):
+        return [{k: ("" if row[k] is None else row[k]) for k in row.keys()} for row in cursor]
+
+    # --- Leitura em bloco ---
+    def source_files(self):
+        # Escritas ainda não consolidadas ficam no arquivo -wal
+        return [self.path, f"{self.path}-wal"]
+
+    def read_tables(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            df_prof = pd.read_sql_query(f"SELECT {', '.join(PROF_COLUMNS)} FROM professores ORDER BY rowid", conn)
+            df_pub = pd.read_sql_query(f"SELECT {', '.join(PUB_COLUMNS)} FROM publicacoes ORDER BY rowid", conn)
+            df_vin = pd.read_sql_query(f"SELECT {', '.join(VIN_COLUMNS)} FROM vinculos ORDER BY rowid", conn)
+        finally:
+            conn.close()
+        return df_prof, df_pub, df_vin
+
+    def replace_tables(self, df_prof, df_pub, df_vin):
+        def records(df, columns, convert=None):
+            df = df.reindex(columns=columns).astype(object)
+            rows = []
+            for values in df.itertuples(index=False, name=None):
+                row = [clean_value(v) for v in values]
+                rows.append(convert(row) if convert else row)
+            return rows
+
+        year_idx, pmid_idx = PUB_COLUMNS.index("ano"), PUB_COLUMNS.index("pmid")
+
+        def pub_row(row):
+            row[pmid_idx] = clean_pmid(row[pmid_idx])
+            row[year_idx] = clean_year(row[year_idx])
+            return row
+
+        def vin_row(row):
+            return [clean_pmid(row[0]), row[1]]
+
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM vinculos")
+            conn.execute("DELETE FROM publicacoes")
+            conn.execute("DELETE FROM professores")
+            # Outro acervo: a próxima sincronização de cada professor busca o histórico inteiro
+            conn.execute("DELETE FROM sync_state")
+            self._insert(conn, "professores", PROF_COLUMNS, records(df_prof, PROF_COLUMNS), "REPLACE")
+            self._insert(conn, "publicacoes", PUB_COLUMNS, records(df_pub, PUB_COLUMNS, pub_row), "REPLACE")
+            self._insert(conn, "vinculos", VIN_COLUMNS, records(df_vin, VIN_COLUMNS, vin_row), "IGNORE")
+
+    @staticmethod
+    def _insert(conn, table, columns, rows, on_conflict):
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(
+            f"INSERT OR {on_conflict} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows
+        )
+
+    # --- Professores ---
+    def list_professors(self):
+        with self._transaction() as conn:
+            return self._rows(conn.execute(f"SELECT {', '.join(PROF_COLUMNS)} FROM professores ORDER BY rowid"))
+
+    def get_professor(self, id_professor):
+        with self._transaction() as conn:
+            rows = self._rows(conn.execute(
+                f"SELECT {', '.join(PROF_COLUMNS)} FROM professores WHERE id_professor = ?", (id_professor,)
+            ))
+        return rows[0] if rows else None
+
+    def add_professor(self, fields):
+        with self._transaction() as conn:
+            new_id = conn.execute("SELECT COALESCE(MAX(id_professor), 0) + 1 FROM professores").fetchone()[0]
+            row = {c: fields.get(c) for c in PROF_COLUMNS}
+            row["id_professor"] = new_id
+            self._insert(conn, "professores", PROF_COLUMNS, [[clean_value(row[c]) for c in PROF_COLUMNS]], "ABORT")
+        return row
+
+    def update_professor(self, id_professor, fields):
+        columns = [c for c in PROF_COLUMNS if c in fields and c != "id_professor"]
+        if not columns:
+            return self.get_professor(id_professor) is not None
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE professores SET {', '.join(f'{c} = ?' for c in columns)} WHERE id_professor = ?",
+                [clean_value(fields[c]) for c in columns] + [id_professor],
+            )
+            return cursor.rowcount > 0
+
+    def delete_professor(self, id_professor):
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM professores WHERE id_professor = ?", (id_professor,))
+            if cursor.rowcount == 0:
+                return False
+            conn.execute("DELETE FROM vinculos WHERE id_professor = ?", (id_professor,))
+            conn.execute("DELETE FROM sync_state WHERE id_professor = ?", (id_professor,))
+            return True
+
+    # --- Publicações e vínculos ---
+    def _pub_values(self, pmid, fields):
+        row = [clean_value(fields.get(c)) for c in PUB_COLUMNS]
+        row[PUB_COLUMNS.index("pmid")] = clean_pmid(pmid)
+        row[PUB_COLUMNS.index("ano")] = clean_year(fields.get("ano"))
+        return row
+
+    @staticmethod
+    def _pmid_filter(pmid):
+        return (["pmid LIKE ?"], [f"%{pmid}%"]) if pmid else ([], [])
+
+    def list_publications(self, limit=100, pmid=None, after=None):
+        # Paginação por chave (keyset): a página seguinte começa logo após a chave da
+        # última linha, percorrendo o índice idx_publicacoes_ordem sem OFFSET
+        key = ", ".join(PUB_ORDER_KEY)
+        conditions, params = self._pmid_filter(pmid)
+        if after is not None:
+            # O limite só no ano permite ao SQLite posicionar no índice (a comparação
+            # de tupla sozinha vira varredura)
+            conditions.append(f"{PUB_ORDER_KEY[0]} <= ? AND ({key}) < (?, ?, ?)")
+            params.extend([after[0], *after])
+        query = f"SELECT {', '.join(PUB_COLUMNS)}, {key} FROM publicacoes"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {', '.join(f'{k} DESC' for k in PUB_ORDER_KEY)} LIMIT ?"
+        params.append(limit + 1)
+        with self._transaction() as conn:
+            rows = conn.execute(query, params).fetchall()
+        page = rows[:limit]
+        next_after = tuple(page[-1])[len(PUB_COLUMNS):] if len(rows) > limit else None
+        pubs = [{c: ("" if v is None else v) for c, v in zip(PUB_COLUMNS, row)} for row in page]
+        return pubs, next_after
+
+    def count_publications(self, pmid=None):
+        conditions, params = self._pmid_filter(pmid)
+        query = "SELECT COUNT(*) FROM publicacoes"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._transaction() as conn:
+            return conn.execute(query, params).fetchone()[0]
+
+    def list_pmids(self):
+        with self._transaction() as conn:
+            return {row[0] for row in conn.execute("SELECT pmid FROM publicacoes")}
+
+    def add_publication(self, pub, id_professor):
+        pmid = clean_pmid(pub["pmid"])
+        with self._transaction() as conn:
+            created = conn.execute(
+                f"INSERT OR IGNORE INTO publicacoes ({', '.join(PUB_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in PUB_COLUMNS)})",
+                self._pub_values(pmid, pub),
+            ).rowcount > 0
+            conn.execute("INSERT OR IGNORE INTO vinculos (pmid, id_professor) VALUES (?, ?)", (pmid, id_professor))
+        return created
+
+    def update_publication(self, pmid, fields):
+        columns = [c for c in PUB_COLUMNS if c in fields and c != "pmid"]
+        values = [clean_year(fields[c]) if c == "ano" else clean_value(fields[c]) for c in columns]
+        if not columns:
+            return False
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE publicacoes SET {', '.join(f'{c} = ?' for c in columns)} WHERE pmid = ?",
+                values + [clean_pmid(pmid)],
+            )
+            return cursor.rowcount > 0
+
+    def delete_publication(self, pmid):
+        pmid = clean_pmid(pmid)
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM publicacoes WHERE pmid = ?", (pmid,))
+            conn.execute("DELETE FROM vinculos WHERE pmid = ?", (pmid,))
+            return cursor.rowcount > 0
+
+    def merge_publications(self, pubs, links):
+        updates = ", ".join(f"{c} = excluded.{c}" for c in PUB_COLUMNS if c != "pmid")
+        with self._transaction() as conn:
+            conn.executemany(
+                f"INSERT INTO publicacoes ({', '.join(PUB_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in PUB_COLUMNS)}) "
+                f"ON CONFLICT(pmid) DO UPDATE SET {updates}",
+                [self._pub_values(p["pmid"], p) for p in pubs],
+            )
+            self._insert(conn, "vinculos", VIN_COLUMNS,
+                         [(clean_pmid(v["pmid"]), clean_value(v["id_professor"])) for v in links], "IGNORE")
+
+    def remove_orphan_links(self):
+        with self._transaction() as conn:
+            return conn.execute(
+                "DELETE FROM vinculos WHERE pmid NOT IN (SELECT pmid FROM publicacoes)"
+            ).rowcount
+
+    # --- Estado da sincronização com o PubMed ---
+    def get_sync_states(self, mode):
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id_professor, synced_at, full_synced_at, terms_hash FROM sync_state WHERE mode = ?", (mode,)
+            ).fetchall()
+        return {row["id_professor"]: {k: row[k] for k in ("synced_at", "full_synced_at", "terms_hash")} for row in rows}
+
+    def save_sync_states(self, mode, states):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sync_state (id_professor, mode, synced_at, full_synced_at, terms_hash) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(clean_value(s["id_professor"]), mode, s["synced_at"], s.get("full_synced_at"), s.get("terms_hash"))
+                 for s in states],
+            )
+
+
+# Implementações disponíveis (variável de ambiente STORAGE_BACKEND)
+BACKENDS = {
+    "sqlite": lambda base_dir: SqliteStorage(
+        os.getenv("SQLITE_PATH") or os.path.join(base_dir, DB_FILENAME), csv_dir=base_dir
+    ),
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_storage(base_dir=None):
+    """Storage configurado para `base_dir` (padrão: raiz do projeto), criado uma vez por diretório."""
+    base_dir = base_dir or BASE_DIR
+    backend = os.getenv("STORAGE_BACKEND", "sqlite")
+    if backend not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND inválido: {backend!r} (opções: {', '.join(BACKENDS)})")
+    with _instances_lock:
+        key = (backend, base_dir)
+        if key not in _instances:
+            _instances[key] = BACKENDS[backend](base_dir)
+        return _instances[key]
+
+
+if __name__ == "__main__":
+    # python -m backend.storage export [pasta]  -> grava os CSVs a partir do banco
+    # python -m backend.storage import [pasta]  -> substitui o banco pelo conteúdo dos CSVs
+    if len(sys.argv) < 2 or sys.argv[1] not in ("export", "import"):
+        print("Uso: python -m backend.storage export|import [pasta]")
+        sys.exit(1)
+    folder = sys.argv[2] if len(sys.argv) > 2 else BASE_DIR
+    storage = get_storage()
+    if sys.argv[1] == "export":
+        n_prof, n_pub, n_vin = storage.export_csv(folder)
+        print(f"[OK] Exportados {n_prof} professores, {n_pub} publicações e {n_vin} vínculos para {folder}")
+    else:
+        n_prof, n_pub, n_vin = storage.import_csv(folder)
+        print(f"[OK] Importados {n_prof} professores, {n_pub} publicações e {n_vin} vínculos de {folder}")
@@ -1,20 +1,37 @@
-import requests
-import xml.etree.ElementTree as ET
-import time
-import pandas as pd
+import hashlib
 import os
+import time
 import unicodedata
 from typing import List
 
+from .storage import get_storage
+from . import jobs, pubmed
+
 # Import normalizer and PubMed credentials from existing data_manager if we want,
 # but we can replicate cleanly here for the API to avoid CLI logic.
 
-ESEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-EMAIL = os.getenv("EMAIL_USER", "renatodc89@gmail.com")
-DELAY_SECS = 1.0
+# PubMed calls go through the shared rate-limited client in pubmed.py.
+# A sync covers one professor or many at once (coletar): search terms are deduplicated
+# across professors, every PMID is fetched once, and the links to every matching
+# professor are found in a single pass over the articles. The CLI (data_manager) uses
+# the same collection.
+#
+# Incremental syncs: each completed sync stores a per-professor watermark (its start
+# time) in the storage, and the next one only asks PubMed for records added since then
+# (esearch datetype=edat + mindate), so a nightly refresh touches just the new articles.
+# A professor is searched over their whole history instead when they were never synced,
+# their search terms changed, or the last full search is older than FULL_SYNC_DAYS
+# (periodic reconciliation: picks up records PubMed indexed late or re-dated).
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOB_KIND = "pubmed-sync"
+# Sincronizações simultâneas (todas dividem o mesmo limite de requisições do NCBI)
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", 2))
+# Variantes com menos letras que isso só casam com o nome do autor exato
+MIN_PARTIAL_MATCH = 6
+# Busca no histórico inteiro de cada professor pelo menos a cada tantos dias
+FULL_SYNC_DAYS = float(os.getenv("SYNC_FULL_EVERY_DAYS", 30))
+# Sobreposição com a sincronização anterior (datas do PubMed são dias, em outro fuso)
+INCREMENTAL_OVERLAP_DAYS = 2
 
 def normalizar_texto(texto):
     if not texto: return ""
@@ -25,195 +42,273 @@ def normalizar_texto(texto):
         n = n.replace(p, " ")
     return n.strip()
 
-def safe_get(url, params=None, data=None):
-    for i in range(3):
-        try:
-            if data:
-                r = requests.post(url, data=data, timeout=30)
-            else:
-                r = requests.get(url, params=params, timeout=30)
-            r.raise_for_status()
-            return r
-        except Exception as e:
-            print(f"Tentativa {i+1} falhou: {e}. Tentando novamente em {i+2}s...")
-            time.sleep(i + 2) 
-    return None
-
 def obter_metadados_pubmed(pmids_lista):
     if not pmids_lista: return []
-    tamanho_lote = 200
-    todos_artigos = []
+    return pubmed.fetch_articles(pmids_lista)
 
-    for i in range(0, len(pmids_lista), tamanho_lote):
-        lote = pmids_lista[i:i + tamanho_lote]
-        data = {"db": "pubmed", "id": ",".join(lote), "retmode": "xml", "email": EMAIL}
-        res = safe_get(EFETCH_URL, data=data)
-        if res is None: continue
+def termos_de_busca(prof, mode="variantes") -> List[str]:
+    """Termos de autor buscados para o professor: o nome (nome_exato) ou as variantes."""
+    termos = [str(prof['nome'])] if mode == "nome_exato" else _variantes(prof).split(';')
+    return [t.strip() for t in termos if t.strip()]
 
-        try:
-            root = ET.fromstring(res.text)
-            for article in root.findall(".//PubmedArticle"):
-                pmid = article.findtext(".//PMID")
-                title = article.findtext(".//ArticleTitle") or "Sem título"
-                revista = article.findtext(".//Journal/Title") or "N/A"
-                
-                year = article.findtext(".//PubDate/Year")
-                if not year:
-                    medline_date = article.findtext(".//PubDate/MedlineDate")
-                    year = medline_date[:4] if medline_date else "N/A"
-
-                doi_elem = article.find(".//ArticleId[@IdType='doi']")
-                doi = doi_elem.text if doi_elem is not None else "N/A"
-
-                autores_nomes = []
-                for a in article.findall(".//Author"):
-                    last = a.findtext("LastName") or ""
-                    init = a.findtext("Initials") or ""
-                    autores_nomes.append(f"{last} {init}".strip())
-
-                issns = [i.text.strip() for i in article.findall(".//Journal/ISSN") if i.text]
-                issn = "; ".join(set(issns)) if issns else "N/A"
-
-                abstract_texts = []
-                abstract_node = article.find(".//Abstract")
-                if abstract_node is not None:
-                    for abs_text in abstract_node.iter("AbstractText"):
-                        full_text = "".join(abs_text.itertext()).strip()
-                        label = abs_text.get("Label")
-                        if label: full_text = f"{label}: {full_text}"
-                        abstract_texts.append(full_text)
-                
-                abstract = " ".join(abstract_texts).strip() if abstract_texts else "N/A"
-
-                todos_artigos.append({
-                    "pmid": pmid, "doi": doi, "issn": issn, "titulo": title,
-                    "revista": revista, "ano": year, "autores_string": "; ".join(autores_nomes),
-                    "autores_lista": autores_nomes, "abstract": abstract
-                })
-        except ET.ParseError:
-            pass
-        time.sleep(DELAY_SECS)
-        
-    return todos_artigos
-
-def run_sync_for_professor(id_professor: int, mode="variantes") -> dict:
+def _variantes(prof):
+    variantes = prof.get('variantes')
+    return variantes if isinstance(variantes, str) else ""
+
+def alvo_de(prof, mode="variantes", termos=None) -> dict:
     """
-    Executa a coleta do PubMed sem a interação do usuário.
-    mode: "variantes" ou "nome_exato"
-    Returns um dict com métricas do que fez.
+    Professor a sincronizar: id, termos de busca, variantes (para o match de autores) e
+    `desde` (epoch: só registros incluídos no PubMed a partir daí; None = histórico inteiro).
     """
-    PROF_CSV = os.path.join(BASE_DIR, "professores.csv")
-    if not os.path.exists(PROF_CSV):
-        return {"error": "Sem professores"}
+    return {
+        "id": prof['id_professor'],
+        "termos": termos if termos is not None else termos_de_busca(prof, mode),
+        "variantes": _variantes(prof),
+        "desde": None,
+    }
 
-    df_prof = pd.read_csv(PROF_CSV)
-    prof_row = df_prof[df_prof['id_professor'] == id_professor]
-    if prof_row.empty:
-        return {"error": "Professor não encontrado"}
-    
-    prof_data = prof_row.iloc[0]
-    
+# ----------------- SINCRONIZAÇÃO INCREMENTAL ----------------- #
+
+def hash_termos(termos):
+    """Identifica o conjunto de termos de busca (mudou: a marca d'água anterior não vale)."""
+    chaves = sorted({" ".join(t.lower().split()) for t in termos})
+    return hashlib.blake2b(";".join(chaves).encode("utf-8"), digest_size=12).hexdigest()
+
+def planejar_incremental(alvos, mode, now=None):
+    """
+    Define alvo["desde"] pela marca d'água gravada de cada professor (menos a sobreposição).
+    Fica None (histórico inteiro) sem marca, com termos diferentes dos da última vez ou
+    com a última busca completa há mais de FULL_SYNC_DAYS. Devolve os alvos.
+    """
+    now = time.time() if now is None else now
+    estados = get_storage().get_sync_states(mode)
+    for alvo in alvos:
+        estado = estados.get(alvo["id"])
+        alvo["desde"] = None
+        if (estado is None or estado.get("terms_hash") != hash_termos(alvo["termos"])
+                or not estado.get("full_synced_at") or now - estado["full_synced_at"] > FULL_SYNC_DAYS * 86400):
+            continue
+        alvo["desde"] = estado["synced_at"] - INCREMENTAL_OVERLAP_DAYS * 86400
+    return alvos
+
+def gravar_marcas(alvos, mode, inicio):
+    """Grava a marca d'água (início da coleta) dos alvos após uma sincronização concluída."""
+    anteriores = get_storage().get_sync_states(mode)
+    estados = []
+    for alvo in alvos:
+        completa = inicio if alvo.get("desde") is None else (anteriores.get(alvo["id"]) or {}).get("full_synced_at")
+        estados.append({"id_professor": alvo["id"], "synced_at": inicio, "full_synced_at": completa,
+                        "terms_hash": hash_termos(alvo["termos"])})
+    get_storage().save_sync_states(mode, estados)
+
+# ----------------- MATCH DE AUTORES ----------------- #
+
+def indexar_variantes(alvos):
+    """
+    Índice das variantes normalizadas dos professores: exatas (variante -> ids) e as
+    longas, que também casam por substring. Permite achar todos os professores de um
+    artigo de uma vez, em vez de comparar cada professor com cada artigo.
+    """
+    exatas, longas = {}, {}
+    for alvo in alvos:
+        for v in alvo["variantes"].split(';'):
+            v = normalizar_texto(v)
+            if not v:
+                continue
+            exatas.setdefault(v, set()).add(alvo["id"])
+            if len(v) >= MIN_PARTIAL_MATCH:
+                longas.setdefault(v, set()).add(alvo["id"])
+    return exatas, list(longas.items())
+
+def professores_do_artigo(autores, indice):
+    """Ids dos professores com alguma variante igual a um autor (ou contida nele / contendo-o, se longa)."""
+    exatas, longas = indice
+    ids = set()
+    for a in autores:
+        a = normalizar_texto(a)
+        if not a:
+            continue
+        ids.update(exatas.get(a, ()))
+        for v, prof_ids in longas:
+            if v in a or a in v:
+                ids.update(prof_ids)
+    return ids
+
+# ----------------- COLETA ----------------- #
+
+async def buscar_e_baixar(client, grupos, mode, job=None, pmids_extras=()):
+    """
+    Busca e download numa só sessão. grupos: [(termos, parâmetros extras do esearch)],
+    ex. o filtro de data de uma sincronização incremental. Em "variantes" os termos vão
+    combinados com OR (só importa o conjunto de PMIDs; o vínculo vem do match de autores);
+    em "nome_exato" cada termo é buscado sozinho, pois o vínculo vem dele.
+    Devolve ({termo: PMIDs} (só em "nome_exato"; None se a busca falhou), artigos de todos
+    os PMIDs e de pmids_extras, o que veio do cache local e o que foi à rede).
+    """
+    on_result = on_batch = None
+    if job is not None:
+        job.update(etapa="buscando", termos_total=sum(len(termos) for termos, _ in grupos), termos_buscados=0)
+        on_result = lambda nomes, ids: job.advance(termos_buscados=len(nomes) if isinstance(nomes, list) else 1)
+        on_batch = lambda lote, artigos: job.advance(pmids_baixados=len(lote))
+
+    ids_por_termo, pmids = {}, set()
+    for termos, extra in grupos:
+        if mode == "nome_exato":
+            id_lists = await client.search_authors(termos, on_result=on_result, **extra)
+            ids_por_termo.update(zip(termos, id_lists))
+            pmids.update(pmid for id_list in id_lists if id_list for pmid in id_list)
+        else:
+            pmids |= await client.search_any_author(termos, on_result=on_result, **extra)
+    pmids.update(str(p) for p in pmids_extras)
+
+    if job is not None:
+        job.update(etapa="baixando", pmids_encontrados=len(pmids), pmids_baixados=0)
+    artigos = await client.efetch(sorted(pmids), on_batch=on_batch) if pmids else []
+    return ids_por_termo, artigos, dict(client.stats)
+
+def coletar(alvos, mode="variantes", job=None, pmids_extras=()):
+    """
+    Coleta do PubMed para vários professores de uma vez, sem gravar.
+    alvos: dicts de alvo_de(); mode: "variantes" (vínculo pelo match das variantes com os
+    autores do artigo, para todos os alvos) ou "nome_exato" (vínculo direto de cada PMID
+    com os professores do termo que o trouxe). Termos repetidos entre professores são
+    buscados uma vez (desde o `desde` mais antigo entre eles) e cada PMID é baixado uma
+    vez; pmids_extras são baixados também.
+    Returns (publicações, vínculos, resumo).
+    """
+    # Termo (sem diferença de caixa/espaços) -> [termo, professores que o usam, desde]
+    donos = {}
+    for alvo in alvos:
+        for termo in alvo["termos"]:
+            chave = " ".join(termo.lower().split())
+            dono = donos.setdefault(chave, [termo.strip(), set(), alvo.get("desde")])
+            dono[1].add(alvo["id"])
+            if dono[2] is not None:
+                dono[2] = None if alvo.get("desde") is None else min(dono[2], alvo["desde"])
+
+    # Uma rodada de buscas por data de início (histórico inteiro; em cada data gravada)
+    por_desde = {}
+    for termo, _, desde in donos.values():
+        por_desde.setdefault(desde, []).append(termo)
+    grupos = [(termos, pubmed.added_since_params(desde) if desde is not None else {})
+              for desde, termos in por_desde.items()]
+
+    check = job.raise_if_cancelled if job is not None else None
+    ids_por_termo, artigos, stats = pubmed.run(
+        lambda client: buscar_e_baixar(client, grupos, mode, job, pmids_extras), check=check)
+
+    vinculos = set()
     if mode == "nome_exato":
-        termos = [str(prof_data['nome']).strip()]
-    else:
-        termos = str(prof_data['variantes']).split(';')
-        
-    termos = [t.strip() for t in termos if t.strip()]
-    if not termos:
-        return {"error": "Sem termos de busca válidos"}
+        for termo, prof_ids, _ in donos.values():
+            vinculos.update((str(pmid), prof_id) for pmid in ids_por_termo.get(termo) or () for prof_id in prof_ids)
 
-    pmids_para_coletar = set()
-    novos_vinculos = []
-    
-    # Busca 
-    for t in termos:
-        params = {"db": "pubmed", "term": f"{t}[Author]", "retmode": "json", "retmax": 1000, "email": EMAIL}
-        res = safe_get(ESEARCH_URL, params)
-        if res:
-            data = res.json()
-            id_list = data.get("esearchresult", {}).get("idlist", [])
-            pmids_para_coletar.update(id_list)
-            
-            # Se for buscar por nome_exato, confia integralmente na API e já gera vínculo
-            if mode == "nome_exato":
-                for pmid in id_list:
-                    novos_vinculos.append({"pmid": pmid, "id_professor": id_professor})
-        time.sleep(DELAY_SECS)
-        
-    if not pmids_para_coletar:
-        return {"status": "success", "fetched": 0, "novos_vinculos": 0}
-
-    todos_artigos = obter_metadados_pubmed(list(pmids_para_coletar))
-    lista_publicacoes = []
-    
-    for art in todos_artigos:
-        lista_publicacoes.append({
+    indice = indexar_variantes(alvos)
+    publicacoes = []
+    for art in artigos:
+        publicacoes.append({
             "pmid": art['pmid'], "doi": art['doi'], "issn": art.get('issn', 'N/A'),
-            "titulo": art['titulo'], "revista": art['revista'], "ano": art['ano'], 
+            "titulo": art['titulo'], "revista": art['revista'], "ano": art['ano'],
             "autores": art['autores_string'], "abstract": art.get('abstract', 'N/A')
         })
-
         if mode == "variantes":
-            match_encontrado = False
-            variantes_prof = [normalizar_texto(v) for v in str(prof_data['variantes']).split(';')]
-            autores_artigo_norm = [normalizar_texto(a) for a in art['autores_lista']]
-            
-            for v in variantes_prof:
-                if not v: continue
-                for a in autores_artigo_norm:
-                    if v == a or (len(v) > 5 and (v in a or a in v)):
-                        match_encontrado = True
-                        break
-                if match_encontrado: break
-
-            if match_encontrado:
-                novos_vinculos.append({"pmid": art['pmid'], "id_professor": id_professor})
-
-    # Saving
-    PUB_CSV = os.path.join(BASE_DIR, "publicacoes.csv")
-    VIN_CSV = os.path.join(BASE_DIR, "vinculos.csv")
-    
-    if os.path.exists(PUB_CSV):
-        df_pub_antigo = pd.read_csv(PUB_CSV)
-        df_pub_antigo['pmid'] = df_pub_antigo['pmid'].astype(str)
-    else:
-        df_pub_antigo = pd.DataFrame()
+            vinculos.update((art['pmid'], prof_id) for prof_id in professores_do_artigo(art['autores_lista'], indice))
 
-    df_pub_novo = pd.DataFrame(lista_publicacoes)
-    if not df_pub_novo.empty:
-        df_pub_novo['pmid'] = df_pub_novo['pmid'].astype(str)
-        df_pub_final = pd.concat([df_pub_antigo, df_pub_novo], ignore_index=True)
-        df_pub_final = df_pub_final.drop_duplicates(subset=['pmid'], keep='last')
-    else:
-        df_pub_final = df_pub_antigo
-        
-    df_pub_final.to_csv(PUB_CSV, index=False)
+    resumo = {
+        "professores": len(alvos),
+        "termos": len(donos),
+        "incrementais": sum(1 for alvo in alvos if alvo.get("desde") is not None),
+        "fetched": len(publicacoes),
+        "novos_vinculos": len(vinculos),
+        # Local cache: what needed no PubMed call, and what was actually downloaded
+        "buscas_em_cache": stats.get("searches_cached", 0),
+        "artigos_em_cache": stats.get("articles_cached", 0),
+        "artigos_baixados": stats.get("articles_fetched", 0),
+        # Searches / efetch batches that failed after every retry (their records are missing)
+        "falhas": stats.get("searches_failed", 0) + stats.get("batches_failed", 0),
+    }
+    return publicacoes, [{"pmid": pmid, "id_professor": prof_id} for pmid, prof_id in sorted(vinculos)], resumo
+
+def sincronizar(alvos, mode="variantes", job=None, incremental=True) -> dict:
+    """
+    Coleta, grava e recarrega os dados (uma vez); devolve o resumo. incremental: busca só
+    o que entrou no PubMed desde a última sincronização de cada professor (quando vale;
+    ver planejar_incremental), senão o histórico inteiro. Sem falhas na coleta, grava a
+    nova marca d'água de cada professor.
+    """
+    inicio = time.time()
+    if incremental:
+        planejar_incremental(alvos, mode, now=inicio)
+    lista_publicacoes, novos_vinculos, resumo = coletar(alvos, mode, job)
+
+    # Last point where a cancelled job stops without touching the database
+    if job is not None:
+        job.raise_if_cancelled()
+        job.update(etapa="gravando", vinculos_encontrados=len(novos_vinculos))
+
+    if lista_publicacoes or novos_vinculos:
+        # Saving (upsert: the fetched version of a publication wins; repeated vinculos are ignored)
+        get_storage().merge_publications(lista_publicacoes, novos_vinculos)
+
+        # Reload server memory data once, after the commit (rebuilt in the background, published atomically)
+        try:
+            from .data_store import request_reload
+            request_reload()
+        except Exception as e:
+            print("Failed to auto reload memory", e)
 
-    if os.path.exists(VIN_CSV):
-        df_vin_antigo = pd.read_csv(VIN_CSV)
-        df_vin_antigo['pmid'] = df_vin_antigo['pmid'].astype(str)
+    # The watermark only moves when nothing is missing; otherwise the next sync repeats the window
+    if resumo["falhas"]:
+        print(f"[WARN] {resumo['falhas']} busca(s)/lote(s) falharam: marca d'água da sincronização mantida.")
     else:
-        df_vin_antigo = pd.DataFrame()
+        gravar_marcas(alvos, mode, inicio)
+
+    return {"status": "success", **resumo}
+
+def run_sync_for_professor(id_professor: int, mode="variantes", job=None, incremental=True) -> dict:
+    """
+    Executa a coleta do PubMed sem a interação do usuário.
+    mode: "variantes" ou "nome_exato"
+    job: Job em que roda (progresso e cancelamento), se rodar em segundo plano.
+    incremental: False força a busca no histórico inteiro (reconciliação completa).
+    Returns um dict com métricas do que fez.
+    """
+    prof_data = get_storage().get_professor(id_professor)
+    if prof_data is None:
+        return {"error": "Professor não encontrado"}
+
+    alvo = alvo_de(prof_data, mode)
+    if not alvo["termos"]:
+        return {"error": "Sem termos de busca válidos"}
+    return sincronizar([alvo], mode, job, incremental)
+
+def run_sync_all(mode="variantes", job=None, incremental=True) -> dict:
+    """Sincroniza todos os professores numa só coleta (termos e PMIDs compartilhados)."""
+    alvos = [alvo_de(prof, mode) for prof in get_storage().list_professors()]
+    alvos = [alvo for alvo in alvos if alvo["termos"]]
+    if not alvos:
+        return {"error": "Nenhum professor com termos de busca válidos"}
+    return sincronizar(alvos, mode, job, incremental)
 
-    df_vin_novo = pd.DataFrame(novos_vinculos)
-    if not df_vin_novo.empty:
-        df_vin_novo['pmid'] = df_vin_novo['pmid'].astype(str)
-        df_vin_final = pd.concat([df_vin_antigo, df_vin_novo], ignore_index=True)
-        df_vin_final = df_vin_final.drop_duplicates(subset=['pmid', 'id_professor'])
+def sync_job(job, id_professor=None, mode="variantes", incremental=True) -> dict:
+    """Função do job de sincronização (id_professor None: todos); erros do resultado viram falha do job."""
+    if id_professor is None:
+        resultado = run_sync_all(mode, job=job, incremental=incremental)
     else:
-        df_vin_final = df_vin_antigo
-        
-    df_vin_final.to_csv(VIN_CSV, index=False)
-    
-    # Reload server memory data
-    try:
-        from .main import load_data
-        load_data()
-    except Exception as e:
-        print("Failed to auto reload memory", e)
+        resultado = run_sync_for_professor(id_professor, mode, job=job, incremental=incremental)
+    if "error" in resultado:
+        raise ValueError(resultado["error"])
+    job.update(etapa="concluido")
+    return resultado
 
-    return {
-        "status": "success",
-        "fetched": len(lista_publicacoes),
-        "novos_vinculos": len(df_vin_novo) if not df_vin_novo.empty else 0
-    }
+def submit_sync(id_professor=None, mode="variantes", incremental=True):
+    """
+    Agenda a sincronização do professor (None: de todos, em lote) e devolve o Job. Se já
+    há uma sincronização igual na fila ou rodando, devolve essa em vez de criar outra.
+    """
+    params = {"id_professor": id_professor, "mode": mode, "incremental": incremental}
+    ativos = jobs.active_jobs(JOB_KIND, **params)
+    ativos = [job for job in ativos if not job.cancel_requested]
+    if ativos:
+        return ativos[0]
+    return jobs.submit(JOB_KIND, sync_job, id_professor, mode, incremental,
+                       params=params, max_workers=SYNC_WORKERS)
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import pickle
+
+from . import metrics
+
+# Cache binário das tabelas já lidas, tipadas e com Qualis aplicado.
+#
+# A inicialização gasta a maior parte do tempo lendo e convertendo texto (banco, CSVs
+# de Qualis e projetos) e aplicando get_qualis_stratum linha a linha. O resultado fica
+# num arquivo com os DataFrames serializados (pickle, blocos de colunas já tipados),
+# válido enquanto os arquivos de origem não mudarem: tamanho + mtime é a checagem
+# rápida; se divergirem, o hash do conteúdo decide (um "touch" não invalida o cache).
+
+CACHE_FILENAME = "odontopub_tables.cache"
+
+# Incrementar quando a forma das tabelas produzidas mudar
+CACHE_VERSION = 2
+
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(paths, previous=None):
+    """
+    Estado de cada arquivo de origem: {path: {size, mtime_ns, hash}} (None se não existe).
+    O hash de `previous` é reaproveitado quando tamanho e mtime não mudaram.
+    """
+    previous = previous or {}
+    result = {}
+    for path in paths:
+        if not os.path.exists(path):
+            result[path] = None
+            continue
+        st = os.stat(path)
+        state = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        old = previous.get(path)
+        if old and old["size"] == state["size"] and old["mtime_ns"] == state["mtime_ns"]:
+            state["hash"] = old["hash"]
+        else:
+            state["hash"] = file_hash(path)
+        result[path] = state
+    return result
+
+
+def _same_content(a, b):
+    if a.keys() != b.keys():
+        return False
+    return all((a[p] and a[p]["hash"]) == (b[p] and b[p]["hash"]) for p in a)
+
+
+def read_cache(cache_path, sources):
+    """Conteúdo do cache se ele ainda corresponde às fontes; senão None."""
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, "rb") as f:
+        # O cabeçalho vem primeiro: dá para validar sem desserializar as tabelas
+        header = pickle.load(f)
+        if header.get("version") != CACHE_VERSION:
+            return None
+        current = fingerprint(sources, header.get("sources"))
+        if not _same_content(current, header.get("sources", {})):
+            return None
+        payload = pickle.load(f)
+    if current != header["sources"]:
+        # Só o mtime mudou: regrava o cabeçalho para a próxima checagem ser rápida
+        write_cache(cache_path, current, payload)
+    return payload
+
+
+def write_cache(cache_path, sources_state, payload):
+    """Grava cabeçalho + payload num arquivo temporário e troca de forma atômica."""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"version": CACHE_VERSION, "sources": sources_state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def load_cached(base_dir, sources, build):
+    """
+    Devolve o payload do cache em `base_dir` se as fontes não mudaram; senão executa
+    build(), grava o resultado e o devolve. Problemas no cache nunca impedem a carga.
+    """
+    cache_path = os.path.join(base_dir, CACHE_FILENAME)
+    try:
+        payload = read_cache(cache_path, sources)
+        if payload is not None:
+            print(f"[OK] Tabelas lidas do cache {CACHE_FILENAME}.")
+            metrics.cache_hit("table_cache")
+            return payload
+    except Exception as e:
+        print(f"[WARN] Cache de tabelas ignorado: {e}")
+
+    # Estado das fontes antes da leitura: se mudarem durante o build, o próximo
+    # carregamento percebe a diferença e relê
+    metrics.cache_miss("table_cache")
+    state = fingerprint(sources)
+    payload = build()
+    try:
+        write_cache(cache_path, state, payload)
+    except Exception as e:
+        print(f"[WARN] Não foi possível gravar o cache de tabelas: {e}")
+    return payload
@@ -0,0 +1,337 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from .data_store import apply_change, get_snapshot, request_reload
+from .pub_table import pmid_strings
+from .storage import get_storage
+from .sync_service import normalizar_texto
+from . import deltas, jobs
+
+# Recebimento e importação dos templates CSV enviados pelos professores.
+#
+# O upload (público) é gravado em blocos (com limite de tamanho) numa thread, fora do
+# event loop, e fica pendente em uploads/ com o nome do professor informado. Um admin
+# revisa os pendentes e aprova a importação, que roda num job em segundo plano: lê e
+# valida o CSV, identifica o professor pelo nome, casa as linhas com as publicações
+# existentes (pmid e DOI, com operações vetorizadas do pandas), grava no banco, aplica
+# o resultado ao snapshot e move o arquivo para uploads/imported/.
+# Antes o arquivo só ficava em uploads/ até alguém rodar o data_manager.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+IMPORTED_DIR = os.path.join(UPLOAD_DIR, "imported")
+
+MAX_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 5 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+# Folga para os cabeçalhos do multipart e os outros campos do formulário
+MULTIPART_OVERHEAD = 64 * 1024
+
+JOB_KIND = "template-import"
+MAX_ROWS = 5000
+# Até esse número de linhas alteradas o snapshot é atualizado por deltas; acima, recarga completa
+MAX_DELTA_ROWS = 50
+MAX_REPORTED_ERRORS = 50
+
+REQUIRED_COLUMNS = ['titulo', 'revista', 'ano', 'autores']
+TEMPLATE_COLUMNS = ['pmid', 'doi', 'issn', 'titulo', 'revista', 'ano', 'autores', 'abstract']
+# Textos que o template (ou o Excel) usa para "sem valor"
+EMPTY_VALUES = ['nan', 'n/a', 'na', 'none', '-']
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def upload_filename(professor_name):
+    """Nome do arquivo gravado em uploads/: data e hora + nome do professor sanitizado (+ sufixo único)."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_name = "".join(c for c in professor_name.replace(" ", "_").lower() if c.isalnum() or c == '_')
+    return f"{timestamp}_{safe_name}_{uuid.uuid4().hex[:6]}.csv"
+
+
+def upload_info_path(path):
+    """Arquivo com os dados do envio (professor informado, data) ao lado do CSV."""
+    return f"{path}.json"
+
+
+def stage_upload(path, professor_name):
+    """Registra o CSV recebido em `path` como pendente de aprovação."""
+    info = {"professor_name": professor_name, "received_at": datetime.now().isoformat(timespec="seconds")}
+    with open(upload_info_path(path), "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False)
+
+
+def _professor_from_filename(filename):
+    """Nome do professor de um upload sem arquivo de dados (enviado antes do registro)."""
+    return re.sub(r"^\d{8}_\d{6}_", "", filename[:-len(".csv")])
+
+
+def pending_uploads():
+    """Templates recebidos e ainda não importados, do mais recente ao mais antigo."""
+    if not os.path.isdir(UPLOAD_DIR):
+        return []
+    pending = []
+    for filename in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, filename)
+        if not filename.endswith(".csv") or not os.path.isfile(path):
+            continue
+        try:
+            with open(upload_info_path(path), encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            info = {"professor_name": _professor_from_filename(filename),
+                    "received_at": datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds")}
+        pending.append({"filename": filename, "size": os.path.getsize(path), **info})
+    return sorted(pending, key=lambda u: u["received_at"], reverse=True)
+
+
+def pending_upload(filename):
+    """Dados do upload pendente `filename` (só nomes listados: nada fora de uploads/) ou None."""
+    return next((u for u in pending_uploads() if u["filename"] == filename), None)
+
+
+def save_upload(src, path, limit=MAX_UPLOAD_BYTES):
+    """
+    Copia o arquivo `src` para `path` em blocos de CHUNK_SIZE. Passando de `limit` bytes
+    levanta UploadTooLarge e não deixa arquivo parcial. Devolve o tamanho gravado.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.part"
+    written = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := src.read(CHUNK_SIZE):
+                written += len(chunk)
+                if written > limit:
+                    raise UploadTooLarge(f"Arquivo maior que {limit} bytes")
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+class UploadLimitMiddleware:
+    """
+    Middleware ASGI: recusa com 413 uploads maiores que o limite. Com Content-Length
+    acima dele, antes de ler o corpo; sem ele (chunked) ou com um valor falso, conta os
+    bytes à medida que chegam e interrompe a leitura ao passar do limite, antes que o
+    parser do multipart grave o resto em disco (o limite exato do arquivo é checado em
+    save_upload).
+    """
+
+    def __init__(self, app, paths=("/upload-template",), limit=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD):
+        self.app = app
+        self.paths = paths
+        self.limit = limit
+
+    async def _reject(self, send):
+        body = f'{{"detail":"Arquivo maior que o limite de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.limit:
+            await self._reject(send)
+            return
+
+        received = 0
+        too_large = rejected = False
+
+        async def limited_receive():
+            # Passando do limite, o app vê a conexão como encerrada e para de ler
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            # A resposta do app ao corpo interrompido (erro de parse) dá lugar ao 413
+            nonlocal rejected
+            if not too_large:
+                await send(message)
+            elif message["type"] == "http.response.start" and not rejected:
+                rejected = True
+                await self._reject(send)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not rejected:
+            await self._reject(send)
+
+
+# ================= IMPORTAÇÃO ================= #
+
+def match_professor(df_prof, name):
+    """
+    (id_professor, nome) do professor com o nome informado: igual depois de normalizado
+    ou, se nenhum for igual, o único cujo nome contém o informado (ou está contido nele).
+    None se não achar ou se for ambíguo.
+    """
+    target = normalizar_texto(str(name).replace("_", " "))
+    if not target:
+        return None
+    names = df_prof['nome'].map(normalizar_texto)
+    candidates = names == target
+    if not candidates.any():
+        contains = names.str.contains(target, regex=False)
+        contained = names.map(lambda n: bool(n) and n in target)
+        candidates = contains | contained
+    if candidates.sum() != 1:
+        return None
+    row = df_prof[candidates.to_numpy()].iloc[0]
+    return int(row['id_professor']), row['nome']
+
+
+def read_template(path):
+    """CSV do template como texto (vírgula ou ponto e vírgula; UTF-8 ou Latin-1), colunas normalizadas."""
+    for encoding in ("utf-8-sig", "latin-1"):
+        try:
+            with open(path, encoding=encoding) as f:
+                header = f.readline()
+            sep = ";" if header.count(";") > header.count(",") else ","
+            df = pd.read_csv(path, dtype=str, keep_default_na=False, sep=sep, encoding=encoding, index_col=False)
+            break
+        except UnicodeDecodeError:
+            continue
+    df.columns = df.columns.str.strip().str.lower()
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+    if len(df) > MAX_ROWS:
+        raise ValueError(f"O template tem {len(df)} linhas (máximo {MAX_ROWS})")
+    df = df.reindex(columns=TEMPLATE_COLUMNS, fill_value="")
+    df = df.apply(lambda column: column.str.strip())
+    return df.mask(df.apply(lambda column: column.str.lower().isin(EMPTY_VALUES)), "")
+
+
+def validate_rows(df):
+    """(linhas válidas, erros). Erros trazem o número da linha no arquivo (cabeçalho = linha 1)."""
+    problems = pd.Series("", index=df.index)
+    problems = problems.mask(~df['ano'].str.fullmatch(r"(19|20)\d\d"), "ano inválido")
+    problems = problems.mask(df['titulo'] == "", "título vazio")
+    invalid = problems != ""
+    errors = [{"linha": int(i) + 2, "erro": problems[i]} for i in df.index[invalid]]
+    return df[~invalid], errors
+
+
+def generated_pmid(titulo, ano):
+    """Identificador estável para linhas sem pmid: reenviar o mesmo artigo não o duplica."""
+    key = f"{normalizar_texto(titulo)}|{ano}".encode("utf-8")
+    return f"IMP_{hashlib.blake2b(key, digest_size=6).hexdigest()}"
+
+
+def resolve_pmids(df, df_pub, existing_pmids):
+    """
+    pmid de cada linha: o informado; senão o da publicação carregada com o mesmo DOI;
+    senão um gerado a partir de título e ano. Devolve (df com 'pmid', máscara das já existentes).
+    """
+    df = df.copy()
+    dois = df_pub['doi'].astype(str).str.strip().str.lower()
+    by_doi = pd.Series(pmid_strings(df_pub).to_numpy(), index=dois)
+    by_doi = by_doi[(by_doi.index != "") & ~by_doi.index.isin(EMPTY_VALUES) & ~by_doi.index.duplicated()]
+
+    doi_match = df['doi'].str.lower().map(by_doi)
+    no_pmid = df['pmid'] == ""
+    df.loc[no_pmid, 'pmid'] = doi_match[no_pmid].fillna("")
+    still_missing = df['pmid'] == ""
+    df.loc[still_missing, 'pmid'] = [generated_pmid(t, a) for t, a in
+                                     zip(df.loc[still_missing, 'titulo'], df.loc[still_missing, 'ano'])]
+    df = df.drop_duplicates(subset='pmid')
+    return df, df['pmid'].isin(existing_pmids)
+
+
+def import_template(job, path, professor_name):
+    """Job: importa o template em `path` para o professor `professor_name` e o arquiva em imported/."""
+    snap = get_snapshot()
+    professor = match_professor(snap.df_prof, professor_name)
+    if professor is None:
+        raise ValueError(f"Professor não identificado pelo nome '{professor_name}'")
+    id_professor, nome = professor
+
+    df = read_template(path)
+    n_rows = len(df)
+    df, errors = validate_rows(df)
+    storage = get_storage()
+    df, known = resolve_pmids(df, snap.df_pub, storage.list_pmids())
+
+    linked_pmids = snap.df_links.loc[snap.df_links['id_professor'] == id_professor, 'pmid']
+    new_link = ~df['pmid'].isin(linked_pmids)
+    new_pubs = df[~known]
+    pubs = new_pubs.to_dict(orient="records")
+    links = [{"pmid": p, "id_professor": id_professor} for p in df.loc[new_link, 'pmid']]
+    storage.merge_publications(pubs, links)
+
+    # Snapshot: deltas para poucas linhas, recarga completa para muitas
+    changes = [(row['pmid'], None if is_known else row)
+               for row, is_known, linking in zip(df.to_dict(orient="records"), known, new_link)
+               if linking or not is_known]
+    if len(changes) > MAX_DELTA_ROWS:
+        request_reload()
+    elif changes:
+        def change(snap, version):
+            for pmid, pub in changes:
+                snap = deltas.apply_publication(snap, version, pmid, pub=pub, id_professor=id_professor)
+            return snap
+        apply_change(change)
+
+    _archive(path)
+    print(f"[OK] Template {os.path.basename(path)} importado para {nome}: "
+          f"{len(pubs)} publicações novas, {len(links)} vínculos novos, {len(errors)} linhas com erro.")
+    return {
+        "id_professor": id_professor,
+        "professor": nome,
+        "linhas": n_rows,
+        "novas_publicacoes": len(pubs),
+        "novos_vinculos": len(links),
+        "ja_existentes": int(known.sum()),
+        "erros": errors[:MAX_REPORTED_ERRORS],
+    }
+
+
+def _archive(path):
+    """Move o CSV importado (e seus dados) para uploads/imported/: sai da lista de pendentes."""
+    os.makedirs(IMPORTED_DIR, exist_ok=True)
+    for src in (path, upload_info_path(path)):
+        if os.path.exists(src):
+            shutil.move(src, os.path.join(IMPORTED_DIR, os.path.basename(src)))
+
+
+def submit_import(upload):
+    """
+    Agenda a importação do upload pendente (de pending_upload) e devolve o Job; se ele
+    já está na fila ou sendo importado, devolve esse job.
+    """
+    active = jobs.active_jobs(JOB_KIND, filename=upload["filename"])
+    if active:
+        return active[0]
+    path = os.path.join(UPLOAD_DIR, upload["filename"])
+    return jobs.submit(JOB_KIND, import_template, path, upload["professor_name"],
+                       params={"filename": upload["filename"], "professor_name": upload["professor_name"]})
@@ -0,0 +1,88 @@
+"""
+Benchmark: atualização completa de todos os professores, um por vez (como a sincronização
+do admin fazia: um esearch por variante e efetch dos PMIDs de cada professor, 200 por
+lote) e em lote com sync_service.coletar (variantes combinadas com OR, PMIDs de todos os
+professores num só conjunto, efetch em lotes de pubmed.EFETCH_BATCH). A coleta em lote
+roda duas vezes sobre um cache do PubMed novo (pubmed_cache, num diretório temporário):
+a segunda mostra uma atualização sem artigos novos dentro da validade das buscas
+(--search-ttl 0: as buscas vão à rede, os artigos saem do cache).
+
+Roda contra o stub das E-utilities de bench_pubmed_client, com os professores de
+professores.csv; nada é gravado.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_bulk_sync [--professors 69] [--rate 10] [--latency 0.1] [--search-ttl 0]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import pubmed, pubmed_cache, sync_service  # noqa: E402
+from benchmarks.bench_pubmed_client import PubMedStub  # noqa: E402
+
+PER_PROFESSOR_EFETCH_BATCH = 200
+
+
+def per_professor(alvos):
+    """Um professor por vez: um esearch por termo e efetch só dos PMIDs dele."""
+    async def collect(client, termos):
+        id_lists = await client.search_authors(termos)
+        pmids = sorted({p for ids in id_lists if ids for p in ids})
+        batches = [pmids[i:i + PER_PROFESSOR_EFETCH_BATCH] for i in range(0, len(pmids), PER_PROFESSOR_EFETCH_BATCH)]
+        articles = []
+        for batch in batches:
+            articles += await client.efetch(batch)
+        return articles
+
+    fetched = 0
+    for alvo in alvos:
+        fetched += len(pubmed.run(lambda client: collect(client, alvo["termos"]), cache=False))
+    return fetched
+
+
+def bulk(alvos):
+    publicacoes, _, _ = sync_service.coletar(alvos, "variantes")
+    return len(publicacoes)
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--professors", type=int, default=None, help="primeiros N de professores.csv (padrão: todos)")
+    parser.add_argument("--rate", type=float, default=10, help="req/s aceitas pelo stub e usadas pelo cliente")
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--search-ttl", type=float, default=None, help="validade das buscas no cache, em horas")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    pubmed_cache._cache = pubmed_cache.PubMedCache(
+        os.path.join(tmp.name, "pubmed_cache.sqlite3"),
+        search_ttl=pubmed_cache.SEARCH_TTL if args.search_ttl is None else args.search_ttl * 3600)
+
+    df = pd.read_csv(os.path.join(ROOT, "professores.csv"))
+    alvos = [sync_service.alvo_de(row) for _, row in df.head(args.professors or len(df)).iterrows()]
+    alvos = [alvo for alvo in alvos if alvo["termos"]]
+    n_terms = sum(len(alvo["termos"]) for alvo in alvos)
+    print(f"{len(alvos)} professores, {n_terms} termos; stub com {args.rate:g} req/s e {args.latency * 1000:.0f} ms por resposta")
+    print(f"{'coleta':>14} {'tempo (s)':>10} {'artigos':>8} {'esearch':>8} {'efetch':>7} {'429':>5}")
+
+    runs = (("por professor", per_professor), ("em lote", bulk), ("lote, cache", bulk))
+    for name, collect in runs:
+        with PubMedStub(latency=args.latency, rate=args.rate) as stub:
+            pubmed.EUTILS_URL = stub.url
+            pubmed._bucket = pubmed.TokenBucket(args.rate * pubmed.RATE_MARGIN)
+            start = time.perf_counter()
+            fetched = collect(alvos)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>14} {elapsed:>10.1f} {fetched:>8} {stub.calls['esearch']:>8}"
+                  f" {stub.calls['efetch']:>7} {stub.calls['429']:>5}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,117 @@
+"""
+Benchmark: latência de GET /professores/{id_professor} conforme publicacoes.csv cresce.
+
+Gera corpora sintéticos (1x, 10x, 100x) a partir dos CSVs reais, adicionando
+publicações "de enchimento" vinculadas aos demais professores. O professor medido
+mantém exatamente as mesmas publicações, então a latência indexada deve ficar
+estável enquanto a varredura antiga (máscara + isin sobre df_pub) cresce linearmente.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_professor_index [--scales 1 10 100] [--repeat 50]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import orjson
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import main, data_store, pagination  # noqa: E402
+
+CSV_FILES = ["professores.csv", "publicacoes.csv", "vinculos.csv", "projetos.csv", "qualis_odontologia.csv"]
+
+
+def build_corpus(target_dir, scale, target_id):
+    for name in CSV_FILES:
+        src = os.path.join(ROOT, name)
+        if os.path.exists(src):
+            shutil.copy(src, os.path.join(target_dir, name))
+    if scale <= 1:
+        return
+
+    df_pub = pd.read_csv(os.path.join(ROOT, "publicacoes.csv"))
+    df_vin = pd.read_csv(os.path.join(ROOT, "vinculos.csv"))
+    others = df_vin[df_vin['id_professor'] != target_id]
+
+    pubs, vins = [df_pub], [df_vin]
+    for k in range(1, scale):
+        filler = df_pub.copy()
+        filler['pmid'] = [f"BENCH{k}_{p}" for p in df_pub['pmid']]
+        pubs.append(filler)
+        filler_vin = others.copy()
+        filler_vin['pmid'] = [f"BENCH{k}_{p}" for p in others['pmid']]
+        vins.append(filler_vin)
+
+    pd.concat(pubs, ignore_index=True).to_csv(os.path.join(target_dir, "publicacoes.csv"), index=False)
+    pd.concat(vins, ignore_index=True).to_csv(os.path.join(target_dir, "vinculos.csv"), index=False)
+
+
+def indexed_details(id_professor):
+    """Endpoint atual, percorrendo todas as páginas de publicações (next_cursor)."""
+    cursor, publicacoes = None, []
+    while True:
+        response = main.get_professor_details(None, id_professor, limit=pagination.MAX_PAGE_SIZE, cursor=cursor)
+        prof_data = orjson.loads(response.body)
+        publicacoes += prof_data['publicacoes']
+        cursor = prof_data['next_cursor']
+        if cursor is None:
+            prof_data['publicacoes'] = publicacoes
+            return prof_data
+
+
+def naive_details(id_professor):
+    """Reprodução da implementação anterior (varredura completa por requisição)."""
+    snap = data_store.get_snapshot()
+    prof = snap.df_prof[snap.df_prof['id_professor'] == id_professor]
+    prof_data = prof.iloc[0].to_dict()
+    vinculos = snap.df_vin[snap.df_vin['id_professor'] == id_professor]
+    pmids = vinculos['pmid'].astype(str).tolist()
+    pubs = snap.df_pub[snap.df_pub['pmid'].astype(str).isin(pmids)].copy()
+    pubs = pubs.sort_values(by="ano", ascending=False)
+    prof_data['publicacoes'] = pubs.to_dict(orient="records")
+    return prof_data
+
+
+def timeit(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--professor", type=int, default=None)
+    args = parser.parse_args()
+
+    df_vin = pd.read_csv(os.path.join(ROOT, "vinculos.csv"))
+    target_id = args.professor or int(df_vin['id_professor'].value_counts().idxmax())
+
+    print(f"Professor medido: {target_id}")
+    print(f"{'escala':>7} {'publicações':>12} {'indexado (ms)':>14} {'varredura (ms)':>15}")
+    original_base = data_store.BASE_DIR
+    try:
+        for scale in args.scales:
+            with tempfile.TemporaryDirectory() as tmp:
+                build_corpus(tmp, scale, target_id)
+                data_store.BASE_DIR = tmp
+                data_store.load_data()
+                indexed = timeit(lambda: indexed_details(target_id), args.repeat)
+                naive = timeit(lambda: naive_details(target_id), args.repeat)
+                n_pubs = len(data_store.get_snapshot().df_pub)
+                print(f"{scale:>6}x {n_pubs:>12} {indexed:>14.3f} {naive:>15.3f}")
+    finally:
+        data_store.BASE_DIR = original_base
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,204 @@
+"""
+Benchmark: coleta no PubMed com o cliente antigo (requests sequencial + sleep de 1 s por
+chamada) e com o cliente assíncrono de backend/pubmed.py, contra um stub local das E-utilities.
+
+O stub (PubMedStub, reutilizável por outros benchmarks) responde esearch com PMIDs
+determinísticos por termo (termos diferentes compartilham parte dos PMIDs; termos unidos
+por OR devolvem a união; registros novos em stub.added respeitam o filtro mindate) e
+efetch com o XML desses artigos; cada resposta leva --latency segundos, e mais de --rate
+requisições no último segundo recebem 429, como o NCBI. Os termos são as variantes de professores.csv.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_pubmed_client [--terms 30] [--rate 3] [--latency 0.2]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+import pandas as pd
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import pubmed  # noqa: E402
+
+PMID_POOL = 20000
+PMID_BASE = 30000000
+OLD_ENTREZ_DATE = "2000/01/01"
+# Lote de efetch do coletor antigo
+LEGACY_EFETCH_BATCH = 200
+
+
+def stub_pmids(term, pool=PMID_POOL):
+    """PMIDs do termo: 10 a 80 ids derivados do hash (termos parecidos não se repetem, o pool sim)."""
+    digest = hashlib.blake2b(term.encode(), digest_size=8).digest()
+    n = 10 + digest[0] % 70
+    start = int.from_bytes(digest[1:5], "big") % pool
+    return [str(PMID_BASE + (start + i * 7) % pool) for i in range(n)]
+
+
+def stub_article(pmid):
+    year = 2000 + int(pmid) % 25
+    return (f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article>"
+            f"<Journal><ISSN>1234-{int(pmid) % 10000:04d}</ISSN><Title>Journal {int(pmid) % 50}</Title>"
+            f"<JournalIssue><PubDate><Year>{year}</Year></PubDate></JournalIssue></Journal>"
+            f"<ArticleTitle>{escape(f'Article {pmid}')}</ArticleTitle>"
+            f"<Abstract><AbstractText>Abstract of {pmid}.</AbstractText></Abstract>"
+            f"<AuthorList><Author><LastName>Silva</LastName><Initials>A</Initials></Author></AuthorList>"
+            f"</Article></MedlineCitation><PubmedData><ArticleIdList>"
+            f"<ArticleId IdType=\"doi\">10.1000/{pmid}</ArticleId></ArticleIdList></PubmedData></PubmedArticle>")
+
+
+class PubMedStub:
+    """Servidor local das E-utilities (esearch/efetch) em http://127.0.0.1:{port}."""
+
+    def __init__(self, latency=0.2, rate=3, pmids=stub_pmids):
+        self.latency = latency
+        self.rate = rate
+        self.pmids = pmids
+        self.calls = Counter()   # "esearch", "efetch", "429"
+        # Registros novos: pmid -> (data de inclusão "AAAA/MM/DD", termos que o encontram);
+        # os de pmids() entraram em OLD_ENTREZ_DATE (filtro mindate do esearch)
+        self.added = {}
+        self._recent = deque()
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _params(self):
+                params = parse_qs(urlparse(self.path).query)
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    params.update(parse_qs(self.rfile.read(length).decode()))
+                return {k: v[0] for k, v in params.items()}
+
+            def _reply(self, status, body, content_type):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self):
+                params = self._params()
+                endpoint = os.path.basename(urlparse(self.path).path).split(".")[0]
+                if stub.over_limit():
+                    stub.calls["429"] += 1
+                    return self._reply(429, '{"error":"API rate limit exceeded"}', "application/json")
+                time.sleep(stub.latency)
+                stub.calls[endpoint] += 1
+                if endpoint == "esearch":
+                    # Nomes combinados com OR: união dos PMIDs de cada um
+                    terms = {t.strip() for t in params.get("term", "").replace("[Author]", "").split(" OR ")}
+                    ids = {pmid for term in terms for pmid in stub.pmids(term)}
+                    ids |= {pmid for pmid, (_, found_by) in stub.added.items() if terms & set(found_by)}
+                    if params.get("mindate"):
+                        ids = {pmid for pmid in ids if stub.entrez_date(pmid) >= params["mindate"]}
+                    ids = sorted(ids)
+                    retmax = int(params.get("retmax") or len(ids))
+                    body = json.dumps({"esearchresult": {"count": str(len(ids)), "idlist": ids[:retmax]}})
+                    return self._reply(200, body, "application/json")
+                if endpoint == "efetch":
+                    ids = [i for i in params.get("id", "").split(",") if i]
+                    body = "<PubmedArticleSet>" + "".join(stub_article(i) for i in ids) + "</PubmedArticleSet>"
+                    return self._reply(200, body, "text/xml")
+                self._reply(404, "", "text/plain")
+
+            do_GET = do_POST = _handle
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def entrez_date(self, pmid):
+        return self.added[pmid][0] if pmid in self.added else OLD_ENTREZ_DATE
+
+    def over_limit(self):
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate:
+                return True
+            self._recent.append(now)
+            return False
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def legacy_collect(url, terms, delay):
+    """Fluxo antigo: um esearch por termo e efetch em lotes de 200, sequenciais, com sleep após cada um."""
+    pmids = set()
+    for term in terms:
+        r = requests.get(f"{url}/esearch.fcgi", params={"term": f"{term}[Author]", "retmode": "json"}, timeout=30)
+        if r.ok:
+            pmids.update(r.json().get("esearchresult", {}).get("idlist", []))
+        time.sleep(delay)
+    articles = []
+    ids = sorted(pmids)
+    for i in range(0, len(ids), LEGACY_EFETCH_BATCH):
+        r = requests.post(f"{url}/efetch.fcgi", data={"id": ",".join(ids[i:i + LEGACY_EFETCH_BATCH])}, timeout=30)
+        if r.ok:
+            articles += pubmed.parse_articles(r.text)
+        time.sleep(delay)
+    return articles
+
+
+def async_collect(url, terms, rate):
+    async def collect(client):
+        id_lists = await client.search_authors(terms)
+        pmids = sorted({p for ids in id_lists if ids for p in ids})
+        return await client.efetch(pmids)
+    return pubmed.run(collect, base_url=url, bucket=pubmed.TokenBucket(rate * pubmed.RATE_MARGIN), cache=False)
+
+
+def faculty_terms(limit):
+    df = pd.read_csv(os.path.join(ROOT, "professores.csv"))
+    terms = [t.strip() for v in df['variantes'].dropna() for t in str(v).split(';') if t.strip()]
+    return terms[:limit]
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--terms", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=3, help="req/s aceitas pelo stub e usadas pelo cliente")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--legacy-delay", type=float, default=1.0)
+    args = parser.parse_args()
+
+    terms = faculty_terms(args.terms)
+    print(f"{len(terms)} termos, stub com {args.rate:g} req/s e {args.latency * 1000:.0f} ms por resposta")
+    print(f"{'cliente':>10} {'tempo (s)':>10} {'artigos':>8} {'esearch':>8} {'efetch':>7} {'429':>5}")
+    for name, collect in (("antigo", lambda url: legacy_collect(url, terms, args.legacy_delay)),
+                          ("async", lambda url: async_collect(url, terms, args.rate))):
+        with PubMedStub(latency=args.latency, rate=args.rate) as stub:
+            start = time.perf_counter()
+            articles = collect(stub.url)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>10} {elapsed:>10.1f} {len(articles):>8} {stub.calls['esearch']:>8}"
+                  f" {stub.calls['efetch']:>7} {stub.calls['429']:>5}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,86 @@
+"""
+Benchmark: tempo de inicialização (leitura das tabelas) com e sem o cache binário.
+
+Para cada escala do corpus sintético mede:
+  - csv:       leitura antiga, pd.read_csv dos cinco arquivos + Qualis linha a linha;
+  - banco:     data_store.parse_tables (SQLite + CSVs de Qualis/projetos + Qualis), sem cache;
+  - cache:     data_store.load_tables com o cache válido (nenhuma fonte mudou);
+e o load_data() completo (tabelas + índices) a frio e com o cache.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_startup [--scales 1 10 100] [--repeat 3]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import data_store, table_cache  # noqa: E402
+from benchmarks.bench_professor_index import build_corpus  # noqa: E402
+
+
+def csv_parse(base_dir):
+    """Reprodução da leitura anterior, direto dos CSVs."""
+    qualis_map = data_store.load_qualis(base_dir)
+    df_prof = pd.read_csv(os.path.join(base_dir, "professores.csv"), dtype={'lattes_id': str})
+    df_pub = pd.read_csv(os.path.join(base_dir, "publicacoes.csv"))
+    df_pub['pmid'] = df_pub['pmid'].astype(str).str.strip()
+    df_vin = pd.read_csv(os.path.join(base_dir, "vinculos.csv"))
+    df_proj = pd.read_csv(os.path.join(base_dir, "projetos.csv")).fillna("")
+    df_pub['qualis'] = df_pub['issn'].apply(data_store.get_qualis_stratum, qualis_map=qualis_map)
+    return df_prof.fillna(""), df_pub.fillna(""), df_vin, df_proj
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'escala':>7} {'publicações':>12} {'csv (ms)':>10} {'banco (ms)':>11} {'cache (ms)':>11}"
+          f" {'load frio (ms)':>15} {'load cache (ms)':>16}")
+    original_base = data_store.BASE_DIR
+    try:
+        for scale in args.scales:
+            with tempfile.TemporaryDirectory() as tmp:
+                build_corpus(tmp, scale, target_id=None)
+                data_store.BASE_DIR = tmp
+                cache_path = os.path.join(tmp, table_cache.CACHE_FILENAME)
+
+                def cold_load():
+                    if os.path.exists(cache_path):
+                        os.remove(cache_path)
+                    data_store.load_data()
+
+                csv_ms = best_of(lambda: csv_parse(tmp), args.repeat)
+                db_ms = best_of(lambda: data_store.parse_tables(tmp), args.repeat)
+                cold_ms = best_of(cold_load, args.repeat)
+                cached_ms = best_of(lambda: data_store.load_tables(tmp), args.repeat)
+                warm_ms = best_of(data_store.load_data, args.repeat)
+                n_pubs = len(data_store.get_snapshot().df_pub)
+                print(f"{scale:>6}x {n_pubs:>12} {csv_ms:>10.1f} {db_ms:>11.1f} {cached_ms:>11.1f}"
+                      f" {cold_ms:>15.1f} {warm_ms:>16.1f}")
+    finally:
+        data_store.BASE_DIR = original_base
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -1,16 +1,17 @@
-import requests
-import xml.etree.ElementTree as ET
-import time
 import pandas as pd
 import os
 import unicodedata
 import datetime
+import time
+
+from backend.storage import get_storage
+from backend.sync_service import alvo_de, coletar, gravar_marcas, planejar_incremental
 
 # ----------------- CONFIGURAÇÕES -----------------
-ESEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-EMAIL = "renatodc89@gmail.com"
-DELAY_SECS = 1.0  # Delay respeitoso para a API
+# Chamadas ao PubMed: cliente compartilhado em backend/pubmed.py (limite de taxa do NCBI,
+# NCBI_API_KEY opcional, requisições em paralelo e novas tentativas). As opções 1 a 3
+# usam a coleta em lote de backend/sync_service.py (termos sem repetição, cada PMID
+# baixado uma vez, vínculos de todos os professores numa passada)
 
 # ----------------- FUNÇÕES DE APOIO -----------git------
 
@@ -24,108 +25,6 @@ def normalizar_texto(texto):
         n = n.replace(p, " ")
     return n.strip()
 
-def safe_get(url, params=None, data=None):
-    """Executa requisição HTTP com tratamento de erro e retry."""
-    for i in range(3):  # Tenta até 3 vezes
-        try:
-            if data: # Se houver data, usa POST
-                r = requests.post(url, data=data, timeout=30)
-            else:    # Caso contrário, usa GET
-                r = requests.get(url, params=params, timeout=30)
-            r.raise_for_status()
-            return r
-        except Exception as e:
-            print(f"Tentativa {i+1} falhou: {e}. Tentando novamente em {i+2}s...")
-            time.sleep(i + 2) 
-    return None
-
-def obter_metadados_pubmed(pmids_lista):
-    """Busca metadados XML do PubMed para uma lista de PMIDs."""
-    if not pmids_lista: return []
-    
-    # Processa em lotes de 200 para não sobrecarregar a URL
-    tamanho_lote = 200
-    todos_artigos = []
-
-    for i in range(0, len(pmids_lista), tamanho_lote):
-        lote = pmids_lista[i:i + tamanho_lote]
-        
-        data = {
-            "db": "pubmed",
-            "id": ",".join(lote),
-            "retmode": "xml",
-            "email": EMAIL
-        }
-        
-        res = safe_get(EFETCH_URL, data=data)
-        if res is None: continue
-
-        try:
-            root = ET.fromstring(res.text)
-            for article in root.findall(".//PubmedArticle"):
-                pmid = article.findtext(".//PMID")
-                title = article.findtext(".//ArticleTitle") or "Sem título"
-                revista = article.findtext(".//Journal/Title") or "N/A"
-                
-                # Ano
-                year = article.findtext(".//PubDate/Year")
-                if not year:
-                    medline_date = article.findtext(".//PubDate/MedlineDate")
-                    year = medline_date[:4] if medline_date else "N/A"
-
-                # DOI
-                doi_elem = article.find(".//ArticleId[@IdType='doi']")
-                doi = doi_elem.text if doi_elem is not None else "N/A"
-
-                # Lista de autores
-                autores_nomes = []
-                for a in article.findall(".//Author"):
-                    last = a.findtext("LastName") or ""
-                    init = a.findtext("Initials") or ""
-                    autores_nomes.append(f"{last} {init}".strip())
-
-                # ISSN (Busca todos disponíveis: Print e Electronic)
-                issns_encontrados = []
-                issn_list = article.findall(".//Journal/ISSN")
-                for i_node in issn_list:
-                    if i_node.text:
-                        issns_encontrados.append(i_node.text.strip())
-                
-                # Junta múltiplos ISSNs por ponto e vírgula
-                issn = "; ".join(set(issns_encontrados)) if issns_encontrados else "N/A"
-
-                # Abstract
-                abstract_texts = []
-                # Use iter("AbstractText") to find all nodes, and itertext() to get full content (including <b>, <i> etc)
-                abstract_node = article.find(".//Abstract")
-                if abstract_node is not None:
-                    for abs_text in abstract_node.iter("AbstractText"):
-                        full_text = "".join(abs_text.itertext()).strip()
-                        label = abs_text.get("Label")
-                        if label:
-                            full_text = f"{label}: {full_text}"
-                        abstract_texts.append(full_text)
-                
-                abstract = " ".join(abstract_texts).strip() if abstract_texts else "N/A"
-
-                todos_artigos.append({
-                    "pmid": pmid,
-                    "doi": doi,
-                    "issn": issn,
-                    "titulo": title,
-                    "revista": revista,
-                    "ano": year,
-                    "autores_string": "; ".join(autores_nomes),
-                    "autores_lista": autores_nomes,
-                    "abstract": abstract
-                })
-        except ET.ParseError:
-            print("Erro ao processar XML deste lote.")
-            
-        time.sleep(DELAY_SECS)
-        
-    return todos_artigos
-
 def process_professor_templates(df_prof):
     """Scan 'imports' folder for CSV templates and link to professors."""
     print("\n--- ORIENTAÇÕES PARA IMPORTAÇÃO MANUAL ---")
@@ -147,12 +46,8 @@ def process_professor_templates(df_prof):
     lista_publicacoes = []
     novos_vinculos = []
     
-    # Carrega publicações existentes para checagem de duplicidade
-    pubs_existentes = {}
-    if os.path.exists("publicacoes.csv"):
-        df_existente = pd.read_csv("publicacoes.csv")
-        # Dicionário pmid -> dados para busca rápida
-        pubs_existentes = {str(row['pmid']): row.to_dict() for _, row in df_existente.iterrows()}
+    # Carrega os PMIDs existentes para checagem de duplicidade
+    pubs_existentes = get_storage().list_pmids()
 
     # Prepara busca de professores (nome normalizado para match)
     prof_dict = {}
@@ -235,11 +130,11 @@ def process_professor_templates(df_prof):
 
 def rodar_coleta():
     # 1. Carregar Professores
-    if not os.path.exists("professores.csv"):
-        print("[ERROR] Erro: arquivo 'professores.csv' não encontrado.")
+    storage = get_storage()
+    df_prof = pd.DataFrame(storage.list_professors())
+    if df_prof.empty:
+        print("[ERROR] Erro: nenhum professor cadastrado.")
         return
-
-    df_prof = pd.read_csv("professores.csv")
     
     pmids_para_coletar = set()
     novos_vinculos = [] # Lista temporária para esta execução
@@ -263,10 +158,10 @@ def rodar_coleta():
     
     opcao = input("Digite o número da opção (1, 2, 3, 4 ou 5): ").strip()
     
-    professores_alvo = [] # Tuplas (id, nome, termos_de_busca)
-
-    professores_alvo = [] # Tuplas (id, nome, termos_de_busca)
+    professores_alvo = [] # Alvos da coleta (sync_service.alvo_de)
     lista_publicacoes = [] # Inicializa lista de publicações
+    inicio_coleta = time.time()
+    falhas_coleta = 0
 
     if opcao == '4':
         # --- CADASTRO MANUAL INTEGRADO ---
@@ -351,13 +246,8 @@ def rodar_coleta():
             termo_input = input(f"\nDigite o(s) termo(s) de autor para '{prof_selecionado['nome']}'\n(Separe por ponto e vírgula se for mais de um. Ex: de Almeida EO; Almeida E): ")
             termos_manual = [t.strip() for t in termo_input.split(';') if t.strip()]
             
-            # Monta estrutura para o loop de busca
-            professores_alvo.append({
-                'id': prof_selecionado['id_professor'],
-                'nome': prof_selecionado['nome'],
-                'termos': termos_manual,
-                'row_completa': prof_selecionado # Necessário para Opção 1 se fosse usada aqui, mas na 3 não precisa
-            })
+            # Busca pelos termos digitados, com vínculo direto ao professor (como a Opção 2)
+            professores_alvo.append(alvo_de(prof_selecionado, termos=termos_manual))
             print(f"✅ Busca configurada para: {termos_manual}")
             
         except (ValueError, IndexError):
@@ -365,170 +255,54 @@ def rodar_coleta():
             return
 
     else:
-        # Opções 1 e 2: Prepara todos os professores
-        for _, row in df_prof.iterrows():
-            termos = []
-            if opcao == '2':
-                termos = [str(row['nome']).strip()]
-            else: # Opção 1
-                termos = str(row['variantes']).split(';')
-            
-            professores_alvo.append({
-                'id': row['id_professor'],
-                'nome': row['nome'],
-                'termos': termos,
-                'row_completa': row
-            })
-
-    # 3. Executar Busca no PubMed
-    print(f"\n[SEARCH] Iniciando busca para {len(professores_alvo)} professor(es)...")
-    
-    for prof in professores_alvo:
-        id_atual = prof['id']
-        
-        for t in prof['termos']:
-            t = t.strip()
-            if not t: continue
-            
-            print(f"Buscando PubMed para: {t}...")
-            
-            params = {
-                "db": "pubmed", 
-                "term": f"{t}[Author]", 
-                "retmode": "json", 
-                "retmax": 1000, # Garante trazer todos os resultados
-                "email": EMAIL
-            }
-            
-            res = safe_get(ESEARCH_URL, params)
-            if res:
-                data = res.json()
-                id_list = data.get("esearchresult", {}).get("idlist", [])
-                
-                if id_list:
-                    print(f"   -> {len(id_list)} artigos encontrados.")
-                    
-                    # SE FOR OPÇÃO 2 OU 3: Cria vínculo direto (Confiança na query)
-                    if opcao in ['2', '3']:
-                        for pmid_encontrado in id_list:
-                            novos_vinculos.append({
-                                "pmid": pmid_encontrado,
-                                "id_professor": id_atual
-                            })
-                    
-                    pmids_para_coletar.update(id_list)
-                else:
-                    print("   -> Nenhum resultado.")
-            
-            time.sleep(DELAY_SECS)
-
-    # 4. Baixar Metadados
-    if not pmids_para_coletar:
-        print("\nNenhum artigo novo ou existente encontrado para processar.")
-        # Ainda assim, pode haver processamento de manuais, segue o fluxo
-    
-    print(f"\n[FETCH] Baixando metadados de {len(pmids_para_coletar)} artigos únicos...")
-    todos_artigos = obter_metadados_pubmed(list(pmids_para_coletar))
-
-    # 5. Processamento (Preparar DataFrames)
-    # 5. Processamento (Preparar DataFrames)
-    # Lista já pode conter manuais se Opção 4
-    
-    for art in todos_artigos:
-        lista_publicacoes.append({
-            "pmid": art['pmid'], "doi": art['doi'],
-            "issn": art.get('issn', 'N/A'),
-            "titulo": art['titulo'],
-            "revista": art['revista'], "ano": art['ano'], "autores": art['autores_string'],
-            "abstract": art.get('abstract', 'N/A')
-        })
-
-        # Lógica de Vínculo APENAS para Opção 1 (Variantes/Match Inteligente)
-        # Nas Opções 2 e 3, os vínculos já foram criados na etapa de busca
-        if opcao == '1':
-            # Varre todos os professores alvo (que são todos na Op 1)
-            for prof in professores_alvo:
-                row = prof['row_completa']
-                match_encontrado = False
-                
-                variantes_prof = [normalizar_texto(v) for v in str(row['variantes']).split(';')]
-                autores_artigo_norm = [normalizar_texto(a) for a in art['autores_lista']]
-                
-                for v in variantes_prof:
-                    if not v: continue
-                    for a in autores_artigo_norm:
-                        if v == a or (len(v) > 5 and (v in a or a in v)):
-                            match_encontrado = True
-                            break
-                    if match_encontrado: break
-
-                if match_encontrado:
-                    # Verifica duplicidade na lista local antes de adicionar
-                    novo_v = {"pmid": art['pmid'], "id_professor": prof['id']}
-                    if novo_v not in novos_vinculos:
-                        novos_vinculos.append(novo_v)
-
-    # 6. Salvar e Atualizar Arquivos (UPDATE SEGURO)
-    print("\n[SAVE] Salvando e atualizando arquivos...")
-    
-    # --- Publicacoes.csv ---
-    if os.path.exists("publicacoes.csv"):
-        df_pub_antigo = pd.read_csv("publicacoes.csv")
-        # Converte a coluna pmid para string para garantir match correto
-        df_pub_antigo['pmid'] = df_pub_antigo['pmid'].astype(str)
-        print(f"- Lidos {len(df_pub_antigo)} artigos existentes.")
-    else:
-        df_pub_antigo = pd.DataFrame()
-        print("- Arquivo publicacoes.csv não existia, criando novo.")
-
-    df_pub_novo = pd.DataFrame(lista_publicacoes)
-    if not df_pub_novo.empty:
-        df_pub_novo['pmid'] = df_pub_novo['pmid'].astype(str)
-        # Concatena novo + antigo
-        df_pub_final = pd.concat([df_pub_antigo, df_pub_novo], ignore_index=True)
-        # Remove duplicatas mantendo a última versão (a nova, que tem abstract)
-        df_pub_final = df_pub_final.drop_duplicates(subset=['pmid'], keep='last')
-    else:
-        df_pub_final = df_pub_antigo
-
-    df_pub_final.to_csv("publicacoes.csv", index=False)
-    print(f"[OK] publicacoes.csv atualizado: {len(df_pub_final)} registros totais.")
-
-    # --- Vinculos.csv ---
-    if os.path.exists("vinculos.csv"):
-        df_vin_antigo = pd.read_csv("vinculos.csv")
-        df_vin_antigo['pmid'] = df_vin_antigo['pmid'].astype(str)
-        print(f"- Lidos {len(df_vin_antigo)} vínculos existentes.")
-    else:
-        df_vin_antigo = pd.DataFrame()
-
-    df_vin_novo = pd.DataFrame(novos_vinculos)
-    if not df_vin_novo.empty:
-        df_vin_novo['pmid'] = df_vin_novo['pmid'].astype(str)
-        # Concatena
-        df_vin_final = pd.concat([df_vin_antigo, df_vin_novo], ignore_index=True)
-        # Remove duplicatas exatas (mesmo pmid e mesmo id_professor)
-        df_vin_final = df_vin_final.drop_duplicates(subset=['pmid', 'id_professor'])
-    else:
-        df_vin_final = df_vin_antigo
-        
-    df_vin_final.to_csv("vinculos.csv", index=False)
-    print(f"[OK] vinculos.csv atualizado: {len(df_vin_final)} conexões totais.")
+        # Opções 1 e 2: todos os professores numa só coleta
+        modo = "nome_exato" if opcao == '2' else "variantes"
+        professores_alvo = [alvo_de(row, modo) for _, row in df_prof.iterrows()]
+        professores_alvo = [alvo for alvo in professores_alvo if alvo["termos"]]
+
+        # Incremental: só o que entrou no PubMed desde a última sincronização de cada professor
+        resposta = input("Buscar só artigos novos desde a última sincronização? (S/n): ").strip().lower()
+        incremental = resposta not in ("n", "nao", "não")
+        if incremental:
+            planejar_incremental(professores_alvo, modo, now=inicio_coleta)
+            n_inc = sum(1 for alvo in professores_alvo if alvo["desde"] is not None)
+            print(f"[INFO] {n_inc} professor(es) com busca incremental; os demais, histórico completo.")
+
+    # 3. Executar Busca no PubMed e baixar metadados (Opções 1, 2 e 3)
+    if professores_alvo:
+        # Opção 1: vínculo pelo match das variantes com os autores de cada artigo, para todos os
+        # professores. Opções 2 e 3: vínculo direto de cada PMID com o professor do termo
+        modo = "variantes" if opcao == '1' else "nome_exato"
+        print(f"\n[SEARCH] Iniciando busca para {len(professores_alvo)} professor(es)...")
+        pubs_coleta, vinculos_coleta, resumo = coletar(professores_alvo, modo, pmids_extras=pmids_para_coletar)
+        falhas_coleta = resumo['falhas']
+        print(f"[FETCH] {resumo['termos']} termo(s) distintos buscados, metadados de {resumo['fetched']} artigos "
+              f"({resumo['artigos_baixados']} baixados, {resumo['artigos_em_cache']} do cache local).")
+        lista_publicacoes.extend(pubs_coleta)
+        novos_vinculos.extend(vinculos_coleta)
+
+    # 4. Salvar no banco (UPDATE SEGURO)
+    # Publicações já existentes são atualizadas (a versão nova tem abstract) e
+    # vínculos repetidos (mesmo pmid e mesmo id_professor) são ignorados
+    print("\n[SAVE] Salvando no banco de dados...")
+    storage.merge_publications(lista_publicacoes, novos_vinculos)
+    print(f"[OK] {len(lista_publicacoes)} publicações e {len(novos_vinculos)} vínculos gravados.")
+
+    # Marca d'água das Opções 1 e 2 (só sem falhas: senão a próxima repete a janela)
+    if opcao in ('1', '2') and professores_alvo:
+        if falhas_coleta:
+            print(f"[WARN] {falhas_coleta} busca(s)/lote(s) falharam: marca d'água da sincronização mantida.")
+        else:
+            gravar_marcas(professores_alvo, "nome_exato" if opcao == '2' else "variantes", inicio_coleta)
     
-    # 7. Sincronização Final (Remover Órfãos de vinculos.csv)
+    # 5. Sincronização Final (Remover Órfãos dos vínculos)
     print("\n[SYNC] Garantindo integridade referencial...")
     try:
-        if not df_pub_final.empty:
-            pmids_validos = set(df_pub_final['pmid'].astype(str).unique())
-            original_v = len(df_vin_final)
-            df_vin_final_limpo = df_vin_final[df_vin_final['pmid'].astype(str).isin(pmids_validos)]
-            
-            removidos = original_v - len(df_vin_final_limpo)
-            if removidos > 0:
-                df_vin_final_limpo.to_csv("vinculos.csv", index=False)
-                print(f"   -> {removidos} vínculos órfãos removidos de vinculos.csv.")
-            else:
-                print("   -> Tudo sincronizado! Nenhum órfão encontrado.")
+        removidos = storage.remove_orphan_links()
+        if removidos > 0:
+            print(f"   -> {removidos} vínculos órfãos removidos.")
+        else:
+            print("   -> Tudo sincronizado! Nenhum órfão encontrado.")
     except Exception as e:
         print(f"   -> Erro na sincronização: {e}")
 
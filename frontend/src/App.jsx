@@ -18,6 +18,7 @@ import AdminDashboard from './pages/admin/Dashboard';
 import ProfessoresManager from './pages/admin/ProfessoresManager';
 import PublicacoesManager from './pages/admin/PublicacoesManager';
 import DataSync from './pages/admin/DataSync';
+import TemplatesManager from './pages/admin/TemplatesManager';
 
 function App() {
   return (
@@ -31,6 +32,7 @@ function App() {
             <Route path="professores" element={<ProfessoresManager />} />
             <Route path="publicacoes" element={<PublicacoesManager />} />
             <Route path="sync" element={<DataSync />} />
+            <Route path="templates" element={<TemplatesManager />} />
           </Route>
 
           {/* Public Routes with standard layout */}
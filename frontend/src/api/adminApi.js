@@ -69,6 +69,16 @@ export const adminApi = {
   editPublicacao: (pmid, data) => fetchWithAuth(`/publicacoes/${pmid}`, { method: 'PUT', body: JSON.stringify(data) }),
   deletePublicacao: (pmid) => fetchWithAuth(`/publicacoes/${pmid}`, { method: 'DELETE' }),
 
-  syncPubmed: (id_professor, mode = 'variantes') => 
-    fetchWithAuth('/sync', { method: 'POST', body: JSON.stringify({ id_professor, mode }) }),
+  // Queues the sync and returns the job; poll getSyncJob for progress and result
+  syncPubmed: (id_professor, mode = 'variantes', incremental = true) => 
+    fetchWithAuth('/sync', { method: 'POST', body: JSON.stringify({ id_professor, mode, incremental }) }),
+  syncPubmedAll: (mode = 'variantes', incremental = true) =>
+    fetchWithAuth('/sync/all', { method: 'POST', body: JSON.stringify({ mode, incremental }) }),
+  getSyncJob: (jobId) => fetchWithAuth(`/sync/jobs/${jobId}`),
+  cancelSyncJob: (jobId) => fetchWithAuth(`/sync/jobs/${jobId}/cancel`, { method: 'POST' }),
+
+  // Templates sent on the Support page wait here until an admin imports them
+  getTemplates: () => fetchWithAuth('/templates'),
+  importTemplate: (filename) => fetchWithAuth(`/templates/${encodeURIComponent(filename)}/import`, { method: 'POST' }),
+  getImportJob: (jobId) => fetchWithAuth(`/templates/jobs/${jobId}`),
 };
@@ -1,5 +1,12 @@
 export const API_URL = import.meta.env.VITE_API_URL || "http://localhost:8000";
-export const getProfessorPhotoUrl = (name) => {
+// Foto do professor: usa a variante redimensionada que a API informa em `photos`
+// (thumb, card ou profile, com hash no nome); sem ela, o arquivo original pelo nome.
+export const getProfessorPhotoUrl = (professor, variant = "card") => {
+    if (!professor) return "";
+    if (professor.photos !== undefined) {
+        return professor.photos ? `${API_URL}${professor.photos[variant].webp}` : "";
+    }
+    const name = professor.nome;
     if (!name) return "";
     const normalizedName = name
         .toLowerCase()
@@ -25,22 +32,36 @@ export const api = {
         return res.json();
     },
 
-    getProfessorById: async (id) => {
-        const res = await fetch(`${API_URL}/professores/${id}`);
+    getProfessorById: async (id, cursor = null) => {
+        const params = new URLSearchParams();
+        if (cursor) params.append("cursor", cursor);
+
+        const res = await fetch(`${API_URL}/professores/${id}?${params}`);
         if (!res.ok) throw new Error("Professor not found");
         return res.json();
     },
 
+    getPublication: async (pmid) => {
+        const res = await fetch(`${API_URL}/publicacoes/${encodeURIComponent(pmid)}`);
+        if (!res.ok) throw new Error("Erro ao buscar publicação");
+        return res.json();
+    },
+
     getGraph: async () => {
         const res = await fetch(`${API_URL}/graph`);
         if (!res.ok) throw new Error("Erro ao buscar dados do grafo");
         return res.json();
     },
 
-    getProjetos: async () => {
-        const res = await fetch(`${API_URL}/projetos`);
+    // Uma página de /projetos no tamanho padrão (a primeira vem do memo do servidor);
+    // `next` é o cursor da seguinte (null na última)
+    getProjetos: async (cursor = null) => {
+        const params = new URLSearchParams();
+        if (cursor) params.append("cursor", cursor);
+
+        const res = await fetch(`${API_URL}/projetos?${params}`);
         if (!res.ok) throw new Error("Erro ao buscar projetos");
-        return res.json();
+        return { items: await res.json(), next: res.headers.get("X-Next-Cursor") };
     },
 
     getCollaborations: async (id) => {
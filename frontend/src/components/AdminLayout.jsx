@@ -1,6 +1,6 @@
 import React from 'react';
 import { Navigate, Outlet, Link, useLocation } from 'react-router-dom';
-import { LayoutDashboard, Users, BookOpen, RefreshCw, LogOut } from 'lucide-react';
+import { LayoutDashboard, Users, BookOpen, RefreshCw, FileSpreadsheet, LogOut } from 'lucide-react';
 import { useAuth } from '../context/AuthContext';
 
 const RequireAuth = ({ children }) => {
@@ -21,6 +21,7 @@ const AdminSidebar = () => {
     { name: 'Professores', icon: Users, path: '/admin/professores' },
     { name: 'Publicações', icon: BookOpen, path: '/admin/publicacoes' },
     { name: 'Sincronizar PubMed', icon: RefreshCw, path: '/admin/sync' },
+    { name: 'Templates', icon: FileSpreadsheet, path: '/admin/templates' },
   ];
 
   return (
@@ -23,7 +23,7 @@ export default function ProfessorCard({ professor }) {
                                 <User className="w-8 h-8 text-slate-400" />
                             ) : (
                                 <img
-                                    src={getProfessorPhotoUrl(professor.nome)}
+                                    src={getProfessorPhotoUrl(professor, "card")}
                                     onError={() => setImgError(true)}
                                     alt={professor.nome}
                                     className="w-full h-full object-cover"
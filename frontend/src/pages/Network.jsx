@@ -20,7 +20,7 @@ export function NetworkProfessorItem({ prof, isSelected, onSelect }) {
                         <Users className="w-6 h-6 text-slate-400" />
                     ) : (
                         <img
-                            src={getProfessorPhotoUrl(prof.nome)}
+                            src={getProfessorPhotoUrl(prof, "thumb")}
                             onError={() => setImgError(true)}
                             alt=""
                             className="w-full h-full object-cover"
@@ -47,7 +47,7 @@ function CollabIconWrapper({ collab }) {
         <Users className="w-7 h-7 text-slate-400" />
     ) : (
         <img
-            src={getProfessorPhotoUrl(collab.nome)}
+            src={getProfessorPhotoUrl(collab, "card")}
             onError={() => setImgError(true)}
             alt=""
             className="w-full h-full object-cover"
@@ -63,6 +63,7 @@ export default function Network() {
     const [filterArea, setFilterArea] = useState("");
     const [expandedCollab, setExpandedCollab] = useState(null);
     const [expandedPub, setExpandedPub] = useState(null);
+    const [abstracts, setAbstracts] = useState({});
     const [loading, setLoading] = useState(true);
     const [selectedImgError, setSelectedImgError] = useState(false);
     const navigate = useNavigate();
@@ -93,6 +94,20 @@ export default function Network() {
         }
     }, [selectedProfessor]);
 
+    // Abstracts are not part of /collaborations; fetch them when a publication is expanded
+    const toggleAbstract = (key, pmid) => {
+        if (expandedPub === key) {
+            setExpandedPub(null);
+            return;
+        }
+        setExpandedPub(key);
+        if (!(pmid in abstracts)) {
+            api.getPublication(pmid)
+                .then(details => setAbstracts(prev => ({ ...prev, [pmid]: details.abstract || '' })))
+                .catch(console.error);
+        }
+    };
+
     // Extract unique areas
     const areas = [...new Set(professors.flatMap(p => p.atuacao ? p.atuacao.split(';').map(a => a.trim()) : []))].sort();
 
@@ -218,7 +233,7 @@ export default function Network() {
                                             <Users className="w-10 h-10 text-slate-400" />
                                         ) : (
                                             <img
-                                                src={getProfessorPhotoUrl(selectedProfessor.nome)}
+                                                src={getProfessorPhotoUrl(selectedProfessor, "card")}
                                                 onError={() => setSelectedImgError(true)}
                                                 alt=""
                                                 className="w-full h-full object-cover"
@@ -337,9 +352,9 @@ export default function Network() {
                                                                             )}
                                                                         </div>
                                                                     </div>
-                                                                    {pub.abstract && (
+                                                                    {(pub.has_abstract || pub.abstract) && (
                                                                         <button
-                                                                            onClick={() => setExpandedPub(expandedPub === `${collab.id_professor}-${idx}` ? null : `${collab.id_professor}-${idx}`)}
+                                                                            onClick={() => toggleAbstract(`${collab.id_professor}-${idx}`, pub.pmid)}
                                                                             className="px-2 py-1 text-xs font-medium text-slate-600 dark:text-slate-400 hover:text-slate-900 dark:hover:text-slate-200 hover:bg-slate-100 dark:hover:bg-slate-700 rounded transition-colors whitespace-nowrap"
                                                                         >
                                                                             {expandedPub === `${collab.id_professor}-${idx}` ? 'Ocultar' : 'Resumo'}
@@ -348,10 +363,10 @@ export default function Network() {
                                                                 </div>
 
                                                                 {/* Abstract Expansion */}
-                                                                {pub.abstract && expandedPub === `${collab.id_professor}-${idx}` && (
+                                                                {(pub.abstract || abstracts[pub.pmid]) && expandedPub === `${collab.id_professor}-${idx}` && (
                                                                     <div className="mt-3 pt-3 border-t border-slate-200 dark:border-slate-700">
                                                                         <p className="text-sm text-slate-600 dark:text-slate-300 leading-relaxed bg-slate-50 dark:bg-slate-900/50 p-3 rounded-lg">
-                                                                            {pub.abstract}
+                                                                            {pub.abstract || abstracts[pub.pmid]}
                                                                         </p>
                                                                     </div>
                                                                 )}
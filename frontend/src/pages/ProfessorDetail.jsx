@@ -9,6 +9,7 @@ export default function ProfessorDetail() {
     const [data, setData] = useState(null);
     const [loading, setLoading] = useState(true);
     const [imgError, setImgError] = useState(false);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     useEffect(() => {
         loadData();
@@ -25,6 +26,22 @@ export default function ProfessorDetail() {
         }
     };
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const res = await api.getProfessorById(id, data.next_cursor);
+            setData(prev => ({
+                ...prev,
+                publicacoes: [...prev.publicacoes, ...res.publicacoes],
+                next_cursor: res.next_cursor
+            }));
+        } catch (e) {
+            console.error(e);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     if (loading) return <div className="p-8 text-center text-slate-500">Carregando perfil...</div>;
     if (!data) return <div className="p-8 text-center text-red-500">Erro ao carregar perfil.</div>;
 
@@ -42,7 +59,7 @@ export default function ProfessorDetail() {
                         <User className="w-16 h-16 text-slate-400" />
                     ) : (
                         <img
-                            src={getProfessorPhotoUrl(data.nome)}
+                            src={getProfessorPhotoUrl(data, "profile")}
                             onError={() => setImgError(true)}
                             alt={data.nome}
                             className="w-full h-full object-cover"
@@ -136,11 +153,9 @@ export default function ProfessorDetail() {
                 <h3 className="text-lg font-bold text-slate-800 dark:text-slate-200 mb-4">Produção por Ano</h3>
                 <div className="h-64 w-full">
                     <ResponsiveContainer width="100%" height="100%">
-                        <BarChart data={Object.entries(data.publicacoes.reduce((acc, pub) => {
-                            const year = pub.ano || 'ND';
-                            acc[year] = (acc[year] || 0) + 1;
-                            return acc;
-                        }, {})).map(([year, count]) => ({ year, count })).sort((a, b) => a.year - b.year)}>
+                        <BarChart data={Object.entries(data.publicacoes_por_ano || {})
+                            .map(([year, count]) => ({ year: year || 'ND', count }))
+                            .sort((a, b) => a.year - b.year)}>
                             <XAxis dataKey="year" fontSize={12} tickLine={false} axisLine={false} stroke="#94a3b8" tick={{ fontSize: 10 }} />
                             <YAxis fontSize={12} tickLine={false} axisLine={false} allowDecimals={false} stroke="#94a3b8" tick={{ fontSize: 10 }} />
                             <Tooltip
@@ -156,7 +171,7 @@ export default function ProfessorDetail() {
             {/* Publications List */}
             <div className="space-y-6">
                 <h2 className="text-xl font-bold text-slate-800 dark:text-slate-200 border-b border-slate-200 dark:border-slate-700 pb-2">
-                    Publicações ({data.publicacoes.length})
+                    Publicações ({data.total_publicacoes})
                 </h2>
 
                 <div className="space-y-4">
@@ -164,6 +179,18 @@ export default function ProfessorDetail() {
                         <PublicationItem key={pub.pmid} pub={pub} />
                     ))}
                 </div>
+
+                {data.next_cursor && (
+                    <div className="flex justify-center">
+                        <button
+                            onClick={loadMore}
+                            disabled={loadingMore}
+                            className="px-4 py-2 rounded-lg border border-slate-200 dark:border-slate-700 text-sm font-medium text-slate-600 dark:text-slate-300 hover:bg-slate-50 dark:hover:bg-slate-800 disabled:opacity-50 transition-colors"
+                        >
+                            {loadingMore ? 'Carregando...' : `Carregar mais (${data.publicacoes.length} de ${data.total_publicacoes})`}
+                        </button>
+                    </div>
+                )}
             </div>
         </div>
     );
@@ -171,6 +198,21 @@ export default function ProfessorDetail() {
 
 function PublicationItem({ pub }) {
     const [open, setOpen] = useState(false);
+    const [abstract, setAbstract] = useState(pub.abstract || null);
+
+    // The list comes without abstracts; fetch this one on first expand
+    const toggleAbstract = async () => {
+        if (!open && abstract === null) {
+            try {
+                const details = await api.getPublication(pub.pmid);
+                setAbstract(details.abstract || '');
+            } catch (e) {
+                console.error(e);
+                return;
+            }
+        }
+        setOpen(!open);
+    };
 
     return (
         <div className="bg-white dark:bg-slate-800 rounded-lg border border-slate-200 dark:border-slate-700 p-4 transition-all hover:bg-slate-50 dark:hover:bg-slate-700/50">
@@ -196,9 +238,9 @@ function PublicationItem({ pub }) {
                         )}
                         <a href={`https://pubmed.ncbi.nlm.nih.gov/${pub.pmid}/`} target="_blank" className="text-sky-600 dark:text-sky-400 hover:underline">PubMed ↗</a>
 
-                        {pub.abstract && pub.abstract !== 'N/A' && (
+                        {(pub.has_abstract || (pub.abstract && pub.abstract !== 'N/A')) && (
                             <button
-                                onClick={() => setOpen(!open)}
+                                onClick={toggleAbstract}
                                 className="flex items-center text-slate-500 dark:text-slate-400 hover:text-slate-800 dark:hover:text-slate-200 ml-auto"
                             >
                                 {open ? "Ocultar Resumo" : "Ver Resumo"}
@@ -211,7 +253,7 @@ function PublicationItem({ pub }) {
 
             {open && (
                 <div className="mt-4 pt-4 border-t border-slate-100 dark:border-slate-700 text-sm text-slate-700 dark:text-slate-300 leading-relaxed bg-slate-50/50 dark:bg-slate-900/50 p-4 rounded">
-                    {pub.abstract}
+                    {abstract}
                 </div>
             )}
         </div>
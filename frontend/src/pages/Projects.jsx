@@ -21,7 +21,7 @@ function ProfessorListItem({ prof, isSelected, onSelect }) {
                         <Users className="w-5 h-5 text-slate-400" />
                     ) : (
                         <img
-                            src={getProfessorPhotoUrl(prof.nome)}
+                            src={getProfessorPhotoUrl(prof, "thumb")}
                             onError={() => setImgError(true)}
                             alt=""
                             className="w-full h-full object-cover"
@@ -61,11 +61,18 @@ export default function Projects() {
 
     const loadData = async () => {
         try {
-            const res = await api.getProjetos();
-            setProfessorsData(res);
+            // Primeira página já libera a tela; as seguintes vão sendo acrescentadas
+            let page = await api.getProjetos();
+            setProfessorsData(page.items);
             // Pre-select first professor if available
-            if (res.length > 0) {
-                setSelectedProfessor(res[0]);
+            if (page.items.length > 0) {
+                setSelectedProfessor(page.items[0]);
+            }
+            setLoading(false);
+            while (page.next) {
+                page = await api.getProjetos(page.next);
+                const items = page.items;
+                setProfessorsData(prev => [...prev, ...items]);
             }
         } catch (e) {
             console.error(e);
@@ -166,7 +173,7 @@ export default function Projects() {
                                                 <Users className="w-8 h-8 text-slate-400" />
                                             ) : (
                                                 <img
-                                                    src={getProfessorPhotoUrl(selectedProfessor.nome)}
+                                                    src={getProfessorPhotoUrl(selectedProfessor, "profile")}
                                                     onError={() => setSelectedImgError(true)}
                                                     alt=""
                                                     className="w-full h-full object-cover"
@@ -1,6 +1,18 @@
 import React, { useState, useEffect } from 'react';
 import { adminApi } from '../../api/adminApi';
-import { RefreshCw, Database, CheckCircle, AlertTriangle } from 'lucide-react';
+import { RefreshCw, Database, CheckCircle, AlertTriangle, XCircle } from 'lucide-react';
+
+// Select value for the batched sync of every professor
+const ALL_PROFESSORS = 'todos';
+
+const FINISHED = ['done', 'error', 'cancelled'];
+
+const ETAPAS = {
+  buscando: 'Buscando termos no PubMed',
+  baixando: 'Baixando metadados dos artigos',
+  gravando: 'Gravando publicações e vínculos',
+  concluido: 'Concluído',
+};
 
 export default function DataSync() {
   const [professores, setProfessores] = useState([]);
@@ -8,6 +20,8 @@ export default function DataSync() {
     loading: false,
     selectedProf: '',
     mode: 'variantes',
+    incremental: true,
+    job: null,
     result: null,
     error: null
   });
@@ -16,19 +30,57 @@ export default function DataSync() {
     adminApi.getProfessores().then(setProfessores).catch(console.error);
   }, []);
 
+  // Polls the sync job until it finishes (done, error or cancelled)
+  const pollSync = async (jobId) => {
+    while (true) {
+      let job;
+      try {
+        job = await adminApi.getSyncJob(jobId);
+      } catch (err) {
+        setSyncState(prev => ({ ...prev, loading: false, error: err.message }));
+        return;
+      }
+      if (FINISHED.includes(job.status)) {
+        setSyncState(prev => ({
+          ...prev, loading: false, job,
+          result: job.status === 'done' ? job.result : null,
+          error: job.status === 'error' ? job.error : job.status === 'cancelled' ? 'Sincronização cancelada. Nada foi gravado.' : null,
+        }));
+        return;
+      }
+      setSyncState(prev => ({ ...prev, job }));
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleSync = async () => {
     if (!syncState.selectedProf) return alert("Selecione um professor primeiro.");
     
-    setSyncState(prev => ({ ...prev, loading: true, result: null, error: null }));
+    setSyncState(prev => ({ ...prev, loading: true, job: null, result: null, error: null }));
     
     try {
-      const resp = await adminApi.syncPubmed(parseInt(syncState.selectedProf), syncState.mode);
-      setSyncState(prev => ({ ...prev, loading: false, result: resp }));
+      const job = syncState.selectedProf === ALL_PROFESSORS
+        ? await adminApi.syncPubmedAll(syncState.mode, syncState.incremental)
+        : await adminApi.syncPubmed(parseInt(syncState.selectedProf), syncState.mode, syncState.incremental);
+      setSyncState(prev => ({ ...prev, job }));
+      pollSync(job.id);
     } catch (err) {
       setSyncState(prev => ({ ...prev, loading: false, error: err.message }));
     }
   };
 
+  const handleCancel = async () => {
+    if (!syncState.job) return;
+    try {
+      const job = await adminApi.cancelSyncJob(syncState.job.id);
+      setSyncState(prev => ({ ...prev, job }));
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
+  const progress = syncState.job?.progress || {};
+
   return (
     <div className="p-8 max-w-4xl">
       <div className="mb-8">
@@ -54,6 +106,7 @@ export default function DataSync() {
               className="w-full border border-gray-300 rounded-lg p-3 outline-none focus:ring-2 focus:ring-blue-500 bg-white"
             >
               <option value="">-- Selecione para Buscar --</option>
+              <option value={ALL_PROFESSORS}>Todos os professores (varredura em lote)</option>
               {professores.map(p => (
                 <option key={p.id_professor} value={p.id_professor}>{p.nome}</option>
               ))}
@@ -95,10 +148,36 @@ export default function DataSync() {
             </div>
           </div>
 
+          <div>
+            <label className="block text-sm font-medium text-gray-700 mb-2">3. Abrangência</label>
+            <label className="flex items-center cursor-pointer p-3 border rounded-lg hover:bg-gray-50">
+              <input
+                type="checkbox"
+                checked={syncState.incremental}
+                onChange={e => setSyncState({...syncState, incremental: e.target.checked})}
+                className="mr-3 h-4 w-4 text-blue-600"
+              />
+              <div>
+                <div className="font-semibold text-gray-800">Somente artigos novos (Incremental)</div>
+                <div className="text-xs text-gray-500">Busca apenas o que entrou no PubMed desde a última sincronização. A primeira vez, termos alterados ou a revisão periódica buscam o histórico completo. Desmarque para forçar a busca completa.</div>
+              </div>
+            </label>
+          </div>
+
           <div className="pt-4 border-t border-gray-100 flex items-center justify-between">
             <span className="text-sm text-gray-500">
-              * A API tem limite HTTP. Uma requisição muito longa pode demorar até 10-15s (Processo bloqueante).
+              * A API tem limite de requisições por segundo. A varredura roda em segundo plano; o progresso aparece abaixo.
             </span>
+            <div className="flex gap-3">
+            {syncState.loading && syncState.job && (
+              <button
+                onClick={handleCancel}
+                disabled={syncState.job.cancel_requested}
+                className="flex items-center px-4 py-3 rounded-lg font-medium text-red-700 border border-red-200 hover:bg-red-50 disabled:opacity-50 disabled:cursor-not-allowed"
+              >
+                <XCircle className="w-5 h-5 mr-2" /> {syncState.job.cancel_requested ? 'Cancelando...' : 'Cancelar'}
+              </button>
+            )}
             <button 
               onClick={handleSync}
               disabled={syncState.loading || !syncState.selectedProf}
@@ -113,7 +192,23 @@ export default function DataSync() {
                 <><RefreshCw className="w-5 h-5 mr-3" /> Iniciar Varredura </>
               )}
             </button>
+            </div>
           </div>
+
+          {/* Andamento da varredura em segundo plano */}
+          {syncState.loading && syncState.job && (
+            <div className="text-sm text-gray-600 space-y-1">
+              <p>
+                {syncState.job.status === 'queued' ? 'Na fila, aguardando outra sincronização...' : (ETAPAS[progress.etapa] || 'Iniciando...')}
+              </p>
+              {progress.termos_total !== undefined && (
+                <p>Termos buscados: <strong>{progress.termos_buscados || 0} / {progress.termos_total}</strong></p>
+              )}
+              {progress.pmids_encontrados !== undefined && (
+                <p>Artigos baixados: <strong>{progress.pmids_baixados || 0} / {progress.pmids_encontrados}</strong></p>
+              )}
+            </div>
+          )}
         </div>
       </div>
 
@@ -128,7 +223,7 @@ export default function DataSync() {
             )}
             <div>
               <h3 className={`font-bold ${syncState.error ? 'text-red-800' : 'text-green-800'}`}>
-                {syncState.error ? 'Falha na Sincronização' : 'Sincronização Concluída'}
+                {syncState.job?.status === 'cancelled' ? 'Sincronização Cancelada' : syncState.error ? 'Falha na Sincronização' : 'Sincronização Concluída'}
               </h3>
               
               {syncState.error && (
@@ -138,9 +233,18 @@ export default function DataSync() {
               {syncState.result && (
                 <div className="mt-2 text-green-800 text-sm space-y-1">
                    <p>Status da rotina: <strong>{syncState.result.status}</strong></p>
+                   {syncState.result.incrementais > 0 && (
+                     <p>Busca incremental (só artigos novos) para <strong>{syncState.result.incrementais} de {syncState.result.professores}</strong> professor(es).</p>
+                   )}
+                   {syncState.result.professores > 1 && (
+                     <p>Professores sincronizados: <strong>{syncState.result.professores}</strong> ({syncState.result.termos} termos de busca distintos)</p>
+                   )}
                    {syncState.result.fetched !== undefined && (
                      <p>Metadados Re-baixados do PubMed: <strong>{syncState.result.fetched} artigos</strong></p>
                    )}
+                   {syncState.result.artigos_em_cache > 0 && (
+                     <p>Artigos reaproveitados do cache local (sem nova chamada ao PubMed): <strong>{syncState.result.artigos_em_cache}</strong></p>
+                   )}
                    {syncState.result.novos_vinculos !== undefined && (
                      <p>Novos artigos vinculados com sucesso: <strong>{syncState.result.novos_vinculos} associações</strong></p>
                    )}
@@ -135,7 +135,7 @@ export default function ProfessoresManager() {
                     <td className="px-6 py-4">
                       <div className="flex items-center">
                         <img
-                          src={getProfessorPhotoUrl(p.nome)}
+                          src={getProfessorPhotoUrl(p)}
                           alt="Foto"
                           className="w-10 h-10 rounded-full object-cover mr-4 border border-gray-200"
                           onError={(e) => { e.target.src = "https://via.placeholder.com/150?text=Sem+Foto" }}
@@ -10,6 +10,9 @@ export default function PublicacoesManager() {
   const [editingPmid, setEditingPmid] = useState(null);
 
   const [searchPmid, setSearchPmid] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
+  const [total, setTotal] = useState(0);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const [formData, setFormData] = useState({
     pmid: '',
@@ -32,7 +35,11 @@ export default function PublicacoesManager() {
       const resPub = await fetch(`http://localhost:8000/api/admin/publicacoes${qs}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
-      if (resPub.ok) setPublicacoes(await resPub.json());
+      if (resPub.ok) {
+        setPublicacoes(await resPub.json());
+        setNextCursor(resPub.headers.get('X-Next-Cursor'));
+        setTotal(Number(resPub.headers.get('X-Total-Count')) || 0);
+      }
 
       // Carregar professores para o dropdown
       const dataProf = await adminApi.getProfessores();
@@ -48,6 +55,27 @@ export default function PublicacoesManager() {
     loadData();
   }, [searchPmid]);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const params = new URLSearchParams({ limit: '50', cursor: nextCursor });
+      if (searchPmid) params.append('pmid', searchPmid);
+      const token = localStorage.getItem('adminToken');
+      const resPub = await fetch(`http://localhost:8000/api/admin/publicacoes?${params}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (resPub.ok) {
+        const page = await resPub.json();
+        setPublicacoes(prev => [...prev, ...page]);
+        setNextCursor(resPub.headers.get('X-Next-Cursor'));
+      }
+    } catch (e) {
+      console.error(e);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleOpenModal = (pub = null) => {
     if (pub) {
       setEditingPmid(pub.pmid);
@@ -192,6 +220,17 @@ export default function PublicacoesManager() {
                 )}
               </tbody>
             </table>
+            {nextCursor && (
+              <div className="p-4 border-t border-gray-100 flex justify-center">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="px-4 py-2 border rounded-lg text-sm font-medium text-gray-600 hover:bg-gray-50 disabled:opacity-50 transition"
+                >
+                  {loadingMore ? 'Carregando...' : `Carregar mais (${publicacoes.length} de ${total})`}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -0,0 +1,142 @@
+import React, { useState, useEffect } from 'react';
+import { adminApi } from '../../api/adminApi';
+import { FileSpreadsheet, Upload, RefreshCw, CheckCircle, AlertTriangle } from 'lucide-react';
+
+const FINISHED = ['done', 'error', 'cancelled'];
+
+export default function TemplatesManager() {
+  const [templates, setTemplates] = useState([]);
+  const [loading, setLoading] = useState(true);
+  const [error, setError] = useState(null);
+  // filename -> import job (latest state)
+  const [importJobs, setImportJobs] = useState({});
+
+  const loadTemplates = () => {
+    setLoading(true);
+    adminApi.getTemplates()
+      .then(data => { setTemplates(data); setError(null); })
+      .catch(err => setError(err.message))
+      .finally(() => setLoading(false));
+  };
+
+  useEffect(() => { loadTemplates(); }, []);
+
+  // Polls the import job until it finishes; a finished import leaves the pending list
+  const pollImport = async (filename, jobId) => {
+    while (true) {
+      let job;
+      try {
+        job = await adminApi.getImportJob(jobId);
+      } catch (err) {
+        setImportJobs(prev => ({ ...prev, [filename]: { status: 'error', error: err.message } }));
+        return;
+      }
+      setImportJobs(prev => ({ ...prev, [filename]: job }));
+      if (FINISHED.includes(job.status)) {
+        if (job.status === 'done') loadTemplates();
+        return;
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  };
+
+  const handleImport = async (template) => {
+    if (!window.confirm(`Importar ${template.filename} para "${template.professor_name}"? As publicações entram no catálogo público.`)) return;
+    try {
+      const job = await adminApi.importTemplate(template.filename);
+      setImportJobs(prev => ({ ...prev, [template.filename]: job }));
+      pollImport(template.filename, job.id);
+    } catch (err) {
+      setImportJobs(prev => ({ ...prev, [template.filename]: { status: 'error', error: err.message } }));
+    }
+  };
+
+  const finishedImports = Object.entries(importJobs).filter(([, job]) => FINISHED.includes(job.status));
+
+  return (
+    <div className="p-8 max-w-5xl">
+      <div className="mb-8 flex items-start justify-between">
+        <div>
+          <h1 className="text-3xl font-bold text-gray-900 flex items-center">
+            <FileSpreadsheet className="mr-3 text-blue-600" /> Templates Recebidos
+          </h1>
+          <p className="text-gray-500 mt-2">
+            Planilhas enviadas pelos professores na página de Suporte. Nada entra no catálogo antes de ser importado aqui.
+          </p>
+        </div>
+        <button onClick={loadTemplates} className="flex items-center px-4 py-2 rounded-lg border border-gray-200 text-gray-700 hover:bg-gray-50">
+          <RefreshCw className={`w-4 h-4 mr-2 ${loading ? 'animate-spin' : ''}`} /> Atualizar
+        </button>
+      </div>
+
+      {error && <div className="mb-6 p-4 rounded-xl bg-red-50 border border-red-200 text-red-700 text-sm">{error}</div>}
+
+      <div className="bg-white rounded-xl shadow-sm border border-gray-200 overflow-hidden">
+        <table className="w-full text-sm">
+          <thead className="bg-gray-50 text-gray-600 text-left">
+            <tr>
+              <th className="p-4 font-medium">Arquivo</th>
+              <th className="p-4 font-medium">Professor informado</th>
+              <th className="p-4 font-medium">Recebido em</th>
+              <th className="p-4 font-medium text-right">Tamanho</th>
+              <th className="p-4"></th>
+            </tr>
+          </thead>
+          <tbody className="divide-y divide-gray-100">
+            {!loading && templates.length === 0 && (
+              <tr><td colSpan={5} className="p-6 text-center text-gray-500">Nenhum template aguardando importação.</td></tr>
+            )}
+            {templates.map(t => {
+              const job = importJobs[t.filename];
+              const running = job && !FINISHED.includes(job.status);
+              return (
+                <tr key={t.filename}>
+                  <td className="p-4 font-mono text-xs text-gray-700">{t.filename}</td>
+                  <td className="p-4 text-gray-800">{t.professor_name}</td>
+                  <td className="p-4 text-gray-500">{new Date(t.received_at).toLocaleString('pt-BR')}</td>
+                  <td className="p-4 text-gray-500 text-right">{(t.size / 1024).toFixed(1)} KB</td>
+                  <td className="p-4 text-right">
+                    <button
+                      onClick={() => handleImport(t)}
+                      disabled={running}
+                      className="inline-flex items-center px-4 py-2 rounded-lg font-medium text-white bg-blue-600 hover:bg-blue-700 disabled:bg-gray-400 disabled:cursor-not-allowed"
+                    >
+                      {running
+                        ? <><RefreshCw className="w-4 h-4 mr-2 animate-spin" /> Importando...</>
+                        : <><Upload className="w-4 h-4 mr-2" /> Importar</>}
+                    </button>
+                  </td>
+                </tr>
+              );
+            })}
+          </tbody>
+        </table>
+      </div>
+
+      {/* Resultado das importações desta sessão */}
+      {finishedImports.map(([filename, job]) => (
+        <div key={filename} className={`mt-6 p-6 rounded-xl border ${job.status === 'done' ? 'bg-green-50 border-green-200' : 'bg-red-50 border-red-200'}`}>
+          <div className="flex items-start">
+            {job.status === 'done'
+              ? <CheckCircle className="w-6 h-6 text-green-600 mr-3 mt-0.5 shrink-0" />
+              : <AlertTriangle className="w-6 h-6 text-red-600 mr-3 mt-0.5 shrink-0" />}
+            <div className="text-sm">
+              <h3 className={`font-bold ${job.status === 'done' ? 'text-green-800' : 'text-red-800'}`}>{filename}</h3>
+              {job.status === 'done' ? (
+                <div className="mt-1 text-green-800 space-y-1">
+                  <p>Professor: <strong>{job.result.professor}</strong> ({job.result.linhas} linhas)</p>
+                  <p>{job.result.novas_publicacoes} publicações novas, {job.result.novos_vinculos} vínculos novos, {job.result.ja_existentes} já existentes.</p>
+                  {job.result.erros.length > 0 && (
+                    <p>Linhas ignoradas: {job.result.erros.map(e => `${e.linha} (${e.erro})`).join(', ')}</p>
+                  )}
+                </div>
+              ) : (
+                <p className="mt-1 text-red-700">{job.error}</p>
+              )}
+            </div>
+          </div>
+        </div>
+      ))}
+    </div>
+  );
+}
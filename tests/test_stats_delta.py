@@ -0,0 +1,48 @@
+import os
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import data_store, storage
+from backend.auth import create_access_token
+from backend.main import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILES = ("professores.csv", "publicacoes.csv", "vinculos.csv", "projetos.csv", "qualis_odontologia.csv")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """API sobre uma cópia dos CSVs (o banco e os caches ficam no diretório temporário)."""
+    for name in DATA_FILES:
+        shutil.copy(os.path.join(ROOT, name), tmp_path)
+    monkeypatch.setattr(storage, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(data_store, "BASE_DIR", str(tmp_path))
+    data_store.load_data()
+    return TestClient(app)
+
+
+def test_stats_after_editing_publication_to_new_year(client):
+    # Ano novo só entra nas chaves do cubo pela atualização incremental
+    snap = data_store.get_snapshot()
+    assert 1999 not in snap.stats_cube.available_years
+    pubs, _ = storage.get_storage().list_publications(limit=1)
+    old_year = str(pubs[0]["ano"])
+    pub = {**pubs[0], "ano": "1999", "abstract": "N/A"}
+
+    token = create_access_token({"sub": "admin"})
+    response = client.put(f"/api/admin/publicacoes/{pub['pmid']}", json=pub,
+                          headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert data_store.get_snapshot().version > snap.version
+
+    queries = [{}, {"ano": "1999"}, {"ano": old_year}]
+    incremental = [client.get("/stats", params=q) for q in queries]
+    assert [r.status_code for r in incremental] == [200] * len(queries)
+    assert 1999 in incremental[0].json()["available_years"]
+
+    # Mesmo resultado que a recarga completa
+    data_store.load_data()
+    for q, r in zip(queries, incremental):
+        assert r.json() == client.get("/stats", params=q).json()